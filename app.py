@@ -1,21 +1,76 @@
+import io
+import os
+import tempfile
+
 import streamlit as st
-from source.graph.transition_graph import TransitionGraph
+from source.graph.rendering import DETAIL_MODES
+from source.graph.transition_graph import DEFAULT_TOP_K, TransitionGraph
+from source.parsers.domain_cache import DomainCache, fingerprint
+from source.parsers.domain_file import load_examples
+from source.parsers.planning import Plan
+from source.parsers.query_cache import QueryCache
 from source.parsers.query_parser import QueryParser
 from source.parsers.statement_parser import StatementParser
+from source.profiling import Profiler
+
+# compiled domains and rendered graphs kept across reruns and sessions
+APP_CACHE_ENTRIES = 16
+# errors of an inconsistent or contradictory domain, shown to the user instead of a traceback
+DOMAIN_ERRORS = (AssertionError, ValueError)
+# snapshots of parsed domains, shared by app processes; an empty KRR_DOMAIN_CACHE turns them off
+DOMAIN_CACHE_DIR = os.environ.get("KRR_DOMAIN_CACHE", os.path.join(tempfile.gettempdir(), "krr-domains"))
+
+
+@st.cache_data
+def load_example_file(file_path):
+    return load_examples(file_path)
+
+
+@st.cache_resource
+def domain_cache():
+    return DomainCache(DOMAIN_CACHE_DIR)
+
+
+@st.cache_resource(max_entries=APP_CACHE_ENTRIES)
+def compile_domain(key, _statements):
+    """Parsed domain of the statements with fingerprint ``key``; shared, so it must not be modified."""
+    if DOMAIN_CACHE_DIR:
+        return domain_cache().parse(list(_statements))
+    statement_parser = StatementParser(TransitionGraph())
+    statement_parser.parse(list(_statements))
+    return statement_parser.transition_graph
+
+
+@st.cache_data(max_entries=APP_CACHE_ENTRIES)
+def render_graph(key, detail, top_k, _transition_graph):
+    """PNG, SVG and DOT renderings of the domain with fingerprint ``key``."""
+    import matplotlib.pyplot as plt
+
+    fig = _transition_graph.draw_graph(detail, top_k)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", bbox_inches="tight")
+    plt.close(fig)
+    return buffer.getvalue(), _transition_graph.to_svg(detail, top_k), _transition_graph.to_dot(detail, top_k)
 
 
-def load_examples(file_path):
-    examples = {}
-    current_example = None
-    with open(file_path, 'r') as file:
-        for line in file:
-            line = line.strip()
-            if line.startswith('#'):
-                current_example = line[1:].strip()
-                examples[current_example] = []
-            elif current_example:
-                examples[current_example].append(line)
-    return examples
+@st.cache_resource
+def query_cache():
+    """Query answers shared by all sessions; keys include the domain version."""
+    return QueryCache()
+
+
+def display_graph(transition_graph, key):
+    png, svg, dot = render_graph(st.session_state.domain_key, graph_detail, graph_top_k, transition_graph)
+    st.write("Fluents:", ", ".join(transition_graph.fluents))
+    st.write("Actions:", ", ".join(transition_graph.actions))
+    st.write("Graph:")
+    st.image(png)
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button("Download SVG", svg, file_name="graph.svg", mime="image/svg+xml", key=f"svg_{key}")
+    with col2:
+        st.download_button("Download DOT", dot, file_name="graph.dot", mime="text/vnd.graphviz", key=f"dot_{key}")
+
 
 def display_aligned_text(text):
     st.markdown(
@@ -24,6 +79,13 @@ def display_aligned_text(text):
     )
 
 
+def display_profile_report(title, report):
+    st.markdown(f"**{title}** ({report.seconds:.4f}s)")
+    st.dataframe(report.rows(), hide_index=True)
+    if report.counters:
+        st.json(report.counters)
+
+
 def display_statement(statement_type, statement):
     color_mapping = {
         "initially": "green",
@@ -50,15 +112,40 @@ if "query_parser" not in st.session_state:
 
 if "transition_graph" not in st.session_state:
     st.session_state.transition_graph = TransitionGraph()
+    st.session_state.domain_key = fingerprint([])
 
 if "statements" not in st.session_state:
     st.session_state.statements = []
 
+if "profiler" not in st.session_state:
+    st.session_state.profiler = Profiler()
+    st.session_state.profile_reports = {}
+
+with st.sidebar:
+    st.subheader("Graph")
+    graph_detail = st.selectbox(
+        "Level of detail:",
+        DETAIL_MODES,
+        format_func={
+            "full": "All states and edges",
+            "collapse": "Collapse edges by action",
+            "reachable": "Reachable from initial states",
+            "top_k": "Top states by degree",
+        }.get,
+    )
+    graph_top_k = st.number_input("States kept by 'top':", min_value=1, value=DEFAULT_TOP_K)
+
+    st.subheader("Profiling")
+    st.session_state.profiler.enabled = st.checkbox("Profile parsing and queries")
+    st.session_state.profiler.memory = st.checkbox(
+        "Track peak memory", disabled=not st.session_state.profiler.enabled
+    )
+
 tab1, tab2, tab3 = st.tabs(["Examples", "Manual Input", "Queries"])
 
 with tab1:
     st.subheader("Examples")
-    examples = load_examples('tests/examples.txt')
+    examples = load_example_file('tests/examples.txt')
     example_names = list(examples.keys())
     selected_example = st.selectbox("Select an example:", example_names)
 
@@ -69,14 +156,21 @@ with tab1:
 
         if st.button("Parse Selected Example", key="parse_selected_example", type="primary"):
             statements = [s.strip() for s in example_statements if s]
-            st.session_state.statement_parser = StatementParser(TransitionGraph())
-            st.session_state.statement_parser.parse(statements)
-            st.session_state.transition_graph = st.session_state.statement_parser.transition_graph
-            fig = st.session_state.statement_parser.transition_graph.draw_graph()
-            st.write("Fluents:", ", ".join(st.session_state.statement_parser.transition_graph.fluents))
-            st.write("Actions:", ", ".join(st.session_state.statement_parser.transition_graph.actions))
-            st.write("Graph:")
-            st.pyplot(fig)
+            domain_key = fingerprint(statements)
+            try:
+                if st.session_state.profiler.enabled:
+                    # profiling measures a real parse, so the cached domain is not used
+                    statement_parser = StatementParser(TransitionGraph(), profiler=st.session_state.profiler)
+                    st.session_state.profile_reports["Parse"] = statement_parser.parse(statements)
+                    transition_graph = statement_parser.transition_graph
+                else:
+                    transition_graph = compile_domain(domain_key, tuple(statements))
+            except DOMAIN_ERRORS as error:
+                st.error(f"Cannot parse the example: {error}")
+            else:
+                st.session_state.transition_graph = transition_graph
+                st.session_state.domain_key = domain_key
+                display_graph(st.session_state.transition_graph, "example")
 
 with tab2:
     st.subheader("Manual Input")
@@ -180,18 +274,37 @@ with tab2:
                 st.rerun()
 
     if st.button("Parse Statements", key="parse_statements", type="primary"):
-        st.session_state.statement_parser = StatementParser(TransitionGraph())
-        st.session_state.statement_parser.parse([stmt for _, stmt in st.session_state.statements])
-        st.session_state.transition_graph = st.session_state.statement_parser.transition_graph
-        fig = st.session_state.statement_parser.transition_graph.draw_graph()
-        st.write("Fluents:", ", ".join(st.session_state.statement_parser.transition_graph.fluents))
-        st.write("Actions:", ", ".join(st.session_state.statement_parser.transition_graph.actions))
-        st.write("Graph:")
-        st.pyplot(fig)
+        statements = [stmt for _, stmt in st.session_state.statements]
+        domain_key = fingerprint(statements)
+        # an unchanged statement set keeps the current domain
+        parsed = True
+        if domain_key != st.session_state.domain_key or st.session_state.profiler.enabled:
+            st.session_state.statement_parser.profiler = st.session_state.profiler
+            try:
+                with st.session_state.profiler.run("sync"):
+                    st.session_state.statement_parser.sync(statements)
+            except DOMAIN_ERRORS as error:
+                st.error(f"Cannot parse the statements: {error}")
+                # the half-updated parser is dropped; the next parse starts from scratch
+                st.session_state.statement_parser = StatementParser(TransitionGraph())
+                parsed = False
+            else:
+                if st.session_state.profiler.enabled:
+                    st.session_state.profile_reports["Parse"] = st.session_state.profiler.last_report
+                st.session_state.transition_graph = st.session_state.statement_parser.transition_graph
+                st.session_state.domain_key = domain_key
+        if parsed:
+            display_graph(st.session_state.transition_graph, "manual")
 
 
 with tab3:
-    st.session_state.query_parser = QueryParser(st.session_state.transition_graph.generate_graph())
+    # the query engine is only rebuilt when the domain changes, not on query edits
+    if st.session_state.query_parser.graph is not st.session_state.transition_graph:
+        st.session_state.query_parser = QueryParser(
+            st.session_state.transition_graph,
+            profiler=st.session_state.profiler,
+            cache=query_cache(),
+        )
 
     st.subheader("Queries")
     st.write('Enter query:')
@@ -211,7 +324,9 @@ with tab3:
         'necessary_executable': [st.session_state.query_parser.necessary_executable, (actions, pi)],
         'possibly_executable': [st.session_state.query_parser.possibly_executable, (actions, pi)],
         'necessary_executable_with_cost': [st.session_state.query_parser.necessary_executable_with_cost, (actions, pi, max_cost)],
-        'possibly_executable_with_cost': [st.session_state.query_parser.possibly_executable_with_cost, (actions, pi, max_cost)]
+        'possibly_executable_with_cost': [st.session_state.query_parser.possibly_executable_with_cost, (actions, pi, max_cost)],
+        'necessary_cheapest_plan': [st.session_state.query_parser.cheapest_plan, (alpha, pi, 'every')],
+        'possibly_cheapest_plan': [st.session_state.query_parser.cheapest_plan, (alpha, pi, 'some')]
     }
 
     argnames2func = {
@@ -220,7 +335,9 @@ with tab3:
         'necessary_executable': ['actions', 'pi'],
         'possibly_executable': ['actions', 'pi'],
         'necessary_executable_with_cost': ['actions', 'pi', 'max_cost'],
-        'possibly_executable_with_cost': ['actions', 'pi', 'max_cost']
+        'possibly_executable_with_cost': ['actions', 'pi', 'max_cost'],
+        'necessary_cheapest_plan': ['alpha', 'pi'],
+        'possibly_cheapest_plan': ['alpha', 'pi']
     }
 
     query = st.selectbox('Choose query:', list(args2func.keys()))
@@ -231,6 +348,18 @@ with tab3:
 
     if all_filled:
         result = args2func[query][0](*args_)
-        st.write('Result:', result)
+        st.write('Result:', result.to_dict() if isinstance(result, Plan) else result)
+        if query.endswith('with_cost') and st.session_state.query_parser.supports('cost_bounds'):
+            bounds = st.session_state.query_parser.cost_bounds(actions, pi)
+            st.write('Total cost (best, worst):', bounds if bounds is not None else 'not executable')
+        if st.session_state.profiler.enabled:
+            st.session_state.profile_reports["Query"] = st.session_state.profiler.last_report
     else:
-        st.write('Fill all arguments to get result')
\ No newline at end of file
+        st.write('Fill all arguments to get result')
+
+with st.sidebar:
+    stats = query_cache().stats()
+    st.caption(f"Query cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries")
+    if st.session_state.profiler.enabled:
+        for title, report in st.session_state.profile_reports.items():
+            display_profile_report(title, report)
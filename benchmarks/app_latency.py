@@ -0,0 +1,70 @@
+"""Rerun latency of the Streamlit app, measured headlessly with AppTest.
+
+    python -m benchmarks.app_latency --example "Yale Shooting Problem (YSP)" --repeat 10
+
+Scenarios: the first parse of an example, parsing it again, and reruns caused
+by editing a query input, which must not rebuild or redraw the domain.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List
+
+from streamlit.testing.v1 import AppTest
+
+from source.parsers.domain_file import load_examples
+
+APP_TIMEOUT = 120
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+
+def timed(action: Callable[[], AppTest]) -> float:
+    start = time.perf_counter()
+    app = action()
+    seconds = time.perf_counter() - start
+    if app.exception:
+        raise RuntimeError(app.exception[0].message)
+    return seconds
+
+
+def measure(example: str, repeat: int) -> Dict[str, Dict[str, float]]:
+    app = AppTest.from_file(APP_PATH, default_timeout=APP_TIMEOUT)
+    samples: Dict[str, List[float]] = {"first run": [timed(app.run)]}
+    app.selectbox[0].select(example).run()
+
+    samples["first parse"] = [timed(app.button(key="parse_selected_example").click().run)]
+    samples["repeated parse"] = [
+        timed(app.button(key="parse_selected_example").click().run) for _ in range(repeat)
+    ]
+    samples["query edit"] = []
+    for i in range(repeat):
+        app.text_input[-1].set_value(str(i))  # the max cost input
+        samples["query edit"].append(timed(app.run))
+    return {
+        scenario: {"seconds": statistics.median(values), "max_seconds": max(values), "runs": len(values)}
+        for scenario, values in samples.items()
+    }
+
+
+def main(argv: List[str] = None) -> int:
+    examples = list(load_examples("tests/examples.txt"))
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--example", default=examples[2], choices=examples)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write results to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = measure(args.example, args.repeat)
+    for scenario, measured in results.items():
+        print(f"{scenario:<16} median {measured['seconds']:.4f}s max {measured['max_seconds']:.4f}s")
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"example": args.example, "cases": {"app": results}}, file, indent=1)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+import random
+from typing import Any, List, Sequence, Tuple
+
+QUERY_METHODS = (
+    "necessary_alpha_after",
+    "possibly_alpha_after",
+    "necessary_executable",
+    "possibly_executable",
+    "necessary_executable_with_cost",
+    "possibly_executable_with_cost",
+)
+
+
+def literal(rng: random.Random, fluents: Sequence[str]) -> str:
+    fluent = rng.choice(fluents)
+    return fluent if rng.random() < 0.5 else f"~{fluent}"
+
+
+def generate_domain(
+    n_fluents: int,
+    n_actions: int,
+    causes: int = 2,
+    releases: int = 1,
+    impossible: int = 1,
+    always: int = 1,
+    seed: int = 0,
+) -> List[str]:
+    """Random but consistent domain: every action's ``causes`` statements set distinct fluents."""
+    rng = random.Random(seed)
+    fluents = [f"f{i}" for i in range(n_fluents)]
+    statements = [f"initially {literal(rng, fluents)}"]
+    for i in range(n_actions):
+        action = f"A{i}"
+        effect_fluents = rng.sample(fluents, min(causes + releases, n_fluents))
+        for fluent in effect_fluents[:causes]:
+            effect = fluent if rng.random() < 0.5 else f"~{fluent}"
+            if rng.random() < 0.7:
+                statements.append(f"{action} causes {effect} if {literal(rng, fluents)}")
+            else:
+                statements.append(f"{action} causes {effect}")
+        for fluent in effect_fluents[causes:]:
+            statements.append(f"{action} releases {fluent} if {literal(rng, fluents)}")
+        for _ in range(impossible):
+            statements.append(f"impossible {action} if {literal(rng, fluents)} & {literal(rng, fluents)}")
+        statements.append(f"{action} lasts {rng.randint(1, 10)}")
+    for _ in range(always):
+        statements.append(f"always {literal(rng, fluents)} | {literal(rng, fluents)}")
+    return statements
+
+
+def generate_queries(
+    statements: Sequence[str],
+    count: int,
+    max_length: int = 4,
+    seed: int = 0,
+) -> List[Tuple[str, Tuple[Any, ...]]]:
+    """Random (query method, arguments) pairs over the fluents and actions of a generated domain."""
+    rng = random.Random(seed)
+    fluents = sorted({
+        token.lstrip("~") for statement in statements for token in statement.replace("&", " ").replace("|", " ").split()
+        if token.lstrip("~").startswith("f") and token.lstrip("~")[1:].isdigit()
+    })
+    actions = sorted({statement.split()[0] for statement in statements if " lasts " in statement})
+    queries = []
+    for i in range(count):
+        method = QUERY_METHODS[i % len(QUERY_METHODS)]
+        sequence = [rng.choice(actions) for _ in range(rng.randint(1, max_length))]
+        pi = " & ".join(sorted({literal(rng, fluents) for _ in range(rng.randint(1, 2))}))
+        if "alpha" in method:
+            queries.append((method, (literal(rng, fluents), sequence, pi)))
+        elif "cost" in method:
+            queries.append((method, (sequence, pi, rng.randint(1, 10 * max_length))))
+        else:
+            queries.append((method, (sequence, pi)))
+    return queries
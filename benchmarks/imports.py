@@ -0,0 +1,57 @@
+"""Import cost of the reasoning core, each module measured in a fresh interpreter."""
+import json
+import subprocess
+import sys
+from typing import Dict, List, Sequence
+
+CORE_MODULES = (
+    "source.parsers.logical_formula_parser",
+    "source.graph.transition_graph",
+    "source.parsers.statement_parser",
+    "source.parsers.query_parser",
+    "source.parsers.domain_cache",
+    "cli",
+)
+# UI and plotting packages the core must only load on demand
+HEAVY_MODULES = ("streamlit", "matplotlib", "networkx")
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "heavy": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+
+def measure_import(module: str, repeat: int = 3) -> Dict[str, object]:
+    """Fastest of ``repeat`` cold imports of ``module`` and the heavy modules it pulled in."""
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        runs.append(json.loads(output.splitlines()[-1]))
+    return min(runs, key=lambda run: run["seconds"])
+
+
+def measure_imports(modules: Sequence[str] = CORE_MODULES, repeat: int = 3) -> Dict[str, Dict[str, object]]:
+    return {f"import {module}": measure_import(module, repeat) for module in modules}
+
+
+def heavy_imports(results: Dict[str, Dict[str, object]]) -> List[str]:
+    """Core modules that loaded a UI or plotting package at import time."""
+    return [f"{phase} loads {', '.join(measured['heavy'])}" for phase, measured in results.items() if measured["heavy"]]
+
+
+if __name__ == "__main__":
+    results = measure_imports()
+    for phase, measured in results.items():
+        print(f"{phase:<52} {measured['seconds']:.4f}s {' '.join(measured['heavy'])}")
+    problems = heavy_imports(results)
+    for problem in problems:
+        print(f"HEAVY {problem}")
+    sys.exit(1 if problems else 0)
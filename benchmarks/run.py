@@ -0,0 +1,183 @@
+"""Benchmarks parsing, graph building, drawing and queries on generated domains.
+
+    python -m benchmarks.run --sizes 4 6 8 10 --output results.json
+    python -m benchmarks.run --baseline results.json
+
+With ``--baseline``, every phase slower than the stored run by more than
+``--threshold`` is reported as a regression and the exit status is 1. The
+cold import time of each core module is measured too, and a core module that
+loads streamlit, matplotlib or networkx at import also fails the run.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+import matplotlib
+
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+# imported up front so that the first generate_graph timing does not include it
+import networkx
+
+from benchmarks.imports import heavy_imports, measure_imports
+from benchmarks.generator import QUERY_METHODS, generate_domain, generate_queries
+from source.graph.sparse import SparseTransitions
+from source.graph.transition_graph import TransitionGraph
+from source.parsers.query_parser import QueryParser, SparseQueryParser, SymbolicQueryParser
+from source.parsers.statement_parser import StatementParser
+
+RESULTS_VERSION = 1
+# limit of a planning search, so that a single hard goal does not dominate a case
+PLAN_EXPANSIONS = 20_000
+
+
+def measure(function: Callable[[], Any], memory: bool) -> Dict[str, float]:
+    """Wall time of one call and, when ``memory`` is set, peak traced memory of a second call."""
+    start = time.perf_counter()
+    function()
+    result = {"seconds": time.perf_counter() - start}
+    if memory:
+        tracemalloc.start()
+        try:
+            function()
+            result["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def parse(statements: List[str], backend: str) -> StatementParser:
+    statement_parser = StatementParser(TransitionGraph(backend=backend))
+    statement_parser.parse(statements)
+    return statement_parser
+
+
+def plan(transition_graph: TransitionGraph, goals: List[Tuple[str, str]], mode: str) -> None:
+    # a fresh parser, so that the planner's step indexes are built within the measurement
+    query_parser = QueryParser(transition_graph)
+    for alpha, pi in goals:
+        query_parser.cheapest_plan(alpha, pi, mode, max_expansions=PLAN_EXPANSIONS)
+
+
+def run_case(n_fluents: int, args: argparse.Namespace) -> Dict[str, Dict[str, float]]:
+    statements = generate_domain(
+        n_fluents,
+        args.actions,
+        causes=args.causes,
+        releases=args.releases,
+        impossible=args.impossible,
+        always=args.always,
+        seed=args.seed,
+    )
+    queries = generate_queries(statements, args.queries, seed=args.seed)
+    phases = {"parse": measure(lambda: parse(statements, args.backend), args.memory)}
+
+    transition_graph = parse(statements, args.backend).transition_graph
+    if args.backend in ("python", "numpy"):
+        phases["generate_graph"] = measure(transition_graph.generate_graph, args.memory)
+        if n_fluents <= args.draw_limit:
+            phases["draw_graph"] = measure(lambda: plt.close(transition_graph.draw_graph()), args.memory)
+
+    if args.backend == "symbolic":
+        query_parser = SymbolicQueryParser(transition_graph)
+        queries = [(name, arguments) for name, arguments in queries if query_parser.supports(name)]
+    elif args.sparse:
+        query_parser = SparseQueryParser(transition_graph)
+        phases["transition_matrices"] = measure(lambda: SparseTransitions(transition_graph), args.memory)
+    else:
+        query_parser = QueryParser(transition_graph)
+    for method in sorted({name for name, _ in queries}, key=QUERY_METHODS.index):
+        selected = [arguments for name, arguments in queries if name == method]
+        phases[method] = measure(
+            lambda: [getattr(query_parser, method)(*arguments) for arguments in selected], args.memory
+        )
+    phases["evaluate_batch"] = measure(lambda: query_parser.evaluate_batch(queries), args.memory)
+    if query_parser.supports("cheapest_plan"):
+        goals = [arguments[::2] for name, arguments in queries if name.endswith("alpha_after")]
+        for mode in ("some", "every"):
+            phases[f"cheapest_plan_{mode}"] = measure(lambda: plan(transition_graph, goals, mode), args.memory)
+    return phases
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float, min_seconds: float) -> List[str]:
+    """Phases slower than the baseline by more than ``threshold`` (relative) and ``min_seconds``."""
+    regressions = []
+    for case, phases in results["cases"].items():
+        for phase, measured in phases.items():
+            reference = baseline.get("cases", {}).get(case, {}).get(phase)
+            if reference is None:
+                continue
+            slower = measured["seconds"] - reference["seconds"]
+            if slower > min_seconds and measured["seconds"] > reference["seconds"] * (1 + threshold):
+                regressions.append(
+                    f"{case} {phase}: {reference['seconds']:.4f}s -> {measured['seconds']:.4f}s"
+                )
+    return regressions
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[4, 6, 8, 10], help="numbers of fluents")
+    parser.add_argument("--actions", type=int, default=4)
+    parser.add_argument("--causes", type=int, default=2, help="causes statements per action")
+    parser.add_argument("--releases", type=int, default=1, help="releases statements per action")
+    parser.add_argument("--impossible", type=int, default=1, help="impossible statements per action")
+    parser.add_argument("--always", type=int, default=1, help="always statements per domain")
+    parser.add_argument("--queries", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backend", default="python")
+    parser.add_argument("--sparse", action="store_true", help="answer queries with sparse transition matrices")
+    parser.add_argument("--draw-limit", type=int, default=6, help="largest size for which draw_graph is timed")
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="skip peak memory measurement")
+    parser.add_argument("--no-imports", dest="imports", action="store_false", help="skip import time measurement")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against results stored in this JSON file")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed relative slowdown")
+    parser.add_argument("--min-seconds", type=float, default=0.005, help="ignore slowdowns below this")
+    args = parser.parse_args(argv)
+
+    results = {
+        "version": RESULTS_VERSION,
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "python": platform.python_version(),
+        "cases": {},
+    }
+    problems = []
+    if args.imports:
+        imports = results["cases"]["imports"] = measure_imports()
+        for phase, measured in imports.items():
+            print(f"{phase:<52} {measured['seconds']:.4f}s")
+        problems = heavy_imports(imports)
+
+    for n_fluents in args.sizes:
+        phases = run_case(n_fluents, args)
+        results["cases"][f"n={n_fluents}"] = phases
+        for phase, measured in phases.items():
+            peak = f" {measured['peak_bytes'] / 1024:.0f} KiB" if "peak_bytes" in measured else ""
+            print(f"n={n_fluents:<3} {phase:<32} {measured['seconds']:.4f}s{peak}")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=1)
+
+    for problem in problems:
+        print(f"HEAVY {problem}")
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if baseline.get("version") != RESULTS_VERSION:
+            print(f"Baseline {args.baseline} has another results version, not compared")
+            return 1 if problems else 0
+        regressions = compare(results, baseline, args.threshold, args.min_seconds)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        problems += regressions
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
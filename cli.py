@@ -0,0 +1,163 @@
+"""Answers queries on domains without the Streamlit app, writing one JSON line per result.
+
+    python cli.py tests/examples.txt --queries queries.txt
+    echo "necessary ~alive after Shoot from loaded" | python cli.py tests/examples.txt --domain "Stanford Murder Mystery"
+
+Domain files use the ``# name`` format of tests/examples.txt. In the query
+stream, a ``# name`` line selects the domain of the queries below it. Each
+domain is compiled once, on its first query.
+"""
+import argparse
+import json
+import sys
+import time
+from typing import Any, Dict, Iterable, List, Optional, TextIO
+
+from source.graph.transition_graph import BACKENDS, TransitionGraph
+from source.parsers.domain_cache import DomainCache
+from source.parsers.domain_file import load_examples, parse_query
+from source.parsers.query_cache import DEFAULT_QUERY_CACHE_ENTRIES, QueryCache
+from source.parsers.query_parser import QueryParser, SparseQueryParser, SymbolicQueryParser
+from source.parsers.statement_parser import StatementParser
+
+# an error of one domain or query (including formula syntax errors raised by pyeda) is
+# reported on that query's line and the stream goes on
+QUERY_ERRORS = (Exception,)
+
+
+def load_domains(paths: Iterable[str]) -> Dict[str, List[str]]:
+    domains = {}
+    for path in paths:
+        for name, statements in load_examples(path).items():
+            domains[name] = [statement for statement in statements if statement]
+    return domains
+
+
+def compile_domain(
+    statements: List[str],
+    backend: str,
+    cache: Optional[QueryCache] = None,
+    sparse: bool = False,
+    domain_cache: Optional[DomainCache] = None,
+) -> QueryParser:
+    if sparse and backend not in ("python", "numpy"):
+        raise ValueError(f"Sparse queries need the python or numpy backend, not {backend}")
+    if domain_cache is not None:
+        transition_graph = domain_cache.parse(statements, backend)
+    else:
+        statement_parser = StatementParser(TransitionGraph(backend=backend))
+        statement_parser.parse(statements)
+        transition_graph = statement_parser.transition_graph
+    if backend == "symbolic":
+        return SymbolicQueryParser(transition_graph, cache=cache)
+    if sparse:
+        return SparseQueryParser(transition_graph, cache=cache)
+    return QueryParser(transition_graph, cache=cache)
+
+
+def answer(query_parser: QueryParser, query: str, witness: bool = False) -> Dict[str, Any]:
+    method, arguments = parse_query(query)
+    start = time.perf_counter()
+    result = query_parser.query(method, arguments)
+    seconds = time.perf_counter() - start
+    record = {"method": method, "answer": result, "seconds": seconds}
+    if method == "cheapest_plan":
+        record.update(answer=result.actions, cost=result.cost, stats=result.stats)
+        return record
+    if witness and not method.endswith("with_cost"):
+        # backends that keep no single states give no witness
+        trajectory = query_parser.witness(method, arguments) if query_parser.supports("witness") else None
+        record["witness"] = trajectory.to_dict() if trajectory is not None else None
+    actions, pi = arguments[1:3] if method.endswith("alpha_after") else arguments[:2]
+    bounds = query_parser.cost_bounds(actions, pi) if query_parser.supports("cost_bounds") else None
+    record["cost"] = {"min": bounds[0], "max": bounds[1]} if bounds else None
+    return record
+
+
+def run(
+    domains: Dict[str, List[str]],
+    queries: TextIO,
+    output: TextIO,
+    backend: str,
+    domain: Optional[str],
+    cache: Optional[QueryCache] = None,
+    sparse: bool = False,
+    witness: bool = False,
+    domain_cache: Optional[DomainCache] = None,
+) -> int:
+    """Streams the answers of ``queries`` to ``output``; returns the number of failed lines."""
+    compiled: Dict[str, Any] = {}
+    if domain is None and len(domains) == 1:
+        domain = next(iter(domains))
+    failures = 0
+
+    def write(record: Dict[str, Any]) -> None:
+        output.write(json.dumps(record) + "\n")
+        output.flush()
+
+    for line_number, line in enumerate(queries, 1):
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("#"):
+            domain = line[1:].strip()
+            continue
+
+        record = {"line": line_number, "domain": domain, "query": line}
+        try:
+            if domain not in domains:
+                raise ValueError(f"Unknown domain: {domain}")
+            if domain not in compiled:
+                start = time.perf_counter()
+                try:
+                    compiled[domain] = compile_domain(domains[domain], backend, cache, sparse, domain_cache)
+                except QUERY_ERRORS as error:
+                    compiled[domain] = error
+                write({"domain": domain, "compiled": not isinstance(compiled[domain], Exception),
+                       "seconds": time.perf_counter() - start})
+            if isinstance(compiled[domain], Exception):
+                raise compiled[domain]
+            record.update(answer(compiled[domain], line, witness))
+        except QUERY_ERRORS as error:
+            record["error"] = str(error)
+            failures += 1
+        write(record)
+    return failures
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("domains", nargs="+", help="domain files in the tests/examples.txt format")
+    parser.add_argument("--queries", default="-", help="query file, '-' for stdin (default)")
+    parser.add_argument("--domain", help="domain of the queries before the first '# name' line")
+    parser.add_argument("--backend", choices=BACKENDS, default="python")
+    parser.add_argument("--sparse", action="store_true",
+                        help="answer queries on whole sets of states with sparse transition matrices")
+    parser.add_argument("--witness", action="store_true",
+                        help="add a trajectory behind each answer: an example or a counterexample")
+    parser.add_argument("--cache-dir",
+                        help="directory of parsed domain snapshots reused across runs (python and numpy backends)")
+    parser.add_argument("--output", default="-", help="JSONL output file, '-' for stdout (default)")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_QUERY_CACHE_ENTRIES,
+                        help="answers kept for repeated queries, 0 to disable")
+    args = parser.parse_args(argv)
+
+    domains = load_domains(args.domains)
+    queries = sys.stdin if args.queries == "-" else open(args.queries)
+    output = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        cache = QueryCache(args.cache_size) if args.cache_size > 0 else None
+        domain_cache = DomainCache(args.cache_dir) if args.cache_dir else None
+        failures = run(
+            domains, queries, output, args.backend, args.domain, cache, args.sparse, args.witness, domain_cache
+        )
+    finally:
+        if queries is not sys.stdin:
+            queries.close()
+        if output is not sys.stdout:
+            output.close()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
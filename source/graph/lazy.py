@@ -0,0 +1,98 @@
+from itertools import combinations, product
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from source.parsers.logical_formula_parser import CompiledFormula, conjoin_masks
+
+
+def minimal_change_targets(code: int, terms: Sequence[Tuple[int, int]], allowed, n_fluents: int) -> List[int]:
+    """Allowed codes satisfying one of the (mask, value) terms with the fewest bits changed from ``code``.
+
+    Each term is first applied to ``code`` directly; its free bits are flipped,
+    fewest first, only while that projection is not allowed.
+    """
+    projections = []
+    for mask, value in terms:
+        free_bits = [1 << i for i in range(n_fluents) if not mask >> i & 1]
+        projections.append(((code & ~mask) | value, ((code ^ value) & mask).bit_count(), free_bits))
+
+    best = None
+    targets = set()
+    extra = 0
+    while True:
+        expanded = False
+        for base, distance, free_bits in projections:
+            if extra > len(free_bits) or (best is not None and distance + extra > best):
+                continue
+            expanded = True
+            for flipped in combinations(free_bits, extra):
+                target = base ^ sum(flipped)
+                if target not in allowed:
+                    continue
+                if best is None or distance + extra < best:
+                    best = distance + extra
+                    targets = set()
+                targets.add(target)
+        if not expanded:
+            break
+        extra += 1
+    return list(targets)
+
+
+class LazyTransitions:
+    """Compiled ``always``, ``impossible``, ``causes`` and ``releases`` rules of a domain.
+
+    Successors are computed from the rules for one (state code, action) pair
+    at a time, so only the states a query visits are ever expanded.
+    """
+
+    def __init__(self, order):
+        self.order = order
+        self.always: List[CompiledFormula] = []
+        self.impossible: Dict[str, List[CompiledFormula]] = {}
+        self.causes: Dict[str, List[Tuple[List[Tuple[CompiledFormula, CompiledFormula]], Callable]]] = {}
+        self.releases: Dict[str, List[Tuple[int, CompiledFormula]]] = {}
+        self.initial: Optional[CompiledFormula] = None
+
+    def __contains__(self, code: int) -> bool:
+        return not self.always or any(formula.evaluate_code(code, self.order) for formula in self.always)
+
+    def add_always(self, formula: CompiledFormula) -> None:
+        self.always.append(formula)
+
+    def add_impossible(self, action: str, precondition: CompiledFormula) -> None:
+        self.impossible.setdefault(action, []).append(precondition)
+
+    def add_causes(
+        self,
+        action: str,
+        statements: List[Tuple[CompiledFormula, CompiledFormula]],
+        check_effects: Callable[[List[CompiledFormula]], None],
+    ) -> None:
+        self.causes.setdefault(action, []).append((statements, check_effects))
+
+    def add_releases(self, action: str, fluent: str, precondition: CompiledFormula) -> None:
+        self.releases.setdefault(action, []).append((self.order.bit(fluent), precondition))
+
+    def codes_satisfying(self, mask: int, value: int) -> Iterator[int]:
+        """Allowed codes whose ``mask`` bits equal ``value``."""
+        free_bits = [1 << i for i in range(len(self.order)) if not mask >> i & 1]
+        for flips in product((0, 1), repeat=len(free_bits)):
+            code = value | sum(bit for bit, flip in zip(free_bits, flips) if flip)
+            if code in self:
+                yield code
+
+    def successors(self, code: int, action: str) -> List[int]:
+        if code not in self:
+            return []
+        targets = set()
+        for statements, check_effects in self.causes.get(action, []):
+            effects = [effect for effect, precondition in statements if precondition.evaluate_code(code, self.order)]
+            check_effects(effects)
+            terms = conjoin_masks([effect.masks(self.order) for effect in effects])
+            targets.update(minimal_change_targets(code, terms, self, len(self.order)))
+        for bit, precondition in self.releases.get(action, []):
+            if precondition.evaluate_code(code, self.order) and code ^ bit in self:
+                targets.add(code ^ bit)
+        if any(precondition.evaluate_code(code, self.order) for precondition in self.impossible.get(action, [])):
+            return []
+        return sorted(targets)
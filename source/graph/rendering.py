@@ -0,0 +1,308 @@
+"""Rendering of a TransitionGraph: level-of-detail selection, cached layouts, matplotlib, DOT and SVG output.
+
+Only ``draw`` needs matplotlib; ``to_dot`` needs nothing and ``to_svg`` only
+networkx for the layout, so large graphs can be exported headlessly.
+"""
+import hashlib
+import math
+from collections import OrderedDict, deque
+from html import escape
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple
+
+from source.graph.transition_graph import DEFAULT_TOP_K
+
+if TYPE_CHECKING:
+    import matplotlib.pyplot as plt
+
+    from source.graph.transition_graph import StateNode, TransitionGraph
+
+DETAIL_MODES = ("full", "collapse", "reachable", "top_k")
+# spring_layout needs scipy from 500 nodes on; larger graphs are laid out on a circle
+SPRING_LAYOUT_LIMIT = 499
+# edge labels and curved arrows (one patch per edge) are drawn for at most this many
+# edges; larger graphs get one straight-line collection per color
+LABEL_LIMIT = 200
+LAYOUT_CACHE_SIZE = 32
+# Tableau palette without the "tab:" prefix, as the original drawing used
+PALETTE = ("blue", "orange", "green", "red", "purple", "brown", "pink", "gray", "olive", "cyan")
+MIXED_COLOR = "black"
+
+_layouts: "OrderedDict[str, Dict[int, Tuple[float, float]]]" = OrderedDict()
+
+
+class RenderGraph:
+    """States and (source, target, actions, label) edges selected for display."""
+
+    def __init__(
+        self,
+        nodes: List["StateNode"],
+        edges: List[Tuple["StateNode", "StateNode", Tuple[str, ...], str]],
+        initial: Set["StateNode"],
+        ending: Set["StateNode"],
+        colors: Dict[str, str],
+    ):
+        self.nodes = nodes
+        self.edges = edges
+        self.initial = initial
+        self.ending = ending
+        self.colors = colors
+
+    def fingerprint(self) -> str:
+        """Hash of the node and edge structure; equal graphs share a layout."""
+        digest = hashlib.sha256()
+        if self.nodes:
+            digest.update("\0".join(self.nodes[0].order.fluents).encode())
+        digest.update(repr(sorted(node.code for node in self.nodes)).encode())
+        digest.update(repr(sorted((source.code, target.code) for source, target, _, _ in self.edges)).encode())
+        return digest.hexdigest()
+
+    def node_color(self, node: "StateNode") -> str:
+        if node in self.initial:
+            return "green"
+        if node in self.ending:
+            return "red"
+        return "lightblue"
+
+    def edge_color(self, actions: Tuple[str, ...]) -> str:
+        return self.colors[actions[0]] if len(actions) == 1 else MIXED_COLOR
+
+
+def select(transition_graph: "TransitionGraph", detail: str = "full", top_k: int = DEFAULT_TOP_K) -> RenderGraph:
+    """Picks the states and edges to render.
+
+    ``full`` shows every possible state and edge, ``collapse`` merges the edges
+    between the same two states into one labelled with all their actions,
+    ``reachable`` keeps what can be reached from the initial states and
+    ``top_k`` keeps the ``top_k`` states with the most edges.
+    """
+    if detail not in DETAIL_MODES:
+        raise ValueError(f"Unsupported detail mode: {detail}")
+    nodes = list(dict.fromkeys(transition_graph.generate_possible_states()))
+    edges = [
+        (edge.source, edge.target, (edge.action,), transition_graph.duration(edge.source, edge.action, edge.target))
+        for edge in transition_graph.edges
+    ]
+    initial = set(transition_graph.possible_initial_states)
+
+    if detail == "reachable":
+        successors: Dict["StateNode", List["StateNode"]] = {}
+        for source, target, _, _ in edges:
+            successors.setdefault(source, []).append(target)
+        reached = set(initial)
+        frontier = deque(initial)
+        while frontier:
+            for target in successors.get(frontier.popleft(), ()):
+                if target not in reached:
+                    reached.add(target)
+                    frontier.append(target)
+        nodes = [node for node in nodes if node in reached]
+    elif detail == "top_k":
+        degree = dict.fromkeys(nodes, 0)
+        for source, target, _, _ in edges:
+            degree[source] = degree.get(source, 0) + 1
+            degree[target] = degree.get(target, 0) + 1
+        kept = set(sorted(nodes, key=lambda node: (-degree[node], node.code))[:top_k])
+        nodes = [node for node in nodes if node in kept]
+
+    kept = set(nodes)
+    edges = [edge for edge in edges if edge[0] in kept and edge[1] in kept]
+
+    if detail == "collapse":
+        merged: Dict[Tuple["StateNode", "StateNode"], List[Tuple[str, int]]] = {}
+        for source, target, (action,), duration in edges:
+            merged.setdefault((source, target), []).append((action, duration))
+        labelled = [
+            (source, target, tuple(action for action, _ in actions), ", ".join(f"{action} ({duration})" for action, duration in actions))
+            for (source, target), actions in merged.items()
+        ]
+    else:
+        labelled = [
+            (source, target, actions, f"{actions[0]}\nDuration: {duration}")
+            for source, target, actions, duration in edges
+        ]
+
+    actions = list(dict.fromkeys(transition_graph.actions + [actions[0] for _, _, actions, _ in edges]))
+    colors = {action: PALETTE[i % len(PALETTE)] for i, action in enumerate(actions)}
+    ending = set(transition_graph.possible_ending_states)
+    return RenderGraph(nodes, labelled, initial & kept, ending & kept, colors)
+
+
+def layout(render_graph: RenderGraph) -> Dict["StateNode", Tuple[float, float]]:
+    """Node positions, computed once per graph fingerprint."""
+    key = render_graph.fingerprint()
+    positions = _layouts.get(key)
+    if positions is None:
+        import networkx as nx
+
+        G = nx.MultiDiGraph()
+        G.add_nodes_from(node.code for node in render_graph.nodes)
+        G.add_edges_from((source.code, target.code) for source, target, _, _ in render_graph.edges)
+        if 1 < G.order() <= SPRING_LAYOUT_LIMIT:
+            layout_positions = nx.spring_layout(G, k=10 / math.sqrt(G.order()), seed=0)
+        else:
+            layout_positions = nx.circular_layout(G)
+        positions = {code: (float(x), float(y)) for code, (x, y) in layout_positions.items()}
+        _layouts[key] = positions
+        if len(_layouts) > LAYOUT_CACHE_SIZE:
+            _layouts.popitem(last=False)
+    else:
+        _layouts.move_to_end(key)
+    return {node: positions[node.code] for node in render_graph.nodes}
+
+
+def draw(render_graph: RenderGraph) -> "plt.Figure":
+    """Draws the graph with matplotlib, one edge collection per action color."""
+    import matplotlib.pyplot as plt
+    import networkx as nx
+    from matplotlib.collections import LineCollection
+
+    pos = layout(render_graph)
+    G = nx.MultiDiGraph()
+    G.add_nodes_from(render_graph.nodes)
+    fig, ax = plt.subplots(figsize=(20, 20))
+    if not pos:
+        ax.set_axis_off()
+        return fig
+
+    # add padding to the graph
+    x_values, y_values = zip(*pos.values())
+    padding = 0.2
+    ax.set_xlim([min(x_values) - padding, max(x_values) + padding])
+    ax.set_ylim([min(y_values) - padding, max(y_values) + padding])
+
+    nx.draw_networkx_nodes(
+        G,
+        pos,
+        node_shape="o",
+        node_size=[1000 + 500 * len(str(node)) for node in G.nodes],
+        ax=ax,
+        node_color=[render_graph.node_color(node) for node in G.nodes],
+        linewidths=1,
+        edgecolors="black",
+        alpha=0.3,
+    )
+
+    center_x = sum(x_values) / len(pos)
+    center_y = sum(y_values) / len(pos)
+    offset = 0.1  # distance of the labels from the nodes
+    label_positions = {}
+    for node, (x, y) in pos.items():
+        angle = math.atan2(y - center_y, x - center_x)
+        label_positions[node] = (x + offset * math.cos(angle), y + offset * math.sin(angle))
+    nx.draw_networkx_labels(
+        G,
+        label_positions,
+        {node: node.label for node in G.nodes},
+        ax=ax,
+        font_size=13,
+        font_weight="bold",
+        font_color="black",
+        bbox=dict(facecolor="white", edgecolor="black", boxstyle="round,pad=0.2"),
+        alpha=0.8,
+    )
+
+    by_color: Dict[str, List[Tuple["StateNode", "StateNode"]]] = {}
+    for source, target, actions, label in render_graph.edges:
+        G.add_edge(source, target, label=label)
+        by_color.setdefault(render_graph.edge_color(actions), []).append((source, target))
+    detailed = len(render_graph.edges) <= LABEL_LIMIT
+    for color, edgelist in by_color.items():
+        if detailed:
+            nx.draw_networkx_edges(
+                G,
+                pos,
+                edgelist=edgelist,
+                ax=ax,
+                arrowstyle="->",
+                arrowsize=30,
+                edge_color=color,
+                width=2,
+                connectionstyle="arc3,rad=0.10",
+            )
+        else:
+            # networkx draws every multigraph edge as its own patch, so build the collection directly
+            ax.add_collection(
+                LineCollection([(pos[u], pos[v]) for u, v in edgelist], colors=color, linewidths=1, alpha=0.5)
+            )
+    ax.set_zorder(2)
+
+    if detailed:
+        nx.draw_networkx_edge_labels(
+            G,
+            pos,
+            edge_labels=nx.get_edge_attributes(G, "label"),
+            ax=ax,
+            font_size=10,
+            font_weight="bold",
+            font_color="black",
+            label_pos=0.3,
+            rotate=True,
+        )
+
+    ax.set_axis_off()
+    return fig
+
+
+def _dot_string(text: str) -> str:
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+
+
+def to_dot(render_graph: RenderGraph) -> str:
+    """Graphviz DOT source of the graph."""
+    lines = ["digraph transitions {", "  node [shape=ellipse, style=filled];"]
+    for node in render_graph.nodes:
+        lines.append(f"  {node.code} [label={_dot_string(node.label)}, fillcolor={render_graph.node_color(node)}];")
+    for source, target, actions, label in render_graph.edges:
+        lines.append(
+            f"  {source.code} -> {target.code} [label={_dot_string(label)}, color={render_graph.edge_color(actions)}];"
+        )
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def to_svg(render_graph: RenderGraph, size: int = 1200, labels: Optional[bool] = None) -> str:
+    """Standalone SVG of the graph on the cached layout, written without matplotlib."""
+    if labels is None:
+        labels = len(render_graph.edges) <= LABEL_LIMIT
+    pos = layout(render_graph)
+    margin = 80
+    scale = (size - 2 * margin) / 2
+
+    def point(node: "StateNode") -> Tuple[float, float]:
+        x, y = pos[node]
+        return margin + (x + 1) * scale, margin + (1 - y) * scale
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{size}" height="{size}" viewBox="0 0 {size} {size}">',
+        '<defs><marker id="arrow" viewBox="0 0 10 10" refX="10" refY="5" markerWidth="8" markerHeight="8" '
+        'orient="auto-start-reverse"><path d="M 0 0 L 10 5 L 0 10 z" fill="context-stroke"/></marker></defs>',
+    ]
+    by_color: Dict[str, List[str]] = {}
+    texts = []
+    for source, target, actions, label in render_graph.edges:
+        x1, y1 = point(source)
+        x2, y2 = point(target)
+        if source == target:
+            path = f"M {x1:.1f} {y1:.1f} c -30 -50 30 -50 0 0"
+            lx, ly = x1, y1 - 40
+        else:
+            # slight arc, as in the matplotlib drawing
+            mx, my = (x1 + x2) / 2 - (y2 - y1) * 0.1, (y1 + y2) / 2 + (x2 - x1) * 0.1
+            path = f"M {x1:.1f} {y1:.1f} Q {mx:.1f} {my:.1f} {x2:.1f} {y2:.1f}"
+            lx, ly = mx, my
+        by_color.setdefault(render_graph.edge_color(actions), []).append(path)
+        if labels:
+            texts.append(f'<text x="{lx:.1f}" y="{ly:.1f}" font-size="10">{escape(label.replace(chr(10), " "))}</text>')
+    for color, paths in by_color.items():
+        parts.append(f'<g fill="none" stroke="{color}" stroke-width="1.5" marker-end="url(#arrow)">')
+        parts.extend(f'<path d="{path}"/>' for path in paths)
+        parts.append("</g>")
+    for node in render_graph.nodes:
+        x, y = point(node)
+        parts.append(
+            f'<circle cx="{x:.1f}" cy="{y:.1f}" r="12" fill="{render_graph.node_color(node)}" '
+            f'fill-opacity="0.5" stroke="black"><title>{escape(node.label.replace(chr(10), ", "))}</title></circle>'
+        )
+    parts.extend(texts)
+    parts.append("</svg>")
+    return "\n".join(parts) + "\n"
@@ -0,0 +1,243 @@
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+# compositions of action sequences a SparseTransitions keeps, least recently used dropped first
+DEFAULT_COMPOSITIONS = 256
+# uses of an action sequence after which its composition is built and kept
+COMPOSE_AFTER_USES = 2
+
+# sentinels of the running least and greatest cost; durations may be negative, so neither is a valid cost
+_NO_COST = np.iinfo(np.int64).max
+_NO_MAX_COST = np.iinfo(np.int64).min
+
+
+def _expand(starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Positions ``starts[i], ..., starts[i] + counts[i] - 1`` of every i, concatenated."""
+    total = int(counts.sum())
+    if not total:
+        return np.zeros(0, dtype=np.int64)
+    offsets = np.arange(total, dtype=np.int64) - np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(starts, counts) + offsets
+
+
+class Frontier:
+    """Set of states as a boolean vector over state indices, with the least and greatest cost of
+    reaching each, and whether every path from the start states followed all actions so far."""
+
+    __slots__ = ("states", "min_costs", "max_costs", "executable")
+
+    def __init__(self, states: np.ndarray, min_costs: np.ndarray, max_costs: np.ndarray, executable: bool):
+        self.states = states
+        self.min_costs = min_costs
+        self.max_costs = max_costs
+        self.executable = executable
+
+
+class TransitionMatrix:
+    """Boolean CSR matrix over state indices, with the least and greatest duration of each entry.
+
+    ``executable[i]`` is set when every path from state i follows the whole
+    sequence of actions the matrix stands for.
+    """
+
+    __slots__ = ("indptr", "indices", "min_durations", "max_durations", "executable")
+
+    def __init__(
+        self,
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        min_durations: np.ndarray,
+        max_durations: np.ndarray,
+        executable: np.ndarray,
+    ):
+        self.indptr = indptr
+        self.indices = indices
+        self.min_durations = min_durations
+        self.max_durations = max_durations
+        self.executable = executable
+
+    @classmethod
+    def from_entries(
+        cls,
+        size: int,
+        rows: np.ndarray,
+        columns: np.ndarray,
+        min_durations: np.ndarray,
+        max_durations: np.ndarray,
+        executable: np.ndarray = None,
+    ) -> "TransitionMatrix":
+        order = np.argsort(rows, kind="stable")
+        counts = np.bincount(rows, minlength=size)
+        indptr = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        if executable is None:
+            executable = counts > 0
+        return cls(indptr, columns[order], min_durations[order], max_durations[order], executable)
+
+    @property
+    def size(self) -> int:
+        return len(self.indptr) - 1
+
+    @property
+    def nnz(self) -> int:
+        return len(self.indices)
+
+    def entry_rows(self) -> np.ndarray:
+        return np.repeat(np.arange(self.size, dtype=np.int64), np.diff(self.indptr))
+
+    def compose(self, other: "TransitionMatrix") -> "TransitionMatrix":
+        """Matrix of this sequence of actions followed by the one of ``other``."""
+        rows, middles = self.entry_rows(), self.indices
+        starts = other.indptr[middles]
+        counts = other.indptr[middles + 1] - starts
+        positions = _expand(starts, counts)
+        rows_out = np.repeat(rows, counts)
+        columns = other.indices[positions]
+        min_durations = np.repeat(self.min_durations, counts) + other.min_durations[positions]
+        max_durations = np.repeat(self.max_durations, counts) + other.max_durations[positions]
+
+        # paths between the same two states become one entry spanning their durations
+        keys, inverse = np.unique(rows_out * self.size + columns, return_inverse=True)
+        merged_min = np.full(len(keys), _NO_COST, dtype=np.int64)
+        merged_max = np.full(len(keys), _NO_MAX_COST, dtype=np.int64)
+        np.minimum.at(merged_min, inverse, min_durations)
+        np.maximum.at(merged_max, inverse, max_durations)
+
+        blocked = np.zeros(self.size, dtype=bool)
+        blocked[rows[~other.executable[middles]]] = True
+        return TransitionMatrix.from_entries(
+            self.size, keys // self.size, keys % self.size, merged_min, merged_max, self.executable & ~blocked
+        )
+
+    def apply(self, frontier: Frontier) -> Frontier:
+        """Frontier reached from ``frontier`` by the sequence of actions of the matrix."""
+        rows = np.flatnonzero(frontier.states)
+        starts = self.indptr[rows]
+        counts = self.indptr[rows + 1] - starts
+        positions = _expand(starts, counts)
+        sources = np.repeat(rows, counts)
+        columns = self.indices[positions]
+
+        states = np.zeros(self.size, dtype=bool)
+        states[columns] = True
+        min_costs = np.full(self.size, _NO_COST, dtype=np.int64)
+        max_costs = np.full(self.size, _NO_MAX_COST, dtype=np.int64)
+        np.minimum.at(min_costs, columns, frontier.min_costs[sources] + self.min_durations[positions])
+        np.maximum.at(max_costs, columns, frontier.max_costs[sources] + self.max_durations[positions])
+        executable = frontier.executable and bool(self.executable[rows].all())
+        return Frontier(states, min_costs, max_costs, executable)
+
+
+class SparseTransitions:
+    """Transition matrices of the actions of an explicit TransitionGraph, over its possible states.
+
+    A row holds every outcome of the action in a state, so a set of states
+    propagates over all branches at once. Sequences used
+    ``COMPOSE_AFTER_USES`` times are composed into one matrix and kept, so
+    repeating them, or a longer sequence starting with them, costs a lookup.
+    """
+
+    def __init__(self, graph, max_compositions: int = DEFAULT_COMPOSITIONS):
+        if graph.lazy is not None or graph.symbolic is not None:
+            raise ValueError(f"Sparse transition matrices need explicit edges, not the {graph.backend} backend")
+        self.graph = graph
+        self.version = graph.version
+        states = set(graph.generate_possible_states())
+        for targets in graph.adjacency.values():
+            states.update(targets)
+        self.states = sorted(states, key=lambda state: state.code)
+        self.codes = np.array([state.code for state in self.states], dtype=np.int64)
+        self.index = {state: i for i, state in enumerate(self.states)}
+        self.matrices = {action: self._action_matrix(action) for action in graph.actions}
+        self.max_compositions = max_compositions
+        self.compositions: "OrderedDict[Tuple[str, ...], TransitionMatrix]" = OrderedDict()
+        self.uses: Dict[Tuple[str, ...], int] = {}
+
+    @property
+    def size(self) -> int:
+        return len(self.states)
+
+    def _durations(self, action: str) -> np.ndarray:
+        """Duration of the action from each state, by the last matching ``lasts`` entry."""
+        durations = np.zeros(self.size, dtype=np.int64)
+        order = self.graph.fluent_order
+        for precondition, duration in self.graph.duration_rules.get(action, ()):
+            if precondition is None:
+                durations[:] = duration
+                continue
+            holds = np.zeros(self.size, dtype=bool)
+            for mask, value in precondition.masks(order):
+                holds |= (self.codes & mask) == value
+            durations[holds] = duration
+        return durations
+
+    def _action_matrix(self, action: str) -> TransitionMatrix:
+        adjacency = self.graph.adjacency
+        rows, columns = [], []
+        for i, state in enumerate(self.states):
+            targets = adjacency.get((state, action))
+            if targets:
+                rows.extend([i] * len(targets))
+                columns.extend(self.index[target] for target in targets)
+        rows = np.array(rows, dtype=np.int64)
+        columns = np.array(columns, dtype=np.int64)
+        durations = np.where(rows == columns, 0, self._durations(action)[rows])
+        return TransitionMatrix.from_entries(self.size, rows, columns, durations, durations)
+
+    def matrix(self, action: str) -> TransitionMatrix:
+        matrix = self.matrices.get(action)
+        if matrix is None:
+            # an unknown action is executable nowhere
+            empty = np.zeros(0, dtype=np.int64)
+            matrix = TransitionMatrix.from_entries(self.size, empty, empty, empty, empty)
+        return matrix
+
+    def satisfying(self, code: Optional[Tuple[int, int]]) -> np.ndarray:
+        """Whether each state satisfies a conjunction given as ``conjunction_code`` returns it; None matches none."""
+        if code is None:
+            return np.zeros(self.size, dtype=bool)
+        mask, value = code
+        return (self.codes & mask) == value
+
+    def frontier(self, code: Optional[Tuple[int, int]]) -> Frontier:
+        """States satisfying a conjunction given as ``conjunction_code`` returns it, reached at no cost."""
+        states = self.satisfying(code)
+        costs = np.zeros(self.size, dtype=np.int64)
+        return Frontier(states, costs, costs.copy(), True)
+
+    def composition(self, actions: Tuple[str, ...]) -> TransitionMatrix:
+        """Matrix of a sequence of actions, composed from its longest kept prefix on and kept."""
+        if len(actions) == 1:
+            return self.matrix(actions[0])
+        matrix = self.compositions.get(actions)
+        if matrix is not None:
+            self.compositions.move_to_end(actions)
+            return matrix
+        cut = len(actions) - 1
+        while cut > 1 and actions[:cut] not in self.compositions:
+            cut -= 1
+        matrix = self.composition(actions[:cut])
+        for action in actions[cut:]:
+            matrix = matrix.compose(self.matrix(action))
+        self.compositions[actions] = matrix
+        while len(self.compositions) > self.max_compositions:
+            self.compositions.popitem(last=False)
+        return matrix
+
+    def follow(self, frontier: Frontier, actions: Tuple[str, ...]) -> Frontier:
+        """Frontier after the actions, stepping over kept compositions of their subsequences."""
+        if len(self.uses) > 16 * self.max_compositions:
+            self.uses.clear()
+        uses = self.uses[actions] = self.uses.get(actions, 0) + 1
+        if len(actions) > 1 and uses >= COMPOSE_AFTER_USES:
+            return self.composition(actions).apply(frontier)
+        position = 0
+        while position < len(actions):
+            end = len(actions)
+            while end > position + 1 and actions[position:end] not in self.compositions:
+                end -= 1
+            frontier = self.composition(actions[position:end]).apply(frontier)
+            position = end
+        return frontier
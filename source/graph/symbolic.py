@@ -0,0 +1,336 @@
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from pyeda.boolalg.bdd import (
+    BDDNODEONE,
+    BDDNODEZERO,
+    BDDONE,
+    BDDZERO,
+    BinaryDecisionDiagram,
+    _bdd,
+    _bddnode,
+    bddvar,
+)
+
+from source.parsers.logical_formula_parser import CompiledFormula, conjoin_masks
+
+
+# pyeda's own operators re-restrict whole subgraphs at every recursion step and
+# keep no computed table, so the engine uses these memoized node operations.
+
+def _and(f, g, cache):
+    if f is BDDNODEZERO or g is BDDNODEZERO:
+        return BDDNODEZERO
+    if f is BDDNODEONE or f is g:
+        return g
+    if g is BDDNODEONE:
+        return f
+    key = (f, g) if id(f) < id(g) else (g, f)
+    result = cache.get(key)
+    if result is None:
+        root = min(f.root, g.root)
+        f0, f1 = (f.lo, f.hi) if f.root == root else (f, f)
+        g0, g1 = (g.lo, g.hi) if g.root == root else (g, g)
+        result = cache[key] = _bddnode(root, _and(f0, g0, cache), _and(f1, g1, cache))
+    return result
+
+
+def _or(f, g, cache):
+    if f is BDDNODEONE or g is BDDNODEONE:
+        return BDDNODEONE
+    if f is BDDNODEZERO or f is g:
+        return g
+    if g is BDDNODEZERO:
+        return f
+    key = (f, g) if id(f) < id(g) else (g, f)
+    result = cache.get(key)
+    if result is None:
+        root = min(f.root, g.root)
+        f0, f1 = (f.lo, f.hi) if f.root == root else (f, f)
+        g0, g1 = (g.lo, g.hi) if g.root == root else (g, g)
+        result = cache[key] = _bddnode(root, _or(f0, g0, cache), _or(f1, g1, cache))
+    return result
+
+
+def _not(f, cache):
+    if f is BDDNODEZERO:
+        return BDDNODEONE
+    if f is BDDNODEONE:
+        return BDDNODEZERO
+    result = cache.get(f)
+    if result is None:
+        result = cache[f] = _bddnode(f.root, _not(f.lo, cache), _not(f.hi, cache))
+    return result
+
+
+def _exists(f, roots, cache, or_cache):
+    if f is BDDNODEZERO or f is BDDNODEONE:
+        return f
+    result = cache.get(f)
+    if result is None:
+        lo = _exists(f.lo, roots, cache, or_cache)
+        hi = _exists(f.hi, roots, cache, or_cache)
+        if f.root in roots:
+            result = _or(lo, hi, or_cache)
+        else:
+            result = _bddnode(f.root, lo, hi)
+        cache[f] = result
+    return result
+
+
+def _rename(f, roots, cache):
+    if f is BDDNODEZERO or f is BDDNODEONE:
+        return f
+    result = cache.get(f)
+    if result is None:
+        result = cache[f] = _bddnode(roots.get(f.root, f.root), _rename(f.lo, roots, cache), _rename(f.hi, roots, cache))
+    return result
+
+
+def conj(*functions: BinaryDecisionDiagram) -> BinaryDecisionDiagram:
+    cache = {}
+    node = BDDNODEONE
+    for function in functions:
+        node = _and(node, function.node, cache)
+    return _bdd(node)
+
+
+def disj(*functions: BinaryDecisionDiagram) -> BinaryDecisionDiagram:
+    cache = {}
+    node = BDDNODEZERO
+    for function in functions:
+        node = _or(node, function.node, cache)
+    return _bdd(node)
+
+
+def neg(function: BinaryDecisionDiagram) -> BinaryDecisionDiagram:
+    return _bdd(_not(function.node, {}))
+
+
+def exists(function: BinaryDecisionDiagram, variables: Iterable[BinaryDecisionDiagram]) -> BinaryDecisionDiagram:
+    roots = {variable.uniqid for variable in variables}
+    return _bdd(_exists(function.node, roots, {}, {}))
+
+
+class SymbolicTransitionSystem:
+    """Domain kept as pyeda BDDs over current (index 0) and next (index 1) fluent variables.
+
+    States, ``always`` constraints, ``impossible`` rules and the transition
+    relation of every action are BDDs, so no state is ever enumerated.
+    """
+
+    def __init__(self, order):
+        self.order = order
+        self.current = {}
+        self.next = {}
+        for fluent in order.fluents:
+            # interleave current and next variables to keep frame axioms linear
+            self.current[fluent] = bddvar(fluent, 0)
+            self.next[fluent] = bddvar(fluent, 1)
+        self.current_variables = [self.current[fluent] for fluent in order.fluents]
+        self.next_variables = [self.next[fluent] for fluent in order.fluents]
+        self._current_to_next = {self.current[f].uniqid: self.next[f].uniqid for f in order.fluents}
+        self._next_to_current = {self.next[f].uniqid: self.current[f].uniqid for f in order.fluents}
+        # renaming node by node is only valid when it keeps the variable order
+        current_ranks = sorted(order.fluents, key=lambda f: self.current[f].uniqid)
+        self._order_preserving = current_ranks == sorted(order.fluents, key=lambda f: self.next[f].uniqid)
+
+        self.allowed: BinaryDecisionDiagram = BDDONE
+        self.always_fluents: List[str] = []
+        self.impossible: Dict[str, BinaryDecisionDiagram] = {}
+        self.relations: Dict[str, BinaryDecisionDiagram] = {}
+        self.initial: BinaryDecisionDiagram = BDDZERO
+        self.ending: BinaryDecisionDiagram = BDDZERO
+        self._has_always = False
+        self._allowed_next = None
+
+    def literal(self, fluent: str, value: bool, next_state: bool = False) -> BinaryDecisionDiagram:
+        variable = (self.next if next_state else self.current)[fluent]
+        return variable if value else neg(variable)
+
+    def formula(self, formula: CompiledFormula, next_state: bool = False) -> BinaryDecisionDiagram:
+        return disj(*(
+            conj(*(self.literal(fluent, value, next_state) for fluent, value in term))
+            for term in formula.terms
+        ))
+
+    def conditions(self, conditions: str) -> BinaryDecisionDiagram:
+        """BDD of a conjunction of literals separated by '&', as used in queries."""
+        literals = []
+        for condition in conditions.split('&'):
+            condition = condition.strip()
+            if condition.startswith('~'):
+                literals.append(self.literal(condition[1:].strip(), False))
+            else:
+                literals.append(self.literal(condition, True))
+        return conj(*literals)
+
+    def to_next(self, states: BinaryDecisionDiagram) -> BinaryDecisionDiagram:
+        if self._order_preserving:
+            return _bdd(_rename(states.node, self._current_to_next, {}))
+        return states.compose({self.current[f]: self.next[f] for f in self.order.fluents})
+
+    def to_current(self, states: BinaryDecisionDiagram) -> BinaryDecisionDiagram:
+        if self._order_preserving:
+            return _bdd(_rename(states.node, self._next_to_current, {}))
+        return states.compose({self.next[f]: self.current[f] for f in self.order.fluents})
+
+    @property
+    def allowed_next(self) -> BinaryDecisionDiagram:
+        if self._allowed_next is None:
+            self._allowed_next = self.to_next(self.allowed)
+        return self._allowed_next
+
+    def add_always(self, states: BinaryDecisionDiagram, fluents: Sequence[str]) -> None:
+        self.allowed = disj(self.allowed, states) if self._has_always else states
+        self._has_always = True
+        self._allowed_next = None
+        for fluent in dict.fromkeys(fluents):
+            if fluent not in self.always_fluents:
+                self.always_fluents.append(fluent)
+
+    def add_impossible(self, action: str, states: BinaryDecisionDiagram) -> None:
+        self.impossible[action] = disj(self.impossible.get(action, BDDZERO), states)
+
+    def add_relation(self, action: str, relation: BinaryDecisionDiagram) -> None:
+        self.relations[action] = disj(self.relations.get(action, BDDZERO), relation)
+
+    def sources(self, action: str) -> BinaryDecisionDiagram:
+        return conj(self.allowed, neg(self.impossible.get(action, BDDZERO)))
+
+    def image(self, states: BinaryDecisionDiagram, action: str) -> BinaryDecisionDiagram:
+        relation = self.relations.get(action, BDDZERO)
+        return self.to_current(exists(conj(states, relation), self.current_variables))
+
+    def preimage(self, states: BinaryDecisionDiagram, action: str) -> BinaryDecisionDiagram:
+        relation = self.relations.get(action, BDDZERO)
+        return exists(conj(relation, self.to_next(states)), self.next_variables)
+
+    def enabled(self, action: str) -> BinaryDecisionDiagram:
+        return exists(self.relations.get(action, BDDZERO), self.next_variables)
+
+    def releases_relation(self, action: str, fluent: str, precondition: CompiledFormula) -> BinaryDecisionDiagram:
+        changed = self.current[fluent] ^ self.next[fluent]
+        return conj(
+            self.sources(action),
+            self.formula(precondition),
+            changed,
+            self._frame(f for f in self.order.fluents if f != fluent),
+            self.allowed_next,
+        )
+
+    def causes_relation(
+        self,
+        action: str,
+        statements: Sequence[Tuple[CompiledFormula, CompiledFormula]],
+        check_effects: Optional[Callable[[List[CompiledFormula]], None]] = None,
+    ) -> BinaryDecisionDiagram:
+        """Minimal-change relation of the ``causes`` statements, given as (effect, precondition) pairs."""
+        preconditions = [self.formula(precondition) for _, precondition in statements]
+        allowed_sources = self.sources(action)
+        relations = []
+        for group, active in self._signatures(self.allowed, preconditions, 0, []):
+            effects = [statements[i][0] for i in active]
+            if check_effects is not None:
+                check_effects(effects)
+            group = conj(group, allowed_sources)
+            terms = conjoin_masks([effect.masks(self.order) for effect in effects])
+            if terms and not group.is_zero():
+                relations.append(self._minimal_change(group, terms))
+        return disj(*relations)
+
+    def _signatures(self, states, preconditions, index, active):
+        """Splits ``states`` by which preconditions hold, skipping empty combinations."""
+        if states.is_zero():
+            return
+        if index == len(preconditions):
+            yield states, list(active)
+            return
+        yield from self._signatures(conj(states, neg(preconditions[index])), preconditions, index + 1, active)
+        yield from self._signatures(conj(states, preconditions[index]), preconditions, index + 1, active + [index])
+
+    def _minimal_change(self, sources: BinaryDecisionDiagram, terms: Sequence[Tuple[int, int]]) -> BinaryDecisionDiagram:
+        """Targets of ``sources`` in the cubes of ``terms`` that change the fewest fluents.
+
+        Each term is first applied as is, keeping every other fluent; free
+        ``always`` fluents are flipped, fewest first, only for sources whose
+        projections all leave the allowed states.
+        """
+        fluents = self.order.fluents
+        frames, projections, distances, free_fluents = [], [], [], []
+        for mask, value in terms:
+            fixed = [fluent for i, fluent in enumerate(fluents) if mask >> i & 1]
+            frame = conj(*(
+                self.literal(fluent, bool(value >> i & 1), next_state=True) if mask >> i & 1
+                else neg(self.current[fluent] ^ self.next[fluent])
+                for i, fluent in enumerate(fluents)
+            ))
+            frames.append(frame)
+            projections.append(conj(frame, self.allowed_next))
+            # distances[t][k]: sources that differ from the cube of term t in exactly k fluents
+            distances.append(self._exactly([
+                self.literal(fluent, not value >> self.order.index[fluent] & 1) for fluent in fixed
+            ]))
+            free_fluents.append([fluent for fluent in self.always_fluents if fluent not in fixed])
+
+        relation = []
+        unresolved = sources
+        widened: Dict[int, List[BinaryDecisionDiagram]] = {}
+        total = 0
+        while not unresolved.is_zero() and total <= len(fluents):
+            layer, resolved = [], []
+            for t, projection in enumerate(projections):
+                for extra in range(0, min(total, len(free_fluents[t])) + 1):
+                    if total - extra >= len(distances[t]):
+                        continue
+                    candidates = conj(unresolved, distances[t][total - extra])
+                    if candidates.is_zero():
+                        continue
+                    if extra:
+                        if t not in widened:
+                            widened[t] = [
+                                conj(moves, self.allowed_next)
+                                for moves in self._widenings(frames[t], free_fluents[t])
+                            ]
+                        if extra >= len(widened[t]):
+                            continue
+                        moves = widened[t][extra]
+                    else:
+                        moves = projection
+                    layer.append(conj(candidates, moves))
+                    resolved.append(candidates)
+            layer = disj(*layer)
+            relation.append(layer)
+            if self._has_always:
+                # a projection may leave 'always', so only sources with an allowed target are done
+                resolved = exists(layer, self.next_variables)
+            else:
+                resolved = disj(*resolved)
+            unresolved = conj(unresolved, neg(resolved))
+            total += 1
+        return disj(*relation)
+
+    def _widenings(self, frame: BinaryDecisionDiagram, free_fluents: Sequence[str]) -> List[BinaryDecisionDiagram]:
+        """Frame with exactly k of the free ``always`` fluents flipped, for every k."""
+        unframed = exists(frame, [self.next[fluent] for fluent in free_fluents])
+        return [
+            conj(unframed, flips)
+            for flips in self._exactly([self.current[fluent] ^ self.next[fluent] for fluent in free_fluents])
+        ]
+
+    def _frame(self, fluents) -> BinaryDecisionDiagram:
+        return conj(*(neg(self.current[fluent] ^ self.next[fluent]) for fluent in fluents))
+
+    @staticmethod
+    def _exactly(conditions: Sequence[BinaryDecisionDiagram]) -> List[BinaryDecisionDiagram]:
+        """``counts[k]`` holds when exactly k of the conditions hold."""
+        counts = [BDDONE]
+        for condition in conditions:
+            negated = neg(condition)
+            counts = [
+                disj(
+                    conj(counts[k], negated) if k < len(counts) else BDDZERO,
+                    conj(counts[k - 1], condition) if k > 0 else BDDZERO,
+                )
+                for k in range(len(counts) + 1)
+            ]
+        return counts
@@ -1,62 +1,146 @@
-from itertools import product
-from math import sqrt
-from typing import Dict, List, Union, Tuple
+from collections.abc import Mapping
+from itertools import count, product
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Union, Tuple
 
-import matplotlib.colors as mcolors
-import matplotlib.pyplot as plt
-import networkx as nx
 import numpy as np
 
+from source.parsers.logical_formula_parser import CompiledFormula
+
+if TYPE_CHECKING:
+    import matplotlib.pyplot as plt
+    import networkx as nx
+
+
+class FluentOrder:
+    """Ordering of the fluents of a domain: fluent ``i`` is bit ``i`` of a state code."""
+
+    __slots__ = ("fluents", "index", "_hash")
+
+    def __init__(self, fluents: Iterable[str]):
+        self.fluents = tuple(fluents)
+        self.index = {fluent: i for i, fluent in enumerate(self.fluents)}
+        self._hash = hash(self.fluents)
+
+    def __eq__(self, other: "FluentOrder") -> bool:
+        if self is other:
+            return True
+        if not isinstance(other, FluentOrder):
+            return NotImplemented
+        return self.fluents == other.fluents
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __reduce__(self):
+        # rebuilt from the fluents, so that the hash is recomputed in the process unpickling it
+        return FluentOrder, (self.fluents,)
+
+    def __len__(self) -> int:
+        return len(self.fluents)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.fluents)
+
+    def bit(self, fluent: str) -> int:
+        return 1 << self.index[fluent]
+
+    def encode(self, fluents: Mapping[str, bool]) -> int:
+        code = 0
+        for fluent, value in fluents.items():
+            if value:
+                code |= 1 << self.index[fluent]
+        return code
+
+
+class FluentsView(Mapping):
+    """Read-only dict-like view of the fluent values of a state."""
+
+    __slots__ = ("_code", "_order")
+
+    def __init__(self, code: int, order: FluentOrder):
+        self._code = code
+        self._order = order
+
+    def __getitem__(self, fluent: str) -> bool:
+        return bool(self._code >> self._order.index[fluent] & 1)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._order.fluents)
+
+    def __len__(self) -> int:
+        return len(self._order.fluents)
+
+    def __repr__(self) -> str:
+        return repr(dict(self.items()))
+
+    def copy(self) -> Dict[str, bool]:
+        return dict(self.items())
+
 
 class StateNode:
-    def __init__(self, fluents: Dict[str, bool]):
-        self.fluents = fluents
-        self.label = "\n".join(
+    __slots__ = ("code", "order")
+
+    def __init__(self, code: int, order: FluentOrder):
+        self.code = code
+        self.order = order
+
+    @classmethod
+    def from_fluents(cls, fluents: Mapping[str, bool]) -> "StateNode":
+        order = FluentOrder(fluents)
+        return cls(order.encode(fluents), order)
+
+    @property
+    def fluents(self) -> FluentsView:
+        return FluentsView(self.code, self.order)
+
+    @property
+    def label(self) -> str:
+        return "\n".join(
             [
-                fluent if value else f"~{fluent}"
-                for fluent, value in fluents.items()
+                fluent if self.code >> i & 1 else f"~{fluent}"
+                for i, fluent in enumerate(self.order.fluents)
             ]
         )
-        self.binary_repr = "".join(
-            ["1" if value else "0" for value in fluents.values()]
+
+    @property
+    def binary_repr(self) -> str:
+        return "".join(
+            ["1" if self.code >> i & 1 else "0" for i in range(len(self.order))]
         )
 
     def __eq__(self, other: "StateNode") -> bool:
-        return self.fluents == other.fluents
+        if not isinstance(other, StateNode):
+            return NotImplemented
+        return self.code == other.code and self.order == other.order
 
     def __hash__(self) -> int:
-        return hash(frozenset(self.fluents.items()))
+        return hash(self.code)
 
     def __str__(self) -> str:
         return self.label
 
-    def update(self, fluents: Dict[str, bool]) -> None:
-        self.fluents.update(fluents)
-        self.label = "\n".join(
-            [
-                fluent if value else f"~{fluent}"
-                for fluent, value in self.fluents.items()
-            ]
-        )
+    def __repr__(self) -> str:
+        return f"StateNode({self.fluents!r})"
 
 
 class Edge:
+    """Transition of a domain; its duration is looked up in the TransitionGraph's duration table."""
+
+    __slots__ = ("source", "action", "target")
+
     def __init__(
         self,
         source: StateNode,
         action: str,
         target: StateNode,
-        duration: int = 0,
     ):
         self.source = source
         self.action = action
         self.target = target
-        self.duration = duration
-        self.label = f"{action}\nDuration: {duration}"
 
     def __str__(self) -> str:
         return (
-            f"{self.source} --{self.action}--> {self.target} ({self.duration})"
+            f"{self.source} --{self.action}--> {self.target}"
         )
 
     def __eq__(self, other: "Edge") -> bool:
@@ -67,35 +151,260 @@ class Edge:
         )
 
     def __hash__(self) -> int:
-        return hash((self.source, self.action, self.target, self.duration))
+        return hash((self.source, self.action, self.target))
 
-    def add_duration(self, duration: int) -> None:
-        self.duration = duration
-        self.label = f"{self.action}\nDuration: {duration}"
+
+BACKENDS = ("python", "numpy", "symbolic", "lazy")
+# number of states the "top_k" level of detail keeps when drawing
+DEFAULT_TOP_K = 50
+
+_versions = count()
 
 
 class TransitionGraph:
-    def __init__(self):
+    def __init__(self, backend: str = "python"):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unsupported backend: {backend}")
+        self.backend = backend
+        # unique across graphs and renewed by mark_changed, so answers can be cached per version
+        self.version = next(_versions)
         self.fluents: List[str] = []
         self.actions: List[str] = []
         self.states: List[StateNode] = []
+        self._adjacency = None
+        self._reverse_adjacency = None
+        self._action_arrays = None
         self.edges: List[Edge] = []
         self.possible_initial_states = []
         self.possible_ending_states = []
         self.always_states = []
-        self.impossible_edges = []
+        self.impossible_rules: Dict[str, List[CompiledFormula]] = {}
+        self._fluent_order = None
+        self._interned_states: Dict[int, StateNode] = {}
+
+        # numpy backend: state sets are boolean masks indexed by state code and
+        # edges are kept as code arrays until Edge objects are requested.
+        self._state_space = None
+        self._symbolic = None
+        self._lazy = None
+        self.possible_mask = None
+        self.impossible_masks: Dict[str, np.ndarray] = {}
+        self.edge_arrays: List[Tuple[str, np.ndarray, np.ndarray]] = []
+        # action -> [(precondition or None, duration)], the last matching entry wins
+        self.duration_rules: Dict[str, List[Tuple[Optional[CompiledFormula], int]]] = {}
+
+    def mark_changed(self) -> None:
+        self.version = next(_versions)
+
+    @property
+    def fluent_order(self) -> FluentOrder:
+        if self._fluent_order is None:
+            self._fluent_order = FluentOrder(self.fluents)
+            self._interned_states = {}
+            self._state_space = None
+            self._symbolic = None
+            self._lazy = None
+        return self._fluent_order
+
+    @property
+    def state_space(self):
+        if self.backend != "numpy":
+            return None
+        order = self.fluent_order
+        if self._state_space is None:
+            from source.graph.vectorized import VectorizedStateSpace
+
+            self._state_space = VectorizedStateSpace(order)
+        return self._state_space
+
+    @property
+    def symbolic(self):
+        if self.backend != "symbolic":
+            return None
+        order = self.fluent_order
+        if self._symbolic is None:
+            from source.graph.symbolic import SymbolicTransitionSystem
+
+            self._symbolic = SymbolicTransitionSystem(order)
+        return self._symbolic
+
+    @property
+    def lazy(self):
+        if self.backend != "lazy":
+            return None
+        order = self.fluent_order
+        if self._lazy is None:
+            from source.graph.lazy import LazyTransitions
+
+            self._lazy = LazyTransitions(order)
+        return self._lazy
+
+    @property
+    def edges(self) -> List[Edge]:
+        if self.edge_arrays:
+            self._materialize_edge_arrays()
+        return self._edges
+
+    @edges.setter
+    def edges(self, edges: List[Edge]) -> None:
+        self._edges = edges
+        self._reset_indexes()
+
+    def _reset_indexes(self) -> None:
+        self._adjacency = None
+        self._reverse_adjacency = None
+        self._action_arrays = None
+
+    @property
+    def adjacency(self) -> Dict[Tuple[StateNode, str], List[StateNode]]:
+        """Index from (source, action) to targets, built on first use."""
+        if self._adjacency is None:
+            adjacency = {}
+            for edge in self._edges:
+                adjacency.setdefault((edge.source, edge.action), []).append(edge.target)
+            for action, sources, targets in self.edge_arrays:
+                for source, target in zip(sources.tolist(), targets.tolist()):
+                    adjacency.setdefault((self.get_state(source), action), []).append(self.get_state(target))
+            self._adjacency = adjacency
+        return self._adjacency
+
+    def targets(self, state: StateNode, action: str) -> List[StateNode]:
+        """Every outcome of the action in the state; empty when it is not executable there."""
+        transitions = self.lazy
+        if transitions is None:
+            return self.adjacency.get((state, action), [])
+        # lazy backend: expand (state, action) from the compiled rules on first request
+        if self._adjacency is None:
+            self._adjacency = {}
+        targets = self._adjacency.get((state, action))
+        if targets is None:
+            targets = self._adjacency[(state, action)] = [
+                self.get_state(code) for code in transitions.successors(state.code, action)
+            ]
+        return targets
+
+    def successors(self, state: StateNode, action: str) -> List[Tuple[StateNode, int]]:
+        return [(target, self.duration(state, action, target)) for target in self.targets(state, action)]
+
+    @property
+    def reverse_adjacency(self) -> Dict[Tuple[StateNode, str], List[StateNode]]:
+        """Index from (target, action) to sources, built on first use."""
+        if self._reverse_adjacency is None:
+            reverse_adjacency = {}
+            for (source, action), targets in self.adjacency.items():
+                for target in targets:
+                    reverse_adjacency.setdefault((target, action), []).append(source)
+            self._reverse_adjacency = reverse_adjacency
+        return self._reverse_adjacency
+
+    def predecessors(self, state: StateNode, action: str) -> List[StateNode]:
+        return self.reverse_adjacency.get((state, action), [])
+
+    def action_arrays(self, action: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Source and target codes of all edges of an action."""
+        if self._action_arrays is None:
+            codes: Dict[str, Tuple[List[int], List[int]]] = {}
+            for edge in self._edges:
+                sources, targets = codes.setdefault(edge.action, ([], []))
+                sources.append(edge.source.code)
+                targets.append(edge.target.code)
+            pairs = {
+                edge_action: ([np.array(sources, dtype=np.int64)], [np.array(targets, dtype=np.int64)])
+                for edge_action, (sources, targets) in codes.items()
+            }
+            for edge_action, edge_sources, edge_targets in self.edge_arrays:
+                sources, targets = pairs.setdefault(edge_action, ([], []))
+                sources.append(edge_sources.astype(np.int64))
+                targets.append(edge_targets.astype(np.int64))
+            self._action_arrays = {
+                edge_action: (np.concatenate(sources), np.concatenate(targets))
+                for edge_action, (sources, targets) in pairs.items()
+            }
+        empty = np.zeros(0, dtype=np.int64)
+        return self._action_arrays.get(action, (empty, empty))
+
+    def state_mask(self, states: Iterable[StateNode]) -> np.ndarray:
+        """Bitset over state codes, as a boolean array, of the given states."""
+        mask = np.zeros(1 << len(self.fluents), dtype=bool)
+        mask[[state.code for state in states]] = True
+        return mask
+
+    def preimage(self, states: np.ndarray, action: str) -> np.ndarray:
+        """Bitset of the states with an ``action`` edge into the ``states`` bitset."""
+        sources, targets = self.action_arrays(action)
+        mask = np.zeros_like(states)
+        mask[sources[states[targets]]] = True
+        return mask
+
+    def duration(self, source: StateNode, action: str, target: StateNode) -> int:
+        """Duration of a transition: the last matching ``lasts`` entry of the action, 0 for self-loops."""
+        if source == target:
+            return 0
+        for precondition, duration in reversed(self.duration_rules.get(action, ())):
+            if precondition is None or precondition.evaluate_code(source.code, source.order):
+                return duration
+        return 0
+
+    def has_negative_durations(self) -> bool:
+        """Whether a ``lasts`` entry is negative, so that a cost may shrink along a path."""
+        return any(duration < 0 for rules in self.duration_rules.values() for _, duration in rules)
+
+    def _materialize_edge_arrays(self) -> None:
+        edges = set(self._edges)
+        for action, sources, targets in self.edge_arrays:
+            for source, target in zip(sources.tolist(), targets.tolist()):
+                edges.add(Edge(self.get_state(source), action, self.get_state(target)))
+        self.edge_arrays = []
+        self._edges = list(edges)
+
+    def edge_count(self) -> int:
+        """Number of edges, without turning pending edge arrays into Edge objects."""
+        return len(self._edges) + sum(len(sources) for _, sources, _ in self.edge_arrays)
+
+    def add_edge_arrays(self, action: str, sources: np.ndarray, targets: np.ndarray) -> None:
+        self.edge_arrays.append((action, sources, targets))
+        self._reset_indexes()
+
+    def add_impossible_mask(self, action: str, mask: np.ndarray) -> None:
+        if action in self.impossible_masks:
+            mask = self.impossible_masks[action] | mask
+        self.impossible_masks[action] = mask
+
+    def set_action_duration(self, action: str, duration: int, precondition: Optional[CompiledFormula] = None) -> None:
+        self.duration_rules.setdefault(action, []).append((precondition, duration))
+
+    def clear_action_durations(self, action: str) -> None:
+        self.duration_rules.pop(action, None)
+
+    def add_always_mask(self, mask: np.ndarray) -> None:
+        if self.possible_mask is not None:
+            mask = self.possible_mask | mask
+        self.possible_mask = mask
 
     def add_fluents(self, fluents: str) -> None:
         for fluent in fluents:
             if fluent not in self.fluents:
                 self.fluents.append(fluent)
+                self._fluent_order = None
 
-    def add_durations(self, durations: List[Tuple[int, int]]) -> None:
-        for (index, time) in durations:
-            self.edges[index].add_duration(time)
+    def get_state(self, code: int) -> StateNode:
+        order = self.fluent_order
+        state = self._interned_states.get(code)
+        if state is None:
+            state = self._interned_states[code] = StateNode(code, order)
+        return state
 
-    def add_impossible_edges(self, edges: List[Edge]) -> None:
-        self.impossible_edges = list(set(self.impossible_edges + edges))
+    def state_from_fluents(self, fluents: Mapping[str, bool]) -> StateNode:
+        return self.get_state(self.fluent_order.encode(fluents))
+
+    def add_impossible_rule(self, action: str, precondition: CompiledFormula) -> None:
+        self.impossible_rules.setdefault(action, []).append(precondition)
+
+    def is_impossible(self, state: StateNode, action: str) -> bool:
+        return any(
+            precondition.evaluate_code(state.code, state.order)
+            for precondition in self.impossible_rules.get(action, ())
+        )
 
     def add_possible_initial_states(self, states: List[StateNode]) -> None:
         self.possible_initial_states = list(set(self.possible_initial_states + states))
@@ -125,11 +434,13 @@ class TransitionGraph:
 
     def generate_all_states(self) -> None:
         return [
-            StateNode(dict(zip(self.fluents, values)))
-            for values in product([True, False], repeat=len(self.fluents))
+            self.get_state(code)
+            for code in range((1 << len(self.fluents)) - 1, -1, -1)
         ]
 
     def generate_possible_states(self) -> None:
+        if self.possible_mask is not None:
+            return [self.get_state(code) for code in np.flatnonzero(self.possible_mask).tolist()]
         if self.always_states:
             return self.always_states
         return self.generate_all_states()
@@ -154,7 +465,7 @@ class TransitionGraph:
                 for new_target in target_state_combinations:
                     new_edges.append(
                         Edge(
-                            new_source, edge.action, new_target, edge.duration
+                            new_source, edge.action, new_target
                         )
                     )
 
@@ -167,132 +478,42 @@ class TransitionGraph:
         for values in product([True, False], repeat=len(new_fluents)):
             new_state_fluents = state.fluents.copy()
             new_state_fluents.update(dict(zip(new_fluents, values)))
-            combinations.append(StateNode(new_state_fluents))
+            combinations.append(StateNode.from_fluents(new_state_fluents))
         return combinations
 
-    def generate_graph(self) -> nx.MultiDiGraph:
+    def generate_graph(self) -> "nx.MultiDiGraph":
+        import networkx as nx
+
         G = nx.MultiDiGraph()
 
         for edge in self.edges:
-            G.add_edge(edge.source, edge.target, label=edge.label, weight=int(edge.duration))
-            G.edges[edge.source, edge.target, 0]["action"] = edge.action
+            duration = self.duration(edge.source, edge.action, edge.target)
+            G.add_edge(
+                edge.source,
+                edge.target,
+                label=f"{edge.action}\nDuration: {duration}",
+                weight=duration,
+                action=edge.action,
+            )
 
         for state in self.generate_possible_states():
             G.add_node(state)
 
         return G
 
-    def draw_graph(self) -> plt.Figure:
-        G = self.generate_graph()
-
-        pos = nx.spring_layout(G, k=10 / sqrt(G.order()))
-        fig, ax = plt.subplots(figsize=(20, 20))
-
-        # add padding to the graph
-        x_values, y_values = zip(*pos.values())
-        x_min, x_max = min(x_values), max(x_values)
-        y_min, y_max = min(y_values), max(y_values)
-
-        padding = 0.2 
-        x_min -= padding
-        x_max += padding
-        y_min -= padding
-        y_max += padding
-
-        ax.set_xlim([x_min, x_max])
-        ax.set_ylim([y_min, y_max])
-
-        node_colors = []
-        for node in G.nodes:
-            if node in self.possible_initial_states:
-                node_colors.append("green")
-            elif node in self.possible_ending_states:
-                node_colors.append("red")
-            else:
-                node_colors.append("lightblue")
-
-        node_sizes = [1000 + 500 * len(str(node)) for node in G.nodes]
-        nx.draw_networkx_nodes(
-            G,
-            pos,
-            node_shape="o",
-            node_size=node_sizes,
-            ax=ax,
-            node_color=node_colors,
-            linewidths=1,
-            edgecolors="black",
-            alpha=0.3,
-        )
-        center_x = sum(x for x, y in pos.values()) / len(pos)
-        center_y = sum(y for x, y in pos.values()) / len(pos)
-
-        labels = {node: node.label for node in G.nodes()}
-        label_positions = {}
-        for node, (x, y) in pos.items():
-            dx = x - center_x
-            dy = y - center_y
-            angle = np.arctan2(dy, dx)
-            offset = 0.1  # Adjust this value to set the distance of the labels from the nodes
-            label_positions[node] = (
-                x + offset * np.cos(angle),
-                y + offset * np.sin(angle),
-            )
-        nx.draw_networkx_labels(
-            G,
-            label_positions,
-            labels,
-            ax=ax,
-            font_size=13,
-            font_weight="bold",
-            font_color="black",
-            bbox=dict(
-                facecolor="white", edgecolor="black", boxstyle="round,pad=0.2"
-            ),
-            alpha=0.8,
-        )
+    def draw_graph(self, detail: str = "full", top_k: int = DEFAULT_TOP_K) -> "plt.Figure":
+        """Draws the graph; ``detail`` selects a level of detail (see ``rendering.select``)."""
+        # networkx and matplotlib are only needed for drawing, so headless use never imports them
+        from source.graph.rendering import draw, select
 
-        # Generate a color map for the edge labels dynamically
-        unique_labels = list(set(nx.get_edge_attributes(G, "label").values()))
-        colors = list(
-            mcolors.TABLEAU_COLORS.keys()
-        )  # Use a predefined color palette
-        color_map = {
-            label: colors[i % len(colors)][4:]
-            for i, label in enumerate(unique_labels)
-        }
-
-        for edge in G.edges(data=True):
-            u, v, label = edge
-            edge_color = color_map.get(
-                label["label"], "black"
-            )  # Default to black if label not found
-            nx.draw_networkx_edges(
-                G,
-                pos,
-                edgelist=[(u, v)],
-                ax=ax,
-                arrowstyle="->",
-                arrowsize=30,
-                edge_color=edge_color,
-                width=2,
-                connectionstyle="arc3,rad=0.10",  # Adjust 'rad' for more curvature
-            )
-        ax.set_zorder(2)
-
-        edge_labels = nx.get_edge_attributes(G, "label")
-
-        nx.draw_networkx_edge_labels(
-            G,
-            pos,
-            edge_labels=edge_labels,
-            ax=ax,
-            font_size=10,
-            font_weight="bold",
-            font_color="black",
-            label_pos=0.3,
-            rotate=True,
-        )
+        return draw(select(self, detail, top_k))
+
+    def to_dot(self, detail: str = "full", top_k: int = DEFAULT_TOP_K) -> str:
+        from source.graph.rendering import select, to_dot
+
+        return to_dot(select(self, detail, top_k))
 
-        ax.set_axis_off()
+    def to_svg(self, detail: str = "full", top_k: int = DEFAULT_TOP_K) -> str:
+        from source.graph.rendering import select, to_svg
 
-        return fig
+        return to_svg(select(self, detail, top_k))
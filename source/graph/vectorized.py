@@ -0,0 +1,139 @@
+from itertools import combinations
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from source.parsers.logical_formula_parser import CompiledFormula, conjoin_masks
+
+MAX_VECTORIZED_FLUENTS = 26
+
+
+class VectorizedStateSpace:
+    """All 2^n states of a domain as a uint64 code vector, where a state's code is its index."""
+
+    def __init__(self, order):
+        if len(order) > MAX_VECTORIZED_FLUENTS:
+            raise ValueError(
+                f"Vectorized backend supports at most {MAX_VECTORIZED_FLUENTS} fluents, got {len(order)}"
+            )
+        self.order = order
+        self.size = 1 << len(order)
+        self.full_mask = self.size - 1
+        self.codes = np.arange(self.size, dtype=np.uint64)
+        # states a formula was evaluated on and targets checked against an allowed mask, for the profiler
+        self.evaluations = 0
+        self.membership_checks = 0
+
+    def all(self) -> np.ndarray:
+        return np.ones(self.size, dtype=bool)
+
+    def none(self) -> np.ndarray:
+        return np.zeros(self.size, dtype=bool)
+
+    def mask(self, formula: CompiledFormula) -> np.ndarray:
+        result = self.none()
+        self.evaluations += self.size
+        for mask, value in formula.masks(self.order):
+            result |= (self.codes & np.uint64(mask)) == np.uint64(value)
+        return result
+
+    def minimal_change_successors(
+        self,
+        statements: Sequence[Tuple[CompiledFormula, CompiledFormula]],
+        sources: np.ndarray,
+        allowed: np.ndarray,
+        blocked: Optional[np.ndarray] = None,
+        check_effects: Optional[Callable[[List[CompiledFormula]], None]] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Minimal-change targets of ``causes`` statements given as (effect, precondition) pairs.
+
+        For every source code, returns the allowed states that satisfy the effects
+        of all statements whose precondition holds in the source and that differ
+        from it in the fewest fluents. Sources flagged in ``blocked`` get no
+        successors, but their active effects are still passed to ``check_effects``.
+        """
+        if not sources.size:
+            return sources, sources
+
+        active = np.stack([self.mask(precondition)[sources] for _, precondition in statements], axis=1)
+        signatures, groups = np.unique(active, axis=0, return_inverse=True)
+        groups = groups.reshape(-1)
+
+        edge_sources, edge_targets = [], []
+        for index, signature in enumerate(signatures):
+            effects = [statements[i][0] for i in np.flatnonzero(signature)]
+            if check_effects is not None:
+                check_effects(effects)
+            group = groups == index
+            if blocked is not None:
+                group &= ~blocked
+            terms = conjoin_masks([effect.masks(self.order) for effect in effects])
+            if not terms or not group.any():
+                continue
+            group_sources, group_targets = self._nearest_in_terms(sources[group], terms, allowed)
+            edge_sources.append(group_sources)
+            edge_targets.append(group_targets)
+
+        if not edge_sources:
+            return sources[:0], sources[:0]
+        return np.concatenate(edge_sources), np.concatenate(edge_targets)
+
+    def _nearest_in_terms(
+        self, sources: np.ndarray, terms: Sequence[Tuple[int, int]], allowed: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        best = np.full(sources.size, np.iinfo(np.int64).max, dtype=np.int64)
+        candidates: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+
+        projections = []
+        for mask, value in terms:
+            mask, value = np.uint64(mask), np.uint64(value)
+            base = (sources & ~mask) | value
+            distance = _popcount((sources ^ value) & mask)
+            free_bits = [1 << i for i in range(len(self.order)) if not int(mask) >> i & 1]
+            projections.append((base, distance, free_bits))
+
+        extra = 0
+        while True:
+            expanded = False
+            for base, distance, free_bits in projections:
+                if extra > len(free_bits):
+                    continue
+                selected = np.flatnonzero(distance + extra <= best)
+                if not selected.size:
+                    continue
+                expanded = True
+                for flipped in combinations(free_bits, extra):
+                    targets = base[selected] ^ np.uint64(sum(flipped))
+                    self.membership_checks += targets.size
+                    ok = allowed[targets]
+                    if not ok.any():
+                        continue
+                    indices = selected[ok]
+                    distances = distance[indices] + extra
+                    candidates.append((indices, targets[ok], distances))
+                    np.minimum.at(best, indices, distances)
+            if not expanded:
+                break
+            extra += 1
+
+        if not candidates:
+            empty = np.zeros(0, dtype=np.uint64)
+            return empty, empty
+
+        indices = np.concatenate([c[0] for c in candidates])
+        targets = np.concatenate([c[1] for c in candidates])
+        distances = np.concatenate([c[2] for c in candidates])
+        keep = distances == best[indices]
+        pairs = np.unique(np.stack([sources[indices[keep]], targets[keep]], axis=1), axis=0)
+        return pairs[:, 0], pairs[:, 1]
+
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values).astype(np.int64)
+    values = values.astype(np.uint64)
+    count = np.zeros(values.shape, dtype=np.int64)
+    while values.any():
+        count += (values & np.uint64(1)).astype(np.int64)
+        values = values >> np.uint64(1)
+    return count
@@ -1,10 +1,14 @@
 import re
 
+import numpy as np
+
 from abc import ABC, abstractmethod
 from source.graph.transition_graph import TransitionGraph, StateNode, Edge
-from source.parsers.logical_formula_parser import LogicalFormulaParser
+from source.graph.lazy import minimal_change_targets
+from source.graph.symbolic import conj
+from source.parsers.logical_formula_parser import LogicalFormulaParser, CompiledFormula, compile_formula, conjoin_masks
 from typing import List, Dict, Tuple, Union, Any, Callable
-from functools import wraps
+from functools import partial, wraps
 
 def exception_handler_decorator(method: Callable) -> Callable:
     @wraps(method)
@@ -17,12 +21,29 @@ def exception_handler_decorator(method: Callable) -> Callable:
             raise RuntimeError(error_message) from e
     return wrapper
 
+class CountingMembership:
+    """Set of allowed state codes that counts the membership checks made against it."""
+
+    __slots__ = ("codes", "checks")
+
+    def __init__(self, codes):
+        self.codes = codes
+        self.checks = 0
+
+    def __contains__(self, code: int) -> bool:
+        self.checks += 1
+        return code in self.codes
+
+
 class CustomParser(ABC):
     def __init__(self, transition_graph: TransitionGraph):
         self.transition_graph = transition_graph
         self.logical_formula_parser = LogicalFormulaParser()
         self.name = self.__class__.__name__.split("Parser")[0].lower()
         self.statements = []
+        # work done by parse calls, read by the StatementParser profiler
+        self.evaluations = 0
+        self.membership_checks = 0
 
     @exception_handler_decorator 
     @abstractmethod
@@ -42,24 +63,23 @@ class CustomParser(ABC):
     def get_transition_graph(self) -> TransitionGraph:
         return self.transition_graph
 
-    def evaluate_formula(self, formula: str, state: StateNode) -> bool:
-        def replace_fluents_with_values(formula: str, state: StateNode) -> str:
-            for fluent, value in state.fluents.items():
-                formula = formula.replace(f"~{fluent}", str(not value))
-                formula = formula.replace(f"{fluent}",str(value))
-            return formula
-
-        logical_statements = self.logical_formula_parser.extract_logical_statements(formula)
-        if logical_statements is None:
+    def evaluate_formula(self, formula: Union[str, CompiledFormula], state: StateNode) -> bool:
+        if isinstance(formula, str):
+            formula = self.logical_formula_parser.compile_formula(formula)
+        if not formula.satisfiable:
             return None
-        for logical_statement in logical_statements:
-            formula = replace_fluents_with_values(logical_statement, state)
-            if eval(formula):
+        self.evaluations += 1
+        return formula.evaluate_code(state.code, state.order)
+
+    def is_impossible(self, state: StateNode, action: str) -> bool:
+        for precondition in self.transition_graph.impossible_rules.get(action, ()):
+            self.evaluations += 1
+            if precondition.evaluate_code(state.code, state.order):
                 return True
         return False
 
-    def precondition_met(self, precondition: Union[str, bool], state: StateNode,) -> bool:
-        if len(precondition) == 0:
+    def precondition_met(self, precondition: Union[str, CompiledFormula], state: StateNode,) -> bool:
+        if isinstance(precondition, str) and len(precondition) == 0:
             return True
         return self.evaluate_formula(precondition, state)
 
@@ -82,15 +102,33 @@ class InitiallyParser(CustomParser):
         return self.logical_formula_parser.extract_fluents(formula)
     
     def parse(self, statement: str) -> List:
-        initial_logic = statement.split("initially")[1].strip()
-        for state in self.transition_graph.generate_possible_states():
-            assert self.evaluate_formula(initial_logic, state) is not None, f"Contradictory statement in formula: {statement}"
+        initial_logic = self.logical_formula_parser.compile_formula(statement.split("initially")[1].strip())
+        states = self.transition_graph.generate_possible_states()
+        assert not states or initial_logic.satisfiable, f"Contradictory statement in formula: {statement}"
 
         return list(
-            filter(lambda state: self.evaluate_formula(initial_logic, state), 
-            self.transition_graph.generate_possible_states())
+            filter(lambda state: self.evaluate_formula(initial_logic, state), states)
         )
 
+    def parse_vectorized(self, statement: str) -> List[StateNode]:
+        initial_logic = self.logical_formula_parser.compile_formula(statement.split("initially")[1].strip())
+        possible = self.transition_graph.possible_mask
+        assert not possible.any() or initial_logic.satisfiable, f"Contradictory statement in formula: {statement}"
+
+        mask = self.transition_graph.state_space.mask(initial_logic) & possible
+        return [self.transition_graph.get_state(code) for code in np.flatnonzero(mask).tolist()]
+
+    def parse_lazy(self, statement: str) -> CompiledFormula:
+        initial_logic = self.logical_formula_parser.compile_formula(statement.split("initially")[1].strip())
+        assert initial_logic.satisfiable, f"Contradictory statement in formula: {statement}"
+        return initial_logic
+
+    def parse_symbolic(self, statement: str):
+        initial_logic = self.logical_formula_parser.compile_formula(statement.split("initially")[1].strip())
+        system = self.transition_graph.symbolic
+        assert system.allowed.is_zero() or initial_logic.satisfiable, f"Contradictory statement in formula: {statement}"
+        return conj(system.formula(initial_logic), system.allowed)
+
 
 class CausesParser(CustomParser):
     
@@ -112,40 +150,74 @@ class CausesParser(CustomParser):
         precondition_fluents = self.logical_formula_parser.extract_fluents(precondition_formula)
         return effect_fluents + precondition_fluents
 
-    def parse(self, statements: List) -> List:
+    def compile_statements(self, statements: List) -> Tuple[str, List[Tuple[CompiledFormula, CompiledFormula]]]:
+        compiled_statements = []
+        for statement in statements:
+            action, effect_formula, precondition_formula = self.get_action_effect_and_precondition(statement)
+            compiled_statements.append((
+                self.logical_formula_parser.compile_formula(effect_formula),
+                self.logical_formula_parser.compile_formula(precondition_formula),
+            ))
+        return action, compiled_statements
+
+    @staticmethod
+    def check_effects(effects: List[CompiledFormula], statements: List) -> None:
+        if effects:
+            formula = " & ".join(effect.formula for effect in effects)
+            assert compile_formula(formula).satisfiable, f"Inconsistent domain in formula(s): {statements}"
 
+    def parse(self, statements: List) -> List:
+        """Builds the edges of one action by applying the active effect terms to each source state."""
         edges = []
+        action, compiled_statements = self.compile_statements(statements)
+        order = self.transition_graph.fluent_order
+        allowed = CountingMembership({state.code for state in self.transition_graph.states})
 
         for from_state in self.transition_graph.states:
-            effect_formulas = []
-            updates = []
-            
-            for statement in statements:
-                action, effect_formula, precondition_formula = self.get_action_effect_and_precondition(statement)
-                
-                if self.precondition_met(precondition_formula, from_state):
-                    effect_formulas.append(effect_formula)
-            
-            for to_state in self.transition_graph.states:
-                if effect_formulas:
-                    formula = " & ".join(effect_formulas)
-                    assert self.evaluate_formula(formula, to_state) is not None, f"Inconsistent domain in formula(s): {statements}"   
-
-                if all(self.evaluate_formula(effect_formula, to_state) for effect_formula in effect_formulas) and \
-                        Edge(from_state, action, to_state) not in self.transition_graph.impossible_edges:
-                    difference = self.diff_between_states(from_state, to_state)
-                    updates.append((to_state, difference, len(difference)))
-            
-            # get all states with least amount of changes and create edges
-            if updates:
-                min_changes = min([update[2] for update in updates])
-                for update in updates:
-                    if update[2] == min_changes:
-                        to_state, difference, _ = update
-                        edges.append(Edge(from_state, action, to_state))
-        
+            effects = [
+                compiled_effect
+                for compiled_effect, compiled_precondition in compiled_statements
+                if self.precondition_met(compiled_precondition, from_state)
+            ]
+            self.check_effects(effects, statements)
+
+            if self.is_impossible(from_state, action):
+                continue
+
+            terms = conjoin_masks([effect.masks(order) for effect in effects])
+            for code in minimal_change_targets(from_state.code, terms, allowed, len(order)):
+                edges.append(Edge(from_state, action, self.transition_graph.get_state(code)))
+
+        self.membership_checks += allowed.checks
         return edges
 
+    def parse_vectorized(self, statements: List) -> Tuple[str, np.ndarray, np.ndarray]:
+        action, compiled_statements = self.compile_statements(statements)
+        state_space = self.transition_graph.state_space
+        possible = self.transition_graph.possible_mask
+        blocked = self.transition_graph.impossible_masks.get(action)
+        sources, targets = state_space.minimal_change_successors(
+            compiled_statements,
+            state_space.codes[possible],
+            possible,
+            blocked=blocked[possible] if blocked is not None else None,
+            check_effects=lambda effects: self.check_effects(effects, statements),
+        )
+        return action, sources, targets
+
+    def parse_symbolic(self, statements: List):
+        action, compiled_statements = self.compile_statements(statements)
+        relation = self.transition_graph.symbolic.causes_relation(
+            action,
+            compiled_statements,
+            check_effects=lambda effects: self.check_effects(effects, statements),
+        )
+        return action, relation
+
+    def parse_lazy(self, statements: List):
+        action, compiled_statements = self.compile_statements(statements)
+        # a partial rather than a lambda, so that the rules can be sent to worker processes
+        return action, compiled_statements, partial(self.check_effects, statements=statements)
 
     def diff_between_states(self, from_node: StateNode, to_node: StateNode) -> Dict[str, bool]:
         diff = {}
@@ -169,77 +241,120 @@ class ReleasesParser(CausesParser):
         edges = []
 
         action, modified_fluent, precondition_formula = self.get_action_effect_and_precondition(statement.replace("releases", "causes"))
+        precondition_formula = self.logical_formula_parser.compile_formula(precondition_formula)
+        states = set(self.transition_graph.states)
         for from_state in self.transition_graph.states:
             if self.precondition_met(precondition_formula, from_state):
-                to_state = StateNode(fluents=from_state.fluents.copy())
-                to_state.update({modified_fluent: not from_state.fluents[modified_fluent]})
+                to_state = self.transition_graph.get_state(from_state.code ^ from_state.order.bit(modified_fluent))
 
-                if to_state in self.transition_graph.states and Edge(from_state, action, to_state) not in self.transition_graph.impossible_edges:
+                self.membership_checks += 1
+                if to_state in states and not self.is_impossible(from_state, action):
                     edges.append(Edge(from_state, action, to_state))
         
         return edges
 
+    def parse_vectorized(self, statement: str) -> Tuple[str, np.ndarray, np.ndarray]:
+        action, modified_fluent, precondition_formula = self.get_action_effect_and_precondition(statement.replace("releases", "causes"))
+        precondition_formula = self.logical_formula_parser.compile_formula(precondition_formula)
+        state_space = self.transition_graph.state_space
+        possible = self.transition_graph.possible_mask
+
+        sources = possible & state_space.mask(precondition_formula)
+        if action in self.transition_graph.impossible_masks:
+            sources &= ~self.transition_graph.impossible_masks[action]
+        sources = state_space.codes[sources]
+        targets = sources ^ np.uint64(state_space.order.bit(modified_fluent))
+        state_space.membership_checks += targets.size
+        keep = possible[targets]
+        return action, sources[keep], targets[keep]
+
+    def parse_symbolic(self, statement: str):
+        action, modified_fluent, precondition_formula = self.get_action_effect_and_precondition(statement.replace("releases", "causes"))
+        precondition_formula = self.logical_formula_parser.compile_formula(precondition_formula)
+        return action, self.transition_graph.symbolic.releases_relation(action, modified_fluent, precondition_formula)
+
+    def parse_lazy(self, statement: str):
+        action, modified_fluent, precondition_formula = self.get_action_effect_and_precondition(statement.replace("releases", "causes"))
+        return action, modified_fluent, self.logical_formula_parser.compile_formula(precondition_formula)
+
 
 class LastsParser(CustomParser):
 
+    def get_action_duration_and_precondition(self, statement: str) -> Tuple[str, str, str]:
+        action, duration = map(str.strip, statement.split("lasts"))
+        duration, precondition_formula = map(str.strip, duration.split(" if ")) if " if " in duration else (duration, "")
+        return action, duration, precondition_formula
+
     def extract_actions(self, statement: str) -> str:
         return [statement.split("lasts")[0].strip()]
 
     def extract_fluents(self, statement: str) -> List[str]:
-        return []
+        _, _, precondition_formula = self.get_action_duration_and_precondition(statement)
+        return self.logical_formula_parser.extract_fluents(precondition_formula)
     
-    def parse(self, statement: str) -> None:
-        durations = []
-        action, duration = map(str.strip, statement.split("lasts"))
-        for i, edge in enumerate(self.transition_graph.edges):
-            if edge.action == action and edge.source != edge.target:
-                durations.append((i, int(duration)))
-        return durations
+    def parse(self, statement: str) -> Tuple[str, int, Union[CompiledFormula, None]]:
+        """Returns the action, its duration and the precondition it is limited to, if any."""
+        action, duration, precondition_formula = self.get_action_duration_and_precondition(statement)
+        precondition = self.logical_formula_parser.compile_formula(precondition_formula) if precondition_formula else None
+        return action, int(duration), precondition
 
 
 class AfterParser(CustomParser):
 
     def extract_actions(self, statement: str) -> str:
         action_chain = statement.split("after")[1].strip()
-        if ',' in action_chain:
-            return action_chain.split(",")
-        return [action_chain]
+        return [action.strip() for action in action_chain.split(",")]
 
     def extract_fluents(self, statement: str) -> List[str]:
         effect_formula, actions = statement.split("after")
         return self.logical_formula_parser.extract_fluents(effect_formula)
     
-    def parse(self, statement: str) -> None:
-        try:
-            possible_initial_states = self.transition_graph.possible_initial_states
-            possible_ending_states = []
-            effect_formula, actions = map(str.strip, statement.split("after"))
-            actions = actions.split(",")[::-1] if "," in actions else [actions]
-
-            # Find possible ending states
-            for logical_statement in self.logical_formula_parser.extract_logical_statements(effect_formula):
-                for edge in self.transition_graph.edges:
-                    if edge.action == actions[0]:
-                        fluent_dict = self.logical_formula_parser.extract_fluent_dict(logical_statement)
-                        if all(fluent in edge.target.fluents for fluent in fluent_dict):
-                            possible_ending_states.append(edge.target)
-        
-            # Find possible initial states
-            possible_states = possible_ending_states
-            possible_states_prev = []
-            for action in actions:
-                for edge in self.transition_graph.edges:
-                    if edge.action == action and edge.target in possible_states:
-                        possible_states_prev.append(edge.source)
-                if not possible_states_prev:
-                    raise ValueError(f"Contradictory statement for after statement. In formula: {effect_formula}")
-                possible_states = possible_states_prev
-                possible_states_prev = []
-            
-            initial_states_for_removal = [state for state in possible_initial_states if state not in possible_states]
-            return initial_states_for_removal, possible_ending_states
-        except:
-            return [], []
+    def parse(self, statement: str) -> Tuple[List[StateNode], List[StateNode]]:
+        possible_states, possible_ending_states = self.parse_masks(statement)
+        initial_states_for_removal = [
+            state for state in self.transition_graph.possible_initial_states if not possible_states[state.code]
+        ]
+        return initial_states_for_removal, possible_ending_states
+
+    def parse_masks(self, statement: str) -> Tuple[np.ndarray, List[StateNode]]:
+        """Returns the bitset of states from which the actions can end in the effect, and those ending states."""
+        effect_formula, actions = map(str.strip, statement.split("after"))
+        actions = self.extract_actions(statement)[::-1]
+        effect = self.logical_formula_parser.compile_formula(effect_formula)
+        order = self.transition_graph.fluent_order
+
+        # Find possible ending states
+        _, targets = self.transition_graph.action_arrays(actions[0])
+        targets = np.unique(targets).tolist()
+        self.evaluations += len(targets)
+        possible_ending_states = [
+            self.transition_graph.get_state(code) for code in targets if effect.evaluate_code(code, order)
+        ]
+
+        # Find possible initial states
+        possible_states = self.transition_graph.state_mask(possible_ending_states)
+        for action in actions:
+            possible_states = self.transition_graph.preimage(possible_states, action)
+            if not possible_states.any():
+                raise ValueError(f"Contradictory statement for after statement. In formula: {effect_formula}")
+        return possible_states, possible_ending_states
+
+    def parse_symbolic(self, statement: str):
+        """Returns the initial states that can end in the effect and the ending states."""
+        system = self.transition_graph.symbolic
+        effect_formula, actions = map(str.strip, statement.split("after"))
+        actions = self.extract_actions(statement)[::-1]
+
+        possible_ending_states = conj(
+            system.image(system.allowed, actions[0]),
+            system.formula(self.logical_formula_parser.compile_formula(effect_formula)),
+        )
+        possible_states = possible_ending_states
+        for action in actions:
+            possible_states = system.preimage(possible_states, action)
+            if possible_states.is_zero():
+                raise ValueError(f"Contradictory statement for after statement. In formula: {effect_formula}")
+        return possible_states, possible_ending_states
 
 
 class AlwaysParser(CustomParser):
@@ -266,8 +381,33 @@ class AlwaysParser(CustomParser):
             formula = f"{precondition_formula} => {effect_formula}"
         else:
             formula = effect_formula
+        formula = self.logical_formula_parser.compile_formula(formula)
         return list(filter(lambda state: self.evaluate_formula(formula, state), self.transition_graph.generate_all_states()))
 
+    def parse_vectorized(self, statement: str) -> np.ndarray:
+        effect_formula, precondition_formula = self.get_effect_and_precondition(statement)
+        if precondition_formula:
+            formula = f"{precondition_formula} => {effect_formula}"
+        else:
+            formula = effect_formula
+        return self.transition_graph.state_space.mask(self.logical_formula_parser.compile_formula(formula))
+
+    def parse_symbolic(self, statement: str):
+        effect_formula, precondition_formula = self.get_effect_and_precondition(statement)
+        if precondition_formula:
+            formula = f"{precondition_formula} => {effect_formula}"
+        else:
+            formula = effect_formula
+        return self.transition_graph.symbolic.formula(self.logical_formula_parser.compile_formula(formula))
+
+    def parse_lazy(self, statement: str) -> CompiledFormula:
+        effect_formula, precondition_formula = self.get_effect_and_precondition(statement)
+        if precondition_formula:
+            formula = f"{precondition_formula} => {effect_formula}"
+        else:
+            formula = effect_formula
+        return self.logical_formula_parser.compile_formula(formula)
+
 
 class ImpossibleParser(CustomParser):
 
@@ -288,14 +428,19 @@ class ImpossibleParser(CustomParser):
         _, precondition_formula = self.get_action_and_precondition(statement)
         return self.logical_formula_parser.extract_fluents(precondition_formula)
 
-    def parse(self, statement: str) -> None:
-        impossible_edges = []
+    def parse(self, statement: str) -> Tuple[str, CompiledFormula]:
+        action, precondition_formula = self.get_action_and_precondition(statement)
+        return action, self.logical_formula_parser.compile_formula(precondition_formula)
+
+    def parse_vectorized(self, statement: str) -> Tuple[str, np.ndarray]:
+        action, precondition_formula = self.get_action_and_precondition(statement)
+        precondition_formula = self.logical_formula_parser.compile_formula(precondition_formula)
+        return action, self.transition_graph.state_space.mask(precondition_formula)
+
+    def parse_symbolic(self, statement: str):
         action, precondition_formula = self.get_action_and_precondition(statement)
-        for from_state in self.transition_graph.generate_all_states():
-            if self.evaluate_formula(precondition_formula, from_state):
-                for to_state in self.transition_graph.generate_all_states():
-                    impossible_edges.append(Edge(from_state, action, to_state))
-        return impossible_edges
+        precondition_formula = self.logical_formula_parser.compile_formula(precondition_formula)
+        return action, self.transition_graph.symbolic.formula(precondition_formula)
 
 
 class NoninertialParser(CustomParser):
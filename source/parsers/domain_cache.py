@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+import zipfile
+from typing import List, Optional
+
+import numpy as np
+
+from source.graph.transition_graph import TransitionGraph
+from source.parsers.logical_formula_parser import compile_formula
+from source.parsers.statement_parser import StatementParser
+
+# Bump whenever parsing semantics or the snapshot layout change, so that
+# snapshots written by older code are rejected instead of reused.
+SNAPSHOT_VERSION = 2
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+
+
+def normalize_statement(statement: str) -> str:
+    return " ".join(statement.split())
+
+
+def fingerprint(statements: List[str]) -> str:
+    """Hash of a statement set that ignores statement order wherever the semantics do.
+
+    Statements are grouped by keyword and sorted within each group. ``lasts``
+    statements are only ordered by action, since a later statement overrides
+    an earlier one for the same action.
+    """
+    parser = StatementParser(TransitionGraph())
+    for statement in statements:
+        parser.add_statement(normalize_statement(statement))
+    lasts_parser = parser.parser_classes["lasts"](parser.transition_graph)
+    canonical = {
+        keyword: sorted(grouped, key=lambda statement: lasts_parser.extract_actions(statement)[0])
+        if keyword == "lasts" else sorted(grouped)
+        for keyword, grouped in parser.statements.items()
+    }
+    payload = json.dumps({"version": SNAPSHOT_VERSION, "statements": canonical}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def save_snapshot(transition_graph: TransitionGraph, path: str) -> None:
+    """Writes states, edges, the duration table and initial/ending states as flat arrays to an npz file."""
+    actions = list(transition_graph.actions)
+    for edge in transition_graph.edges:
+        if edge.action not in actions:
+            actions.append(edge.action)
+    action_index = {action: i for i, action in enumerate(actions)}
+    edges = transition_graph.edges
+    duration_rules = [
+        (action, precondition.formula if precondition is not None else "", duration)
+        for action, rules in transition_graph.duration_rules.items()
+        for precondition, duration in rules
+    ]
+    with open(path, "wb") as file:
+        np.savez(
+            file,
+            version=np.array(SNAPSHOT_VERSION),
+            fluents=np.array(transition_graph.fluents, dtype=np.str_),
+            actions=np.array(actions, dtype=np.str_),
+            declared_actions=np.array(len(transition_graph.actions)),
+            states=np.array([state.code for state in transition_graph.generate_possible_states()], dtype=np.uint64),
+            sources=np.array([edge.source.code for edge in edges], dtype=np.uint64),
+            targets=np.array([edge.target.code for edge in edges], dtype=np.uint64),
+            edge_actions=np.array([action_index[edge.action] for edge in edges], dtype=np.int32),
+            duration_actions=np.array([action for action, _, _ in duration_rules], dtype=np.str_),
+            duration_preconditions=np.array([precondition for _, precondition, _ in duration_rules], dtype=np.str_),
+            durations=np.array([duration for _, _, duration in duration_rules], dtype=np.int64),
+            initial=np.array([state.code for state in transition_graph.possible_initial_states], dtype=np.uint64),
+            ending=np.array([state.code for state in transition_graph.possible_ending_states], dtype=np.uint64),
+        )
+
+
+def load_snapshot(path: str) -> Optional[TransitionGraph]:
+    """Rebuilds a TransitionGraph from an npz snapshot, or returns None if it has another version."""
+    with np.load(path, allow_pickle=False) as snapshot:
+        if int(snapshot["version"]) != SNAPSHOT_VERSION:
+            return None
+        transition_graph = TransitionGraph()
+        transition_graph.add_fluents(snapshot["fluents"].tolist())
+        actions = snapshot["actions"].tolist()
+        transition_graph.add_actions(actions[:int(snapshot["declared_actions"])])
+
+        states = [transition_graph.get_state(code) for code in snapshot["states"].tolist()]
+        transition_graph.states = states
+        if len(states) != 1 << len(transition_graph.fluents):
+            transition_graph.always_states = states
+
+        # edges stay code arrays until Edge objects are requested
+        sources, targets, edge_actions = snapshot["sources"], snapshot["targets"], snapshot["edge_actions"]
+        for index, action in enumerate(actions):
+            selected = edge_actions == index
+            if selected.any():
+                transition_graph.add_edge_arrays(action, sources[selected], targets[selected])
+        for action, precondition, duration in zip(
+            snapshot["duration_actions"].tolist(),
+            snapshot["duration_preconditions"].tolist(),
+            snapshot["durations"].tolist(),
+        ):
+            transition_graph.set_action_duration(action, duration, compile_formula(precondition) if precondition else None)
+
+        get_state = transition_graph.get_state
+        transition_graph.possible_initial_states = [get_state(code) for code in snapshot["initial"].tolist()]
+        transition_graph.possible_ending_states = [get_state(code) for code in snapshot["ending"].tolist()]
+    return transition_graph
+
+
+class DomainCache:
+    """Directory of domain snapshots keyed by statement fingerprint, evicting least recently used files."""
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def get(self, statements: List[str]) -> Optional[TransitionGraph]:
+        path = self.path(fingerprint(statements))
+        try:
+            transition_graph = load_snapshot(path)
+        except (OSError, EOFError, ValueError, KeyError, zipfile.BadZipFile):
+            transition_graph = None
+        if transition_graph is None:
+            if os.path.exists(path):
+                os.remove(path)
+            return None
+        os.utime(path)
+        return transition_graph
+
+    def put(self, statements: List[str], transition_graph: TransitionGraph) -> None:
+        path = self.path(fingerprint(statements))
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        save_snapshot(transition_graph, temporary_path)
+        os.replace(temporary_path, path)
+        self.evict()
+
+    def parse(self, statements: List[str], backend: str = "python") -> TransitionGraph:
+        """Returns the cached domain of ``statements``, parsing and storing it on a miss.
+
+        Only backends that build explicit edges are cached; the lazy and
+        symbolic backends are parsed directly.
+        """
+        if backend in ("python", "numpy"):
+            transition_graph = self.get(statements)
+            if transition_graph is not None:
+                return transition_graph
+        statement_parser = StatementParser(TransitionGraph(backend=backend))
+        statement_parser.parse(statements)
+        if backend in ("python", "numpy"):
+            self.put(statements, statement_parser.transition_graph)
+        return statement_parser.transition_graph
+
+    def evict(self) -> None:
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".npz"):
+                path = os.path.join(self.directory, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
@@ -0,0 +1,57 @@
+import re
+from typing import Any, Dict, List, Tuple
+
+QUERY_PATTERNS = (
+    re.compile(r"^(?P<mode>necessary|possibly)\s+cheapest\s+plan\s+to\s+(?P<goal>.+?)\s+from\s+(?P<pi>.+)$"),
+    re.compile(
+        r"^(?P<mode>necessary|possibly)\s+executable\s+(?P<actions>.+?)"
+        r"(?:\s+with\s+time\s+(?P<max_cost>\d+))?\s+from\s+(?P<pi>.+)$"
+    ),
+    re.compile(r"^(?P<mode>necessary|possibly)\s+(?P<alpha>.+?)\s+after\s+(?P<actions>.+?)\s+from\s+(?P<pi>.+)$"),
+)
+
+
+def load_examples(file_path: str) -> Dict[str, List[str]]:
+    """Reads a file of ``# name`` headers, each followed by the statements of one domain."""
+    examples = {}
+    current_example = None
+    with open(file_path, 'r') as file:
+        for line in file:
+            line = line.strip()
+            if line.startswith('#'):
+                current_example = line[1:].strip()
+                examples[current_example] = []
+            elif current_example:
+                examples[current_example].append(line)
+    return examples
+
+
+def conjunction(formula: str) -> str:
+    """Writes the ``and`` of a query condition as ``&``, the form QueryParser reads."""
+    return re.sub(r"\s+and\s+", " & ", formula.strip())
+
+
+def parse_query(query: str) -> Tuple[str, Tuple[Any, ...]]:
+    """Turns a query of the README's query language into a QueryParser method name and its arguments.
+
+    ``necessary executable A,B with time 120 from pi`` gives
+    ``('necessary_executable_with_cost', (['A', 'B'], 'pi', 120))``, and
+    ``necessary cheapest plan to alpha from pi`` gives ``('cheapest_plan', ('alpha', 'pi', 'every'))``.
+    """
+    query = " ".join(query.split())
+    for pattern in QUERY_PATTERNS:
+        match = pattern.match(query)
+        if match is None:
+            continue
+        groups = match.groupdict()
+        if "goal" in groups:
+            mode = "every" if groups["mode"] == "necessary" else "some"
+            return "cheapest_plan", (conjunction(groups["goal"]), conjunction(groups["pi"]), mode)
+        actions = [action.strip() for action in groups["actions"].split(",")]
+        pi = conjunction(groups["pi"])
+        if "alpha" in groups:
+            return f"{groups['mode']}_alpha_after", (conjunction(groups["alpha"]), actions, pi)
+        if groups["max_cost"] is not None:
+            return f"{groups['mode']}_executable_with_cost", (actions, pi, int(groups["max_cost"]))
+        return f"{groups['mode']}_executable", (actions, pi)
+    raise ValueError(f"Unsupported query: {query}")
@@ -1,12 +1,124 @@
 import re
 
+from functools import lru_cache
 from pyeda.inter import *
 from pyeda.boolalg.expr import AndOp, Complement, OrOp, Variable
-from typing import List
+from typing import Any, Dict, List, Mapping, Sequence, Tuple
+
+FORMULA_CACHE_SIZE = 1024
+MASK_CACHE_SIZE = 16
+
+Literal = Tuple[str, bool]
+Term = Tuple[Literal, ...]
+
+
+class CompiledFormula:
+    """Formula in DNF, stored as a tuple of terms of (fluent, value) literals."""
+
+    __slots__ = ("formula", "terms", "_masks")
+
+    def __init__(self, formula: str, terms: Tuple[Term, ...]):
+        self.formula = formula
+        self.terms = terms
+        self._masks: Dict[Any, Tuple[Tuple[int, int], ...]] = {}
+
+    def __repr__(self) -> str:
+        return f"CompiledFormula({self.formula!r}, terms={self.terms})"
+
+    @property
+    def satisfiable(self) -> bool:
+        return bool(self.terms)
+
+    def evaluate(self, fluents: Mapping[str, bool]) -> bool:
+        for term in self.terms:
+            for fluent, value in term:
+                if fluents[fluent] != value:
+                    break
+            else:
+                return True
+        return False
+
+    def masks(self, order) -> Tuple[Tuple[int, int], ...]:
+        """Terms as (mask, value) pairs over the bit positions given by ``order.index``."""
+        masks = self._masks.get(order)
+        if masks is None:
+            if len(self._masks) >= MASK_CACHE_SIZE:
+                self._masks.clear()
+            masks = []
+            for term in self.terms:
+                mask = value = 0
+                for fluent, literal_value in term:
+                    bit = 1 << order.index[fluent]
+                    mask |= bit
+                    if literal_value:
+                        value |= bit
+                masks.append((mask, value))
+            masks = self._masks[order] = tuple(masks)
+        return masks
+
+    def evaluate_code(self, code: int, order) -> bool:
+        for mask, value in self.masks(order):
+            if code & mask == value:
+                return True
+        return False
+
+
+def conjoin_masks(masks: Sequence[Tuple[Tuple[int, int], ...]]) -> Tuple[Tuple[int, int], ...]:
+    """(mask, value) terms of the conjunction of formulas given as (mask, value) terms."""
+    terms = {(0, 0)}
+    for formula_masks in masks:
+        terms = {
+            (mask | other_mask, value | other_value)
+            for mask, value in terms
+            for other_mask, other_value in formula_masks
+            if not mask & other_mask & (value ^ other_value)
+        }
+    return tuple(sorted(terms))
+
+
+def normalize_formula(formula: str) -> str:
+    return " ".join(formula.split())
+
+
+def _literal(pyeda_literal) -> Literal:
+    literal = str(pyeda_literal)
+    if literal.startswith("~"):
+        return literal[1:], False
+    return literal, True
+
+
+def _term(pyeda_term) -> Term:
+    if isinstance(pyeda_term, AndOp):
+        return tuple(_literal(x) for x in pyeda_term.xs)
+    return (_literal(pyeda_term),)
+
+
+@lru_cache(maxsize=FORMULA_CACHE_SIZE)
+def _compile_normalized_formula(formula: str) -> CompiledFormula:
+    if not formula:
+        return CompiledFormula(formula, ((),))
+
+    dnf = expr(formula).to_dnf()
+    if dnf.is_zero():
+        terms = ()
+    elif dnf.is_one():
+        terms = ((),)
+    elif isinstance(dnf, OrOp):
+        terms = tuple(_term(x) for x in dnf.xs)
+    else:
+        terms = (_term(dnf),)
+    return CompiledFormula(formula, terms)
+
+
+def compile_formula(formula: str) -> CompiledFormula:
+    return _compile_normalized_formula(normalize_formula(formula))
 
 
 class LogicalFormulaParser:
 
+    def compile_formula(self, formula: str) -> CompiledFormula:
+        return compile_formula(formula)
+
     def normalize_to_dnf(self, formula: str) -> expr:
         return expr(formula).to_dnf()
 
@@ -0,0 +1,332 @@
+import heapq
+import math
+import time
+from itertools import count
+from typing import Any, Callable, Dict, FrozenSet, Iterator, List, Optional, Tuple
+
+PLAN_MODES = ("some", "every")
+# expansions after which a search gives up unless the caller sets its own limit
+DEFAULT_MAX_EXPANSIONS = 200_000
+
+
+class Plan:
+    """Cheapest action sequence found by a planning query; ``actions`` is None when there is none."""
+
+    def __init__(self, actions: Optional[List[str]], cost: Optional[int], stats: Dict[str, Any]):
+        self.actions = actions
+        self.cost = cost
+        self.stats = stats
+
+    @property
+    def found(self) -> bool:
+        return self.actions is not None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"actions": self.actions, "cost": self.cost, "stats": self.stats}
+
+    def __repr__(self) -> str:
+        return f"Plan(actions={self.actions}, cost={self.cost}, stats={self.stats})"
+
+
+def conjunction_code(order, conjunction: str) -> Optional[Tuple[int, int]]:
+    """(mask, value) of a conjunction of literals: a state code satisfies it when ``code & mask == value``.
+
+    None when the conjunction has a fluent with both signs, so no state satisfies it.
+    """
+    positive = negative = 0
+    for literal in conjunction.split('&'):
+        literal = literal.strip()
+        bit = order.bit(literal.replace('~', '').strip())
+        if '~' in literal:
+            negative |= bit
+        else:
+            positive |= bit
+    if positive & negative:
+        return None
+    return positive | negative, positive
+
+
+class Planner:
+    """Duration-optimal plans over the transitions a QueryParser follows.
+
+    Every outcome of an action is a step, as in the queries, so every plan
+    found is confirmed by ``possibly_alpha_after`` ("some" mode) or
+    ``necessary_alpha_after`` ("every" mode). Both heuristics never
+    overestimate, so A* returns the cheapest plan: from a state, the number of
+    unsatisfied α-literals divided by the most fluents a single step changes,
+    times the shortest duration of a step; from a belief, the largest cost of
+    reaching α alone from one of its states.
+    """
+
+    def __init__(self, query_parser):
+        self.query_parser = query_parser
+        self.graph = query_parser.graph
+        self.profiler = query_parser.profiler
+        self.version = self.graph.version
+        self._step_bounds = None
+        self._reverse_steps = None
+        self._distances: Tuple[Optional[Tuple[int, int]], Dict[int, int]] = (None, {})
+        # action -> state code -> (code of each next state, duration), empty if the action is not executable
+        self._steps: Dict[str, Dict[int, Tuple[Tuple[int, int], ...]]] = {}
+
+    def step_bounds(self) -> Tuple[int, int]:
+        """Most fluents changed by one step and the smallest duration of a step that changes any."""
+        if self._step_bounds is None:
+            graph = self.graph
+            if graph.has_negative_durations():
+                raise ValueError("Planning needs non-negative action durations")
+            if graph.lazy is not None:
+                # steps are only known once expanded, so assume any step may change every fluent
+                changes = len(graph.fluent_order)
+            else:
+                changes = max(
+                    (
+                        bin(source.code ^ target.code).count("1")
+                        for (source, _), targets in graph.adjacency.items()
+                        for target in targets
+                    ),
+                    default=0,
+                )
+            shortest = None
+            for action in graph.actions:
+                rules = graph.duration_rules.get(action, [])
+                # a step that no ``lasts`` entry matches takes no time
+                lasts = min(duration for _, duration in rules) if any(rule is None for rule, _ in rules) else 0
+                shortest = lasts if shortest is None else min(shortest, lasts)
+            self._step_bounds = max(changes, 1), shortest or 0
+        return self._step_bounds
+
+    def heuristic(self, mask: int, value: int) -> Callable[[int], int]:
+        changes, shortest = self.step_bounds()
+        if shortest == 0:
+            return lambda code: 0
+        return lambda code: -(-((code & mask) ^ value).bit_count() // changes) * shortest
+
+    def step(self, code: int, action: str) -> Tuple[Tuple[int, int], ...]:
+        """(target code, duration) of every outcome of an action in a state; empty if it is not executable."""
+        table = self._steps.setdefault(action, {})
+        step = table.get(code)
+        if step is None:
+            successors = self.graph.successors(self.graph.get_state(code), action)
+            step = table[code] = tuple((target.code, duration) for target, duration in successors)
+        return step
+
+    def steps(self, code: int) -> Iterator[Tuple[str, int, int]]:
+        """(action, target, duration) of every outcome of every executable action of a state."""
+        for action in self.graph.actions:
+            for target, duration in self.step(code, action):
+                yield action, target, duration
+
+    def reverse_steps(self) -> Dict[int, List[Tuple[int, str, int]]]:
+        """Index from a state to the (source, action, duration) of the steps reaching it."""
+        if self._reverse_steps is None:
+            reverse: Dict[int, List[Tuple[int, str, int]]] = {}
+            for source in self.query_parser.states:
+                for action, target, duration in self.steps(source.code):
+                    reverse.setdefault(target, []).append((source.code, action, duration))
+            self._reverse_steps = reverse
+        return self._reverse_steps
+
+    def distances(self, goal: Tuple[int, int]) -> Dict[int, int]:
+        """Least duration from each state that can reach α to an α-state, by Dijkstra backwards."""
+        if self._distances[0] != goal:
+            mask, value = goal
+            reverse = self.reverse_steps()
+            distances: Dict[int, int] = {}
+            frontier = [(0, state.code) for state in self.query_parser.states if state.code & mask == value]
+            heapq.heapify(frontier)
+            while frontier:
+                distance, code = heapq.heappop(frontier)
+                if code in distances:
+                    continue
+                distances[code] = distance
+                for source, _, duration in reverse.get(code, ()):
+                    if source not in distances:
+                        heapq.heappush(frontier, (distance + duration, source))
+            self._distances = goal, distances
+        return self._distances[1]
+
+    def plan(self, alpha: str, pi: str, mode: str = "some", heuristic: bool = True,
+             bidirectional: bool = False, max_expansions: Optional[int] = DEFAULT_MAX_EXPANSIONS) -> Plan:
+        if mode not in PLAN_MODES:
+            raise ValueError(f"Unknown planning mode: {mode} (expected one of {', '.join(PLAN_MODES)})")
+        if bidirectional and mode != "some":
+            raise ValueError("Bidirectional search is only available in 'some' mode")
+        goal = conjunction_code(self.graph.fluent_order, alpha)
+        starts = [state.code for state in self.query_parser.pi_states(pi)]
+        stats = {"mode": mode, "start_states": len(starts), "expanded": 0, "generated": 0,
+                 "max_frontier": 0, "limit_reached": False}
+        start = time.perf_counter()
+        if goal is None:
+            actions, cost = None, None  # no state satisfies α
+        elif bidirectional:
+            actions, cost = self.search_bidirectional(starts, goal, stats, max_expansions)
+        elif mode == "some":
+            actions, cost = self.search_states(starts, goal, heuristic, stats, max_expansions)
+        else:
+            actions, cost = self.search_beliefs(starts, goal, heuristic, stats, max_expansions)
+        stats["seconds"] = time.perf_counter() - start
+        self.profiler.count("expansions", stats["expanded"])
+        return Plan(actions, cost, stats)
+
+    def search_states(self, starts, goal, heuristic, stats, max_expansions):
+        """A* from all π-states at once to the nearest α-state."""
+        mask, value = goal
+        h = self.heuristic(mask, value) if heuristic else (lambda code: 0)
+        tie = count()
+        best: Dict[int, int] = {}
+        parents: Dict[int, Optional[Tuple[int, str]]] = {}
+        frontier = []
+        for code in starts:
+            best[code] = 0
+            parents[code] = None
+            heapq.heappush(frontier, (h(code), 0, next(tie), code))
+        while frontier:
+            stats["max_frontier"] = max(stats["max_frontier"], len(frontier))
+            _, cost, _, code = heapq.heappop(frontier)
+            if cost > best[code]:
+                continue
+            if code & mask == value:
+                return self.path(parents, code), cost
+            if max_expansions is not None and stats["expanded"] >= max_expansions:
+                stats["limit_reached"] = True
+                return None, None
+            stats["expanded"] += 1
+            for action, target, duration in self.steps(code):
+                stats["generated"] += 1
+                new_cost = cost + duration
+                if new_cost < best.get(target, math.inf):
+                    best[target] = new_cost
+                    parents[target] = (code, action)
+                    heapq.heappush(frontier, (new_cost + h(target), new_cost, next(tie), target))
+        return None, None
+
+    def search_beliefs(self, starts, goal, heuristic, stats, max_expansions):
+        """A* over beliefs: the states the plan may be in, each with the worst cost of reaching it.
+
+        A plan must be executable from every π-state and end in α from each of
+        them; its cost is the largest total duration over the π-states. A belief
+        is dropped when one over the same states, no costlier in any of them,
+        was expanded before.
+        """
+        mask, value = goal
+        if heuristic:
+            distances = self.distances(goal)
+            if any(code not in distances for code in starts):
+                return None, None
+        else:
+            distances = None
+        tie = count()
+        initial: FrozenSet[Tuple[int, int]] = frozenset((code, 0) for code in starts)
+        parents: Dict[FrozenSet, Optional[Tuple[FrozenSet, str]]] = {initial: None}
+        # states of a belief -> costs of the beliefs over them expanded so far
+        expanded: Dict[FrozenSet[int], List[Dict[int, int]]] = {}
+
+        def dominated(costs: Dict[int, int]) -> bool:
+            return any(
+                all(previous[code] <= code_cost for code, code_cost in costs.items())
+                for previous in expanded.get(frozenset(costs), ())
+            )
+
+        estimate = max((distances[code] for code in starts), default=0) if distances is not None else 0
+        frontier = [(estimate, 0, next(tie), initial)]
+        while frontier:
+            stats["max_frontier"] = max(stats["max_frontier"], len(frontier))
+            _, cost, _, belief = heapq.heappop(frontier)
+            costs = dict(belief)
+            if dominated(costs):
+                continue
+            expanded.setdefault(frozenset(costs), []).append(costs)
+            if all(code & mask == value for code in costs):
+                return self.path(parents, belief), cost
+            if max_expansions is not None and stats["expanded"] >= max_expansions:
+                stats["limit_reached"] = True
+                return None, None
+            stats["expanded"] += 1
+            for action in self.graph.actions:
+                reached: Dict[int, int] = {}
+                for code, code_cost in costs.items():
+                    outcomes = self.step(code, action)
+                    if not outcomes:
+                        break
+                    # trajectories that meet continue alike, so only the costlier one matters
+                    for target, duration in outcomes:
+                        if reached.get(target, -1) < code_cost + duration:
+                            reached[target] = code_cost + duration
+                else:
+                    stats["generated"] += 1
+                    successor = frozenset(reached.items())
+                    if successor in parents or dominated(reached):
+                        continue
+                    new_cost = max(reached.values(), default=0)
+                    estimate = new_cost
+                    if distances is not None:
+                        if any(code not in distances for code in reached):
+                            continue  # a state of the belief can never reach α
+                        estimate = max(code_cost + distances[code] for code, code_cost in reached.items())
+                    parents[successor] = (belief, action)
+                    heapq.heappush(frontier, (estimate, new_cost, next(tie), successor))
+        return None, None
+
+    def search_bidirectional(self, starts, goal, stats, max_expansions):
+        """Dijkstra from the π-states forwards and the α-states backwards until the two meet."""
+        mask, value = goal
+        reverse = self.reverse_steps()
+        ends = [state.code for state in self.query_parser.states if state.code & mask == value]
+        tie = count()
+        forward = {code: 0 for code in starts}
+        backward = {code: 0 for code in ends}
+        forward_parents = {code: None for code in starts}
+        backward_parents = {code: None for code in ends}
+        forward_frontier = [(0, next(tie), code) for code in starts]
+        backward_frontier = [(0, next(tie), code) for code in ends]
+        best_cost, meeting = math.inf, None
+        for code in starts:
+            if code in backward:
+                best_cost, meeting = 0, code
+        while forward_frontier and backward_frontier:
+            stats["max_frontier"] = max(stats["max_frontier"], len(forward_frontier) + len(backward_frontier))
+            if forward_frontier[0][0] + backward_frontier[0][0] >= best_cost:
+                break
+            if max_expansions is not None and stats["expanded"] >= max_expansions:
+                stats["limit_reached"] = True
+                return None, None
+            stats["expanded"] += 1
+            if len(forward_frontier) <= len(backward_frontier):
+                cost, _, code = heapq.heappop(forward_frontier)
+                if cost > forward[code]:
+                    continue
+                neighbours = ((target, (code, action), duration) for action, target, duration in self.steps(code))
+                costs, parents, frontier, other = forward, forward_parents, forward_frontier, backward
+            else:
+                cost, _, code = heapq.heappop(backward_frontier)
+                if cost > backward[code]:
+                    continue
+                neighbours = ((source, (code, action), duration) for source, action, duration in reverse.get(code, ()))
+                costs, parents, frontier, other = backward, backward_parents, backward_frontier, forward
+            for neighbour, parent, duration in neighbours:
+                stats["generated"] += 1
+                new_cost = cost + duration
+                if new_cost < costs.get(neighbour, math.inf):
+                    costs[neighbour] = new_cost
+                    parents[neighbour] = parent
+                    heapq.heappush(frontier, (new_cost, next(tie), neighbour))
+                    if neighbour in other and new_cost + other[neighbour] < best_cost:
+                        best_cost, meeting = new_cost + other[neighbour], neighbour
+        if meeting is None:
+            return None, None
+        stats["meeting_state"] = str(self.graph.get_state(meeting))
+        tail = []
+        node = meeting
+        while backward_parents[node] is not None:
+            node, action = backward_parents[node]
+            tail.append(action)
+        return self.path(forward_parents, meeting) + tail, best_cost
+
+    @staticmethod
+    def path(parents, node) -> List[str]:
+        actions = []
+        while parents[node] is not None:
+            node, action = parents[node]
+            actions.append(action)
+        return actions[::-1]
@@ -0,0 +1,104 @@
+import inspect
+import threading
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+DEFAULT_QUERY_CACHE_ENTRIES = 4096
+
+_MISSING = object()
+
+
+def normalize_conjunction(formula: str) -> str:
+    """Conjunction of literals with its literals sorted and deduplicated, as ``state_satisfies`` reads it."""
+    return " & ".join(sorted({"".join(literal.split()) for literal in formula.split("&")}))
+
+
+def normalize_actions(actions) -> Tuple[str, ...]:
+    return tuple(action.replace(" ", "") for action in actions)
+
+
+NORMALIZERS: Dict[str, Callable[[Any], Hashable]] = {
+    "alpha": normalize_conjunction,
+    "pi": normalize_conjunction,
+    "actions": normalize_actions,
+    "max_cost": lambda max_cost: max_cost,
+    "mode": lambda mode: mode,
+    "heuristic": bool,
+    "bidirectional": bool,
+    "max_expansions": lambda max_expansions: max_expansions,
+}
+
+
+class QueryCache:
+    """LRU cache of query answers keyed by domain version, query name and normalized arguments.
+
+    The version of a TransitionGraph changes whenever its domain does, so
+    answers about an older domain are never returned; ``invalidate`` drops
+    them early.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_QUERY_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Tuple, Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: Tuple) -> Any:
+        with self._lock:
+            value = self.entries.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.entries.move_to_end(key)
+            return value
+
+    def put(self, key: Tuple, value: Any) -> None:
+        with self._lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, version: Optional[int] = None) -> None:
+        """Drops the answers about one domain version, or all of them."""
+        with self._lock:
+            if version is None:
+                self.entries.clear()
+            else:
+                for key in [key for key in self.entries if key[0] == version]:
+                    del self.entries[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries), "max_entries": self.max_entries}
+
+
+def cached(method: Callable) -> Callable:
+    """Answers a query method of a parser with a ``cache`` attribute from that cache when it is set."""
+    signature = inspect.signature(method)
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.cache is None:
+            return method(self, *args, **kwargs)
+        bound = signature.bind(self, *args, **kwargs)
+        # defaults are filled in and every value keyed with its name, so that calls spelling out
+        # a default share an entry and values of different parameters never collide
+        bound.apply_defaults()
+        key = (self.graph.version, method.__name__) + tuple(
+            (name, NORMALIZERS[name](value)) for name, value in bound.arguments.items() if name != "self"
+        )
+        result = self.cache.get(key)
+        if result is _MISSING:
+            result = method(self, *args, **kwargs)
+            self.cache.put(key, result)
+            self.profiler.count("cache_misses")
+        else:
+            self.profiler.count("cache_hits")
+        return result
+    return wrapper
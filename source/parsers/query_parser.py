@@ -1,8 +1,87 @@
-import networkx as nx
-import streamlit as st
+import inspect
+from typing import Any, Dict, FrozenSet, Iterator, List, Optional, Sequence, Tuple
+
+from source.graph.sparse import Frontier, SparseTransitions
+from source.graph.symbolic import conj, neg
+from source.graph.transition_graph import StateNode, TransitionGraph
+from source.parsers.planning import DEFAULT_MAX_EXPANSIONS, Plan, Planner, conjunction_code
+from source.parsers.query_cache import QueryCache, cached, normalize_actions
+from source.profiling import Profiler, profiled
+
+# a frontier maps each state reached to the state it was first reached from (None for π-states)
+StateFrontier = Dict[StateNode, Optional[StateNode]]
+
+
+class Trajectory:
+    """One run of a sequence of actions: the states it passes through and, if it got stuck, the action it could not execute."""
+
+    def __init__(self, states: List[StateNode], actions: List[str], stuck_on: Optional[str] = None):
+        self.states = states
+        self.actions = actions
+        self.stuck_on = stuck_on
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "states": [state.label.replace("\n", " & ") for state in self.states],
+            "actions": self.actions,
+            "stuck_on": self.stuck_on,
+        }
+
+    def __repr__(self) -> str:
+        return f"Trajectory({self.to_dict()})"
+
+
+class UnsupportedQueryError(ValueError):
+    """Raised by ``QueryParser.query`` for a query the backend cannot answer."""
+
+
 class QueryParser:
-    def __init__(self, graph: nx.MultiDiGraph):
+    # names of the queries this class cannot answer, rejected by ``query``
+    unsupported: FrozenSet[str] = frozenset()
+
+    def __init__(
+        self,
+        graph: TransitionGraph,
+        profiler: Optional[Profiler] = None,
+        cache: Optional[QueryCache] = None,
+    ):
         self.graph = graph
+        self.profiler = profiler if profiler is not None else Profiler()
+        self.cache = cache
+        self._states = None
+        self._planner = None
+        # (π, action, ...) -> (frontier, every branch executable), shared by the queries of a batch
+        self.frontiers = None
+        # (π, action, ...) -> ((state: (min cost, max cost)) frontier, every branch executable), likewise
+        self.costed_frontiers = None
+
+    def supports(self, name: str) -> bool:
+        return name not in self.unsupported
+
+    def query(self, name: str, args: Sequence[Any]) -> Any:
+        """Answers the query method ``name`` with ``args``, or raises UnsupportedQueryError."""
+        if not self.supports(name):
+            raise UnsupportedQueryError(f"{name} is not supported on the {self.graph.backend} backend")
+        return getattr(self, name)(*args)
+
+    @property
+    def states(self):
+        if self._states is None:
+            self._states = list(dict.fromkeys(self.graph.generate_possible_states()))
+        return self._states
+
+    def pi_states(self, pi):
+        """Returns the possible states satisfying π; on the lazy backend only those are generated."""
+        transitions = self.graph.lazy
+        if transitions is None:
+            self.profiler.count("formula_evaluations", len(self.states))
+            return [state for state in self.states if self.state_satisfies(state, pi)]
+        code = conjunction_code(self.graph.fluent_order, pi)
+        if code is None:
+            return []
+        states = [self.graph.get_state(state_code) for state_code in transitions.codes_satisfying(*code)]
+        self.profiler.count("states_generated", len(states))
+        return states
 
     @staticmethod
     def change_string(s, i, nowy_znak):
@@ -10,24 +89,38 @@ class QueryParser:
             raise IndexError("Index out of range")
         return s[:i] + nowy_znak + s[i+1:]
 
-    def find_next_state(self, state, action):
-        """Finds the next state after performing the given action from the given state."""
-        for u, v, key, data in list(self.graph.edges(data=True, keys=True)):
-            if 'action' in data:
-                if u == state and data['action'] == action:
-                    return v, data['weight']
-        return None, 0
-
-    def find_last_state(self, state, actions):
-        """Finds the last state after performing the sequence of actions from the given state."""
-        cost = 0
+    def image(self, frontier: StateFrontier, action: str) -> Tuple[StateFrontier, Optional[StateNode]]:
+        """Every state an action leads to from the frontier, each kept once with the first state it came from.
+
+        Also returns the first state of the frontier where the action is not executable, if any.
+        """
+        reached: StateFrontier = {}
+        stuck = None
+        for state in frontier:
+            targets = self.graph.targets(state, action)
+            if not targets and stuck is None:
+                stuck = state
+            for target in targets:
+                if target not in reached:
+                    reached[target] = state
+        self.profiler.count("transitions", len(frontier))
+        return reached, stuck
+
+    def find_frontier(self, actions, pi) -> Tuple[StateFrontier, bool]:
+        """Returns the states reached over every branch after the actions, and whether every branch could execute them."""
+        frontiers = self.frontiers if self.frontiers is not None else {}
+        prefix = (pi,)
+        if prefix not in frontiers:
+            frontiers[prefix] = dict.fromkeys(self.pi_states(pi)), True
+        frontier, always_executable = frontiers[prefix]
         for action in actions:
-            state, subcost = self.find_next_state(state, action.replace(' ',''))
-            if state is None:
-                return None, 0
-            else:
-                cost += subcost
-        return state, cost
+            action = action.replace(' ', '')
+            prefix += (action,)
+            if prefix not in frontiers:
+                reached, stuck = self.image(frontier, action)
+                frontiers[prefix] = reached, always_executable and stuck is None
+            frontier, always_executable = frontiers[prefix]
+        return frontier, always_executable
 
     @staticmethod
     def state_satisfies(state, conditions):
@@ -44,61 +137,386 @@ class QueryParser:
                     return False
         return True
 
+    @profiled
+    @cached
     def necessary_alpha_after(self, alpha, actions, pi):
         """Checks if α always holds after performing the sequence of actions from any state satisfying π."""
-        for state in list(self.graph.nodes):
-            if self.state_satisfies(state, pi):
-                final_state, _ = self.find_last_state(state, actions)
-                if final_state is None or not self.state_satisfies(final_state, alpha):
-                    return False
-        return True
+        frontier, always_executable = self.find_frontier(actions, pi)
+        return always_executable and all(self.state_satisfies(state, alpha) for state in frontier)
 
+    @profiled
+    @cached
     def possibly_alpha_after(self, alpha, actions, pi):
         """Checks if α sometimes holds after performing the sequence of actions from any state satisfying π."""
-        for state in list(self.graph.nodes):
-            if self.state_satisfies(state, pi):
-                # st.write(state)
-                # st.write(pi)
-                final_state, _ = self.find_last_state(state, actions)
-                # st.write(final_state)
-                if final_state is not None and self.state_satisfies(final_state, alpha):
-                    return True
-        return False
+        frontier, _ = self.find_frontier(actions, pi)
+        return any(self.state_satisfies(state, alpha) for state in frontier)
 
+    @profiled
+    @cached
     def necessary_executable(self, actions, pi):
         """Checks if the sequence of actions is always executable from any state satisfying π."""
-        for state in list(self.graph.nodes):
-            if self.state_satisfies(state, pi):
-                final_state, _ = self.find_last_state(state, actions)
-                if final_state is None:
-                    return False
-        return True
+        _, always_executable = self.find_frontier(actions, pi)
+        return always_executable
+
+    @profiled
+    @cached
+    def possibly_executable(self, actions, pi):
+        """Checks if the sequence of actions is sometimes executable from any state satisfying π."""
+        frontier, _ = self.find_frontier(actions, pi)
+        return bool(frontier)
+
+    @profiled
+    def witness(self, name: str, args: Sequence[Any]) -> Optional[Trajectory]:
+        """One trajectory behind the answer of a query: a counterexample when a ``necessary`` query
+        fails, an example when a ``possibly`` query holds, and None otherwise.
+
+        The frontiers are followed once, keeping for every state the state it
+        was first reached from, and the trajectory is read back from those.
+        """
+        if name.endswith('with_cost') or not name.startswith(('necessary', 'possibly')):
+            raise ValueError(f"No witness is kept for {name}")
+        arguments = inspect.signature(getattr(self, name)).bind(*args).arguments
+        actions = [action.replace(' ', '') for action in arguments['actions']]
+        layers: List[StateFrontier] = [dict.fromkeys(self.pi_states(arguments['pi']))]
+        stuck = None
+        for step, action in enumerate(actions):
+            reached, stuck_state = self.image(layers[-1], action)
+            if stuck_state is not None and stuck is None:
+                stuck = step, stuck_state
+            layers.append(reached)
+
+        def trajectory(step: int, state: StateNode, stuck_on: Optional[str] = None) -> Trajectory:
+            states = [state]
+            for layer in reversed(layers[1:step + 1]):
+                state = layer[state]
+                states.append(state)
+            return Trajectory(states[::-1], actions[:step], stuck_on)
+
+        alpha = arguments.get('alpha')
+        final = [state for state in layers[-1] if alpha is None or self.state_satisfies(state, alpha)]
+        if name.startswith('possibly'):
+            return trajectory(len(actions), final[0]) if final else None
+        if stuck is not None:
+            step, state = stuck
+            return trajectory(step, state, actions[step])
+        if alpha is not None:
+            failing = [state for state in layers[-1] if not self.state_satisfies(state, alpha)]
+            if failing:
+                return trajectory(len(actions), failing[0])
+        return None
+
+    def cost_step(self, frontier: Dict[Any, Tuple[int, int]], action: str) -> Tuple[Dict[Any, Tuple[int, int]], bool]:
+        """Follows every branch of an action from the (state: (min cost, max cost)) frontier.
+
+        Branches reaching the same state are merged by min-plus and max-plus:
+        the cheapest and the costliest way there are all that later steps need.
+        Also returns whether the action was executable from every state.
+        """
+        reached: Dict[Any, Tuple[int, int]] = {}
+        executable = True
+        for state, (low, high) in frontier.items():
+            successors = self.graph.successors(state, action)
+            if not successors:
+                executable = False
+            for target, duration in successors:
+                bounds = reached.get(target)
+                if bounds is None:
+                    reached[target] = (low + duration, high + duration)
+                else:
+                    reached[target] = (min(bounds[0], low + duration), max(bounds[1], high + duration))
+        self.profiler.count("transitions", len(frontier))
+        return reached, executable
+
+    def start_costs(self, pi) -> Dict[Any, Tuple[int, int]]:
+        return {state: (0, 0) for state in self.pi_states(pi)}
+
+    def costed_frontier(self, actions, pi) -> Tuple[Dict[Any, Tuple[int, int]], bool]:
+        """Returns the (state: (min cost, max cost)) frontier after the actions over every branch, and whether
+        every branch could execute them. Nothing is pruned, so a batch shares the frontier of every prefix."""
+        frontiers = self.costed_frontiers if self.costed_frontiers is not None else {}
+        prefix = (pi,)
+        if prefix not in frontiers:
+            frontiers[prefix] = self.start_costs(pi), True
+        frontier, always_executable = frontiers[prefix]
+        for action in actions:
+            action = action.replace(' ', '')
+            prefix += (action,)
+            if prefix not in frontiers:
+                reached, executable = self.cost_step(frontier, action)
+                frontiers[prefix] = reached, always_executable and executable
+            frontier, always_executable = frontiers[prefix]
+        return frontier, always_executable
+
+    @profiled
+    @cached
+    def necessary_executable_with_cost(self, actions, pi, max_cost):
+        """Checks if the sequence of actions is always executable with a total cost ≤ max_cost from any state satisfying π.
+
+        Every branch of every action is followed; the query fails as soon as one
+        branch gets stuck or, durations being non-negative, exceeds ``max_cost``.
+        Within a batch the shared frontiers are used instead, as pruning them
+        would tie them to one ``max_cost``.
+        """
+        if self.costed_frontiers is not None:
+            frontier, always_executable = self.costed_frontier(actions, pi)
+            return always_executable and all(high <= max_cost for _, high in frontier.values())
+        prune = not self.graph.has_negative_durations()
+        frontier = self.start_costs(pi)
+        for action in actions:
+            frontier, executable = self.cost_step(frontier, action.replace(' ', ''))
+            if not executable:
+                return False
+            if prune and any(high > max_cost for _, high in frontier.values()):
+                return False
+        return all(high <= max_cost for _, high in frontier.values())
+
+    @profiled
+    @cached
+    def possibly_executable_with_cost(self, actions, pi, max_cost):
+        """Checks if the sequence of actions is sometimes executable with a total cost ≤ max_cost from any state satisfying π.
+
+        Branches that get stuck, or whose cheapest cost already exceeds
+        ``max_cost`` while durations are non-negative, are dropped on the way,
+        except within a batch.
+        """
+        if self.costed_frontiers is not None:
+            frontier, _ = self.costed_frontier(actions, pi)
+            return any(low <= max_cost for low, _ in frontier.values())
+        prune = not self.graph.has_negative_durations()
+        frontier = self.start_costs(pi)
+        for action in actions:
+            frontier, _ = self.cost_step(frontier, action.replace(' ', ''))
+            if prune:
+                frontier = {state: bounds for state, bounds in frontier.items() if bounds[0] <= max_cost}
+            if not frontier:
+                return False
+        return any(low <= max_cost for low, _ in frontier.values())
+
+    @profiled
+    @cached
+    def cost_bounds(self, actions, pi) -> Optional[Tuple[int, int]]:
+        """Best-case and worst-case total duration of the sequence of actions over all branches that execute it
+        from the states satisfying π, or None if no branch does."""
+        frontier, _ = self.costed_frontier(actions, pi)
+        if not frontier:
+            return None
+        return min(low for low, _ in frontier.values()), max(high for _, high in frontier.values())
 
+    @property
+    def planner(self) -> Planner:
+        if self._planner is None or self._planner.version != self.graph.version:
+            self._planner = Planner(self)
+        return self._planner
+
+    @profiled
+    @cached
+    def cheapest_plan(self, alpha, pi, mode="some", heuristic=True, bidirectional=False,
+                      max_expansions=DEFAULT_MAX_EXPANSIONS) -> Plan:
+        """Finds the sequence of actions of least total duration after which α holds, from some or from every state satisfying π."""
+        return self.planner.plan(alpha, pi, mode, heuristic, bidirectional, max_expansions)
+
+    @profiled
+    def evaluate_batch(self, queries: Sequence[Tuple[str, Sequence[Any]]]) -> List[bool]:
+        """Answers (query name, arguments) pairs, computing the frontier of every shared prefix once."""
+        self.frontiers, self.costed_frontiers = {}, {}
+        try:
+            return [self.query(name, args) for name, args in queries]
+        finally:
+            self.frontiers = self.costed_frontiers = None
+
+
+class SymbolicQueryParser(QueryParser):
+    """Answers queries on a symbolic TransitionGraph by BDD image computations.
+
+    The BDDs keep no durations and no single states, so cost queries, plans
+    and witnesses are rejected by ``query``.
+    """
+
+    unsupported = frozenset({
+        "necessary_executable_with_cost", "possibly_executable_with_cost", "cost_bounds", "cheapest_plan", "witness",
+    })
+
+    def __init__(
+        self,
+        transition_graph,
+        profiler: Optional[Profiler] = None,
+        cache: Optional[QueryCache] = None,
+    ):
+        self.graph = transition_graph
+        self.profiler = profiler if profiler is not None else Profiler()
+        self.cache = cache
+        self.system = transition_graph.symbolic
+        self.frontiers = None
+        self.costed_frontiers = None
+
+    def find_frontier(self, actions, pi):
+        """Returns the states reached after the actions, and whether every path could execute them."""
+        system = self.system
+        frontiers = self.frontiers if self.frontiers is not None else {}
+        prefix = (pi,)
+        if prefix not in frontiers:
+            frontiers[prefix] = conj(system.conditions(pi), system.allowed), True
+        frontier, always_executable = frontiers[prefix]
+        for action in actions:
+            action = action.replace(' ', '')
+            prefix += (action,)
+            if prefix not in frontiers:
+                executable = always_executable and conj(frontier, neg(system.enabled(action))).is_zero()
+                frontiers[prefix] = system.image(frontier, action), executable
+                self.profiler.count("images")
+            frontier, always_executable = frontiers[prefix]
+        return frontier, always_executable
+
+    @profiled
+    @cached
+    def necessary_alpha_after(self, alpha, actions, pi):
+        """Checks if α always holds after performing the sequence of actions from any state satisfying π."""
+        frontier, always_executable = self.find_frontier(actions, pi)
+        return always_executable and conj(frontier, neg(self.system.conditions(alpha))).is_zero()
+
+    @profiled
+    @cached
+    def possibly_alpha_after(self, alpha, actions, pi):
+        """Checks if α sometimes holds after performing the sequence of actions from any state satisfying π."""
+        frontier, _ = self.find_frontier(actions, pi)
+        return not conj(frontier, self.system.conditions(alpha)).is_zero()
+
+    @profiled
+    @cached
+    def necessary_executable(self, actions, pi):
+        """Checks if the sequence of actions is always executable from any state satisfying π."""
+        _, always_executable = self.find_frontier(actions, pi)
+        return always_executable
+
+    @profiled
+    @cached
+    def possibly_executable(self, actions, pi):
+        """Checks if the sequence of actions is sometimes executable from any state satisfying π."""
+        frontier, _ = self.find_frontier(actions, pi)
+        return not frontier.is_zero()
+
+
+class SparseQueryParser(QueryParser):
+    """Answers queries on a python or numpy TransitionGraph by moving whole sets of states
+    through sparse transition matrices, instead of following each π-state on its own.
+
+    Frontiers carry the least and greatest cost of reaching each state, so a
+    batch answers cost queries from the same shared prefixes. Asked alone, cost
+    queries drop the states whose cost already exceeds the bound, as in
+    QueryParser; witnesses are read from QueryParser's frontiers.
+    """
+
+    def __init__(
+        self,
+        graph: TransitionGraph,
+        profiler: Optional[Profiler] = None,
+        cache: Optional[QueryCache] = None,
+    ):
+        super().__init__(graph, profiler, cache)
+        self._transitions = None
+
+    @property
+    def transitions(self) -> SparseTransitions:
+        if self._transitions is None or self._transitions.version != self.graph.version:
+            with self.profiler.phase("transition_matrices"):
+                self._transitions = SparseTransitions(self.graph)
+        return self._transitions
+
+    def find_frontier(self, actions, pi) -> Frontier:
+        """Returns the states reached after the actions from the states satisfying π, with their costs."""
+        transitions = self.transitions
+        actions = normalize_actions(actions)
+        frontiers = self.frontiers if self.frontiers is not None else {}
+        done = len(actions)
+        while done and (pi, actions[:done]) not in frontiers:
+            done -= 1
+        if done:
+            frontier = frontiers[(pi, actions[:done])]
+        else:
+            frontier = transitions.frontier(conjunction_code(self.graph.fluent_order, pi))
+        if done < len(actions):
+            frontier = frontiers[(pi, actions)] = transitions.follow(frontier, actions[done:])
+            self.profiler.count("images", len(actions) - done)
+        return frontier
+
+    def alpha_mask(self, alpha):
+        return self.transitions.satisfying(conjunction_code(self.graph.fluent_order, alpha))
+
+    @profiled
+    @cached
+    def necessary_alpha_after(self, alpha, actions, pi):
+        """Checks if α always holds after performing the sequence of actions from any state satisfying π."""
+        frontier = self.find_frontier(actions, pi)
+        return frontier.executable and not (frontier.states & ~self.alpha_mask(alpha)).any()
+
+    @profiled
+    @cached
+    def possibly_alpha_after(self, alpha, actions, pi):
+        """Checks if α sometimes holds after performing the sequence of actions from any state satisfying π."""
+        frontier = self.find_frontier(actions, pi)
+        return bool((frontier.states & self.alpha_mask(alpha)).any())
+
+    @profiled
+    @cached
+    def necessary_executable(self, actions, pi):
+        """Checks if the sequence of actions is always executable from any state satisfying π."""
+        return self.find_frontier(actions, pi).executable
+
+    @profiled
+    @cached
     def possibly_executable(self, actions, pi):
         """Checks if the sequence of actions is sometimes executable from any state satisfying π."""
-        for state in list(self.graph.nodes):
-            if self.state_satisfies(state, pi):
-                final_state, _ = self.find_last_state(state, actions)
-                if final_state is not None:
-                    return True
-        return False
+        return bool(self.find_frontier(actions, pi).states.any())
+
+    def cost_frontiers(self, actions, pi) -> Iterator[Frontier]:
+        """The states satisfying π, then the frontier over every branch after each action, with
+        min-plus and max-plus costs. States a caller removes from a frontier are not followed."""
+        transitions = self.transitions
+        frontier = transitions.frontier(conjunction_code(self.graph.fluent_order, pi))
+        yield frontier
+        for action in normalize_actions(actions):
+            frontier = transitions.matrix(action).apply(frontier)
+            self.profiler.count("images")
+            yield frontier
 
+    @staticmethod
+    def exceeds(frontier: Frontier, max_cost) -> bool:
+        return bool((frontier.max_costs[frontier.states] > max_cost).any())
+
+    @profiled
+    @cached
     def necessary_executable_with_cost(self, actions, pi, max_cost):
         """Checks if the sequence of actions is always executable with a total cost ≤ max_cost from any state satisfying π."""
-        for state in list(self.graph.nodes):
-            if self.state_satisfies(state, pi):
-                final_state, total_cost = self.find_last_state(state, actions)
-                st.write('total_cost', total_cost)
-                if final_state is None or total_cost > max_cost:
-                    return False
-        return True
+        if self.frontiers is not None:
+            frontier = self.find_frontier(actions, pi)
+            return frontier.executable and not self.exceeds(frontier, max_cost)
+        prune = not self.graph.has_negative_durations()
+        for frontier in self.cost_frontiers(actions, pi):
+            if not frontier.executable or prune and self.exceeds(frontier, max_cost):
+                return False
+        return not self.exceeds(frontier, max_cost)
 
+    @profiled
+    @cached
     def possibly_executable_with_cost(self, actions, pi, max_cost):
         """Checks if the sequence of actions is sometimes executable with a total cost ≤ max_cost from any state satisfying π."""
-        for state in list(self.graph.nodes):
-            if self.state_satisfies(state, pi):
-                final_state, total_cost = self.find_last_state(state, actions)
-                st.write('total_cost', total_cost)
-                if final_state is not None and total_cost <= max_cost:
-                    return True
-        return False
\ No newline at end of file
+        if self.frontiers is not None:
+            frontier = self.find_frontier(actions, pi)
+            return bool((frontier.states & (frontier.min_costs <= max_cost)).any())
+        prune = not self.graph.has_negative_durations()
+        for frontier in self.cost_frontiers(actions, pi):
+            if prune:
+                frontier.states &= frontier.min_costs <= max_cost
+            if not frontier.states.any():
+                return False
+        return bool((frontier.states & (frontier.min_costs <= max_cost)).any())
+
+    @profiled
+    @cached
+    def cost_bounds(self, actions, pi):
+        """Best-case and worst-case total duration of the sequence of actions over all branches that execute it
+        from the states satisfying π, or None if no branch does."""
+        frontier = self.find_frontier(actions, pi)
+        if not frontier.states.any():
+            return None
+        return int(frontier.min_costs[frontier.states].min()), int(frontier.max_costs[frontier.states].max())
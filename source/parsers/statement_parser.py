@@ -1,6 +1,11 @@
-import re
-from typing import Tuple, List
-from source.graph.transition_graph import TransitionGraph, StateNode, Edge
+from typing import Tuple, List, Optional
+
+import numpy as np
+
+from source.graph.lazy import LazyTransitions
+from source.graph.transition_graph import TransitionGraph
+from source.graph.symbolic import conj, disj
+from source.profiling import Profiler, ProfileReport
 from source.parsers.custom_parsers import (
     InitiallyParser, 
     CausesParser, 
@@ -9,14 +14,44 @@ from source.parsers.custom_parsers import (
     AfterParser,
     AlwaysParser,
     ImpossibleParser,
-    NoninertialParser
 )
 
+PARALLEL_SHARD_SIZE = 1 << 12
+
+_worker_transitions = None
+_worker_codes = None
+
+
+def _init_worker(transitions: LazyTransitions, codes: np.ndarray) -> None:
+    """Keeps the compiled domain rules and the possible state codes, received once per worker process."""
+    global _worker_transitions, _worker_codes
+    _worker_transitions = transitions
+    _worker_codes = codes
+
+
+def _action_edges(action: str, start: int, stop: int) -> Tuple[str, np.ndarray, np.ndarray]:
+    """Edges of ``action`` from the possible state codes at positions [start, stop), as code arrays."""
+    sources, targets = [], []
+    for code in _worker_codes[start:stop].tolist():
+        for target in _worker_transitions.successors(code, action):
+            sources.append(code)
+            targets.append(target)
+    return action, np.array(sources, dtype=np.uint64), np.array(targets, dtype=np.uint64)
+
 
 class StatementParser:
 
-    def __init__(self, transition_graph: TransitionGraph):
+    def __init__(
+        self,
+        transition_graph: TransitionGraph,
+        workers: Optional[int] = None,
+        shard_size: int = PARALLEL_SHARD_SIZE,
+        profiler: Optional[Profiler] = None,
+    ):
         self.transition_graph = transition_graph
+        self.profiler = profiler if profiler is not None else Profiler()
+        self.workers = workers
+        self.shard_size = shard_size
         self.statements = {
             "noninertial": [],
             "initially": [],
@@ -41,16 +76,32 @@ class StatementParser:
         keyword = next((k for k in self.parser_classes if k in statement), None)
         if keyword:
             parser = self.parser_classes[keyword](self.transition_graph)
-            return parser.parse(statement)
+            result = parser.parse(statement)
+            self.count_work(parser)
+            return result
         else:
             raise ValueError(f"Unsupported statement: {statement}")
 
+    def count_work(self, parser) -> None:
+        """Adds the formula evaluations and membership checks a custom parser ran to the profiler counters."""
+        self.profiler.count("formula_evaluations", parser.evaluations)
+        self.profiler.count("membership_checks", parser.membership_checks)
+
     def add_statement(self, statement: str) -> None:
+        keyword = self.statement_keyword(statement)
+        self.statements[keyword] = self.statements[keyword] + [statement]
+
+    def remove_statement(self, statement: str) -> None:
+        keyword = self.statement_keyword(statement)
+        statements = list(self.statements[keyword])
+        statements.remove(statement)
+        self.statements[keyword] = statements
+
+    def statement_keyword(self, statement: str) -> str:
         keyword = next((k for k in self.statements if k in statement), None)
         if keyword:
-            self.statements[keyword] = self.statements[keyword] + [statement]
-        else:
-            raise ValueError(f"Unsupported statement: {statement}") 
+            return keyword
+        raise ValueError(f"Unsupported statement: {statement}")
 
     def extract_all_actions(self) -> List[str]:
         actions = []
@@ -75,7 +126,7 @@ class StatementParser:
         return fluents
 
     def clear_transition_graph(self) -> None:
-        self.transition_graph = TransitionGraph()
+        self.transition_graph = TransitionGraph(backend=self.transition_graph.backend)
 
     def prepare_statements(self) -> List[str]:
         return  self.statements["always"] + self.statements["impossible"] + \
@@ -98,57 +149,384 @@ class StatementParser:
             base_statement += f" & ({statement.split('initially')[1].strip()})"
         return base_statement
 
-    def parse(self, statements: str) -> None:
+    def parse(self, statements: str) -> Optional[ProfileReport]:
+        """Parses the statements; returns the per-phase report when the profiler is enabled."""
+        with self.profiler.run("parse"):
+            for statement in statements:
+                self.add_statement(statement)
+            self.rebuild()
+        return self.profiler.last_report if self.profiler.enabled else None
+
+    def rebuild(self) -> None:
         
         # Prepare transition graph: clear graph, add all fluents and actions.
 
-        for statement in statements:
-            self.add_statement(statement)
-        
-        self.clear_transition_graph()
-        self.transition_graph.add_fluents(self.extract_all_fluents())
-        self.transition_graph.add_actions(self.extract_all_actions())
+        profiler = self.profiler
+        with profiler.phase("prepare"):
+            self.clear_transition_graph()
+            self.transition_graph.add_fluents(self.extract_all_fluents())
+            self.transition_graph.add_actions(self.extract_all_actions())
+
+        if self.transition_graph.state_space is not None:
+            self.parse_vectorized()
+            return
+
+        if self.transition_graph.symbolic is not None:
+            self.parse_symbolic()
+            return
+
+        if self.transition_graph.lazy is not None:
+            self.parse_lazy()
+            return
+
+        # Parse always and impossible statements
+
+        with profiler.phase("always"):
+            for statement in self.statements['always']:
+                always_states = self.parse_statement(statement)
+                self.transition_graph.always_states.extend(always_states)
+
+        with profiler.phase("impossible"):
+            for statement in self.statements['impossible']:
+                self.transition_graph.add_impossible_rule(*self.parse_statement(statement))
+
+        with profiler.phase("states"):
+            self.transition_graph.states = self.transition_graph.generate_possible_states()
+        profiler.count("states_generated", len(self.transition_graph.states))
+
+        edge_count = self.transition_graph.edge_count()
+        if self.workers is not None and self.workers > 1:
+            with profiler.phase("transitions_parallel"):
+                self.parse_transitions_parallel()
+        else:
+            # Parse causes statements
+            with profiler.phase("causes"):
+                grouped_causes_statements = self.group_causes_statements_by_action(self.statements['causes'])
+                for action, statements in grouped_causes_statements.items():
+                    parser = self.parser_classes['causes'](self.transition_graph)
+                    self.transition_graph.add_edges(parser.parse(statements))
+                    self.count_work(parser)
+
+            # Parse releases statements
+
+            with profiler.phase("releases"):
+                for statement in self.statements['releases']:
+                    edges = self.parse_statement(statement)
+                    self.transition_graph.add_edges(edges)
+        profiler.count("edges_created", self.transition_graph.edge_count() - edge_count)
+
+        # Parse initially statements
+        with profiler.phase("initially"):
+            if self.statements['initially']:
+                initially_statement = self.merge_initially_statements(self.statements['initially'])
+                self.transition_graph.add_possible_initial_states(self.parse_statement(initially_statement))
+
+        # Parse after statements
+        with profiler.phase("after"):
+            self.apply_after_statements(self.statements['after'])
+
+        # Parse lasts statements
+        with profiler.phase("lasts"):
+            for statement in self.statements['lasts']:
+                self.transition_graph.set_action_duration(*self.parse_statement(statement))
+
+        # Parse noninertial statements
+        for statement in self.statements['noninertial']:
+            pass
+
+    def parse_transitions_parallel(self) -> None:
+        """Builds causes and releases edges in worker processes, one task per action and source range."""
+        from concurrent.futures import ProcessPoolExecutor
+
+        transitions = LazyTransitions(self.transition_graph.fluent_order)
+        self.compile_rules(transitions)
+        actions = list(dict.fromkeys(list(transitions.causes) + list(transitions.releases)))
+        codes = np.array(sorted({state.code for state in self.transition_graph.states}), dtype=np.uint64)
+
+        with ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(transitions, codes),
+        ) as executor:
+            futures = [
+                executor.submit(_action_edges, action, start, min(start + self.shard_size, len(codes)))
+                for action in actions
+                for start in range(0, len(codes), self.shard_size)
+            ]
+            for future in futures:
+                action, sources, targets = future.result()
+                if len(sources):
+                    self.transition_graph.add_edge_arrays(action, sources, targets)
+
+    def parse_vectorized(self) -> None:
+        """Builds the domain on the numpy backend, one vectorized mask per formula."""
+        transition_graph = self.transition_graph
+        state_space = transition_graph.state_space
+        profiler = self.profiler
+        evaluations, membership_checks = state_space.evaluations, state_space.membership_checks
+
+        # Parse always and impossible statements
+
+        with profiler.phase("always"):
+            transition_graph.possible_mask = None if self.statements['always'] else state_space.all()
+            for statement in self.statements['always']:
+                transition_graph.add_always_mask(self.parser_classes['always'](transition_graph).parse_vectorized(statement))
+
+        with profiler.phase("impossible"):
+            for statement in self.statements['impossible']:
+                action, mask = self.parser_classes['impossible'](transition_graph).parse_vectorized(statement)
+                transition_graph.add_impossible_mask(action, mask)
+        profiler.count("states_generated", int(transition_graph.possible_mask.sum()))
+
+        # Parse causes and releases statements
+
+        with profiler.phase("causes"):
+            grouped_causes_statements = self.group_causes_statements_by_action(self.statements['causes'])
+            for action, statements in grouped_causes_statements.items():
+                transition_graph.add_edge_arrays(*self.parser_classes['causes'](transition_graph).parse_vectorized(statements))
+
+        with profiler.phase("releases"):
+            for statement in self.statements['releases']:
+                transition_graph.add_edge_arrays(*self.parser_classes['releases'](transition_graph).parse_vectorized(statement))
+        profiler.count("edges_created", transition_graph.edge_count())
+
+        # Parse initially statements
+        with profiler.phase("initially"):
+            if self.statements['initially']:
+                initially_statement = self.merge_initially_statements(self.statements['initially'])
+                transition_graph.add_possible_initial_states(
+                    self.parser_classes['initially'](transition_graph).parse_vectorized(initially_statement)
+                )
+        # every state a mask was computed over, and every target looked up in the allowed mask
+        profiler.count("formula_evaluations", state_space.evaluations - evaluations)
+        profiler.count("membership_checks", state_space.membership_checks - membership_checks)
+
+        # Parse lasts statements
+        with profiler.phase("lasts"):
+            for statement in self.statements['lasts']:
+                transition_graph.set_action_duration(*self.parser_classes['lasts'](transition_graph).parse(statement))
+
+        # Parse after statements
+        with profiler.phase("after"):
+            self.apply_after_statements(self.statements['after'])
+
+    def parse_symbolic(self) -> None:
+        """Builds the domain on the symbolic backend as BDD transition relations."""
+        transition_graph = self.transition_graph
+        system = transition_graph.symbolic
+        profiler = self.profiler
 
         # Parse always and impossible statements
 
+        with profiler.phase("always"):
+            for statement in self.statements['always']:
+                parser = self.parser_classes['always'](transition_graph)
+                system.add_always(parser.parse_symbolic(statement), parser.extract_fluents(statement))
+                profiler.count("constraints_built")
+
+        with profiler.phase("impossible"):
+            for statement in self.statements['impossible']:
+                system.add_impossible(*self.parser_classes['impossible'](transition_graph).parse_symbolic(statement))
+                profiler.count("constraints_built")
+
+        # Parse causes and releases statements
+
+        with profiler.phase("causes"):
+            grouped_causes_statements = self.group_causes_statements_by_action(self.statements['causes'])
+            for action, statements in grouped_causes_statements.items():
+                system.add_relation(*self.parser_classes['causes'](transition_graph).parse_symbolic(statements))
+                profiler.count("relations_built")
+
+        with profiler.phase("releases"):
+            for statement in self.statements['releases']:
+                system.add_relation(*self.parser_classes['releases'](transition_graph).parse_symbolic(statement))
+                profiler.count("relations_built")
+
+        # Parse initially statements
+        with profiler.phase("initially"):
+            if self.statements['initially']:
+                initially_statement = self.merge_initially_statements(self.statements['initially'])
+                system.initial = self.parser_classes['initially'](transition_graph).parse_symbolic(initially_statement)
+
+        # Parse lasts statements
+        with profiler.phase("lasts"):
+            for statement in self.statements['lasts']:
+                transition_graph.set_action_duration(*self.parser_classes['lasts'](transition_graph).parse(statement))
+
+        # Parse after statements
+        with profiler.phase("after"):
+            for statement in self.statements['after']:
+                possible_states, possible_ending_states = self.parser_classes['after'](transition_graph).parse_symbolic(statement)
+                system.initial = conj(system.initial, possible_states)
+                system.ending = disj(system.ending, possible_ending_states)
+
+    def parse_lazy(self) -> None:
+        """Compiles the domain into rules for the lazy backend; no state or edge is built here."""
+        transition_graph = self.transition_graph
+        transitions = transition_graph.lazy
+
+        with self.profiler.phase("compile"):
+            self.compile_rules(transitions)
+
+            if self.statements['initially']:
+                initially_statement = self.merge_initially_statements(self.statements['initially'])
+                transitions.initial = self.parser_classes['initially'](transition_graph).parse_lazy(initially_statement)
+                self.profiler.count("rules_compiled")
+
+            for statement in self.statements['lasts']:
+                transition_graph.set_action_duration(*self.parser_classes['lasts'](transition_graph).parse(statement))
+
+    def compile_rules(self, transitions: LazyTransitions) -> None:
+        """Adds the compiled always, impossible, causes and releases statements to ``transitions``."""
+        transition_graph = self.transition_graph
+        profiler = self.profiler
         for statement in self.statements['always']:
-            always_states = self.parse_statement(statement)
-            self.transition_graph.always_states.extend(always_states)
-        
-        for statement in self.statements['impossible']:
-            impossible_edges = self.parse_statement(statement)
-            self.transition_graph.add_impossible_edges(impossible_edges)
+            transitions.add_always(self.parser_classes['always'](transition_graph).parse_lazy(statement))
+            profiler.count("rules_compiled")
 
-        self.transition_graph.states = self.transition_graph.generate_possible_states()
+        for statement in self.statements['impossible']:
+            transitions.add_impossible(*self.parser_classes['impossible'](transition_graph).parse(statement))
+            profiler.count("rules_compiled")
 
-        # Parse causes statements
         grouped_causes_statements = self.group_causes_statements_by_action(self.statements['causes'])
         for action, statements in grouped_causes_statements.items():
-            edges = self.parser_classes['causes'](self.transition_graph).parse(statements)
-            self.transition_graph.add_edges(edges)
-        
-        # Parse releases statements
+            transitions.add_causes(*self.parser_classes['causes'](transition_graph).parse_lazy(statements))
+            profiler.count("rules_compiled", len(statements))
 
         for statement in self.statements['releases']:
-            edges = self.parse_statement(statement)
-            self.transition_graph.add_edges(edges)
+            transitions.add_releases(*self.parser_classes['releases'](transition_graph).parse_lazy(statement))
+            profiler.count("rules_compiled")
 
-        # Parse initially statements
-        if self.statements['initially']:
+    def insert(self, statement: str) -> None:
+        """Adds a statement and updates only the parts of the built domain that depend on it."""
+        keyword = self.statement_keyword(statement)
+        self.add_statement(statement)
+        self.update(keyword, statement, added=True)
+
+    def remove(self, statement: str) -> None:
+        """Removes a statement and updates only the parts of the built domain that depend on it."""
+        keyword = self.statement_keyword(statement)
+        self.remove_statement(statement)
+        self.update(keyword, statement, added=False)
+
+    def sync(self, statements: List[str]) -> None:
+        """Brings the parsed statements to ``statements``.
+
+        All removals and insertions are applied first; the domain is then
+        either rebuilt once or updated for each difference.
+        """
+        remaining = list(statements)
+        removed = []
+        for statement in self.prepare_statements() + self.statements['noninertial']:
+            if statement in remaining:
+                remaining.remove(statement)
+            else:
+                removed.append(statement)
+        changes = [(self.statement_keyword(statement), statement, False) for statement in removed]
+        changes += [(self.statement_keyword(statement), statement, True) for statement in remaining]
+        if not changes:
+            return
+
+        for _, statement, added in changes:
+            if added:
+                self.add_statement(statement)
+            else:
+                self.remove_statement(statement)
+        if self.requires_rebuild([keyword for keyword, _, _ in changes]):
+            self.rebuild()
+            return
+        for keyword, statement, added in changes:
+            self.update(keyword, statement, added)
+
+    def requires_rebuild(self, keywords: List[str]) -> bool:
+        """Whether statements of these kinds changing needs the domain rebuilt rather than updated.
+
+        Only the python backend is maintained incrementally; a changed fluent
+        list or an ``always``/``impossible`` statement rebuilds the domain.
+        """
+        return (
+            self.transition_graph.backend != "python"
+            or list(dict.fromkeys(self.extract_all_fluents())) != self.transition_graph.fluents
+            or any(keyword in ("always", "impossible") for keyword in keywords)
+        )
+
+    def update(self, keyword: str, statement: str, added: bool) -> None:
+        """Recomputes what depends on one added or removed statement, or rebuilds the domain if ``requires_rebuild``."""
+        transition_graph = self.transition_graph
+        transition_graph.mark_changed()
+        if self.requires_rebuild([keyword]):
+            self.rebuild()
+            return
+
+        transition_graph.actions = []
+        transition_graph.add_actions(self.extract_all_actions())
+
+        if keyword in ("causes", "releases"):
+            action = self.parser_classes[keyword](transition_graph).extract_actions(statement)[0]
+            self.update_action_edges(action)
+            after_parser = self.parser_classes['after'](transition_graph)
+            if any(action in after_parser.extract_actions(after_statement)
+                   for after_statement in self.statements['after']):
+                self.update_initial_states()
+        elif keyword == "lasts":
+            self.update_action_durations(self.parser_classes['lasts'](transition_graph).extract_actions(statement)[0])
+        elif keyword == "initially" and added and len(self.statements['initially']) > 1:
+            # initially statements are conjoined, so a new one can only narrow the set
             initially_statement = self.merge_initially_statements(self.statements['initially'])
-            self.transition_graph.add_possible_initial_states(self.parse_statement(initially_statement))
+            initial_states = set(self.parse_statement(initially_statement))
+            transition_graph.possible_initial_states = [
+                state for state in transition_graph.possible_initial_states if state in initial_states
+            ]
+        elif keyword == "after" and added:
+            self.apply_after_statements([statement])
+        elif keyword in ("initially", "after"):
+            self.update_initial_states()
 
-        # Parse after statements
-        for statement in self.statements['after']:
-            initial_states_for_removal, possible_ending_states = self.parse_statement(statement)
-            self.transition_graph.remove_possible_initial_states(initial_states_for_removal)
-            self.transition_graph.add_possible_ending_states(possible_ending_states)
+    def update_action_edges(self, action: str) -> None:
+        transition_graph = self.transition_graph
+        transition_graph.edges = [edge for edge in transition_graph.edges if edge.action != action]
 
-        # Parse lasts statements
+        causes_statements = self.group_causes_statements_by_action(self.statements['causes']).get(action)
+        if causes_statements:
+            transition_graph.add_edges(self.parser_classes['causes'](transition_graph).parse(causes_statements))
+
+        for statement in self.statements['releases']:
+            if self.parser_classes['releases'](transition_graph).extract_actions(statement)[0] == action:
+                transition_graph.add_edges(self.parse_statement(statement))
+
+        self.update_action_durations(action)
+
+    def update_action_durations(self, action: str) -> None:
+        transition_graph = self.transition_graph
+        transition_graph.clear_action_durations(action)
         for statement in self.statements['lasts']:
-            durations = self.parse_statement(statement)
-            self.transition_graph.add_durations(durations)
+            if self.parser_classes['lasts'](transition_graph).extract_actions(statement)[0] == action:
+                transition_graph.set_action_duration(*self.parse_statement(statement))
 
-        # Parse noninertial statements
-        for statement in self.statements['noninertial']:
-            pass
\ No newline at end of file
+    def update_initial_states(self) -> None:
+        transition_graph = self.transition_graph
+        transition_graph.possible_initial_states = []
+        transition_graph.possible_ending_states = []
+
+        if self.statements['initially']:
+            initially_statement = self.merge_initially_statements(self.statements['initially'])
+            transition_graph.add_possible_initial_states(self.parse_statement(initially_statement))
+
+        self.apply_after_statements(self.statements['after'])
+
+    def apply_after_statements(self, statements: List[str]) -> None:
+        """Intersects the initial states with the preimages of all after statements at once."""
+        if not statements:
+            return
+        transition_graph = self.transition_graph
+        possible_states = None
+        for statement in statements:
+            parser = self.parser_classes['after'](transition_graph)
+            preimage, possible_ending_states = parser.parse_masks(statement)
+            self.count_work(parser)
+            possible_states = preimage if possible_states is None else possible_states & preimage
+            transition_graph.add_possible_ending_states(possible_ending_states)
+        self.profiler.count("membership_checks", len(transition_graph.possible_initial_states))
+        transition_graph.possible_initial_states = [
+            state for state in transition_graph.possible_initial_states if possible_states[state.code]
+        ]
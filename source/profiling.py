@@ -0,0 +1,137 @@
+import time
+import tracemalloc
+from contextlib import nullcontext
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional
+
+_DISABLED = nullcontext()
+
+
+class ProfileReport:
+    """Wall time, call count and optional peak traced memory per phase, plus event counters."""
+
+    def __init__(self, name: str, phases: Dict[str, Dict[str, float]], counters: Dict[str, int]):
+        self.name = name
+        self.phases = phases
+        self.counters = counters
+
+    @property
+    def seconds(self) -> float:
+        return self.phases.get(self.name, {}).get("seconds", 0.0)
+
+    def rows(self) -> List[Dict[str, Any]]:
+        return [{"phase": phase, **measured} for phase, measured in self.phases.items()]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "phases": self.phases, "counters": self.counters}
+
+    def __str__(self) -> str:
+        lines = [f"{self.name}: {self.seconds:.4f}s"]
+        for phase, measured in self.phases.items():
+            if phase == self.name:
+                continue
+            peak = f" {measured['peak_bytes'] / 1024:.0f} KiB" if "peak_bytes" in measured else ""
+            lines.append(f"  {phase:<20} {measured['seconds']:.4f}s x{measured['calls']}{peak}")
+        lines.extend(f"  {counter:<20} {value}" for counter, value in self.counters.items())
+        return "\n".join(lines)
+
+
+class _Phase:
+    __slots__ = ("profiler", "name", "start", "peak")
+
+    def __init__(self, profiler: "Profiler", name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self) -> "_Phase":
+        stack = self.profiler._stack
+        if self.profiler.memory and tracemalloc.is_tracing():
+            # a nested phase restarts the peak, so keep what the enclosing one has seen so far
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        self.peak = 0
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        seconds = time.perf_counter() - self.start
+        profiler = self.profiler
+        profiler._stack.pop()
+        measured = profiler.phases.setdefault(self.name, {"seconds": 0.0, "calls": 0})
+        measured["seconds"] += seconds
+        measured["calls"] += 1
+        if profiler.memory and tracemalloc.is_tracing():
+            peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            measured["peak_bytes"] = max(measured.get("peak_bytes", 0), peak)
+            if profiler._stack:
+                profiler._stack[-1].peak = max(profiler._stack[-1].peak, peak)
+
+
+class _Run:
+    __slots__ = ("profiler", "phase", "outermost", "started_tracing")
+
+    def __init__(self, profiler: "Profiler", name: str):
+        self.profiler = profiler
+        self.phase = _Phase(profiler, name)
+
+    def __enter__(self) -> "_Run":
+        profiler = self.profiler
+        self.outermost = not profiler._stack
+        self.started_tracing = False
+        if self.outermost:
+            profiler.reset()
+            if profiler.memory and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.started_tracing = True
+        self.phase.__enter__()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.phase.__exit__(*exc_info)
+        if self.outermost:
+            if self.started_tracing:
+                tracemalloc.stop()
+            self.profiler.last_report = ProfileReport(self.phase.name, self.profiler.phases, self.profiler.counters)
+
+
+class Profiler:
+    """Collects per-phase timings and counters; every call is a no-op while ``enabled`` is False.
+
+    ``run`` wraps a top-level operation: it starts a fresh report (and, with
+    ``memory``, tracemalloc) unless it is nested in another run. ``phase``
+    times a part of it and ``count`` adds to a named counter.
+    """
+
+    def __init__(self, enabled: bool = False, memory: bool = False):
+        self.enabled = enabled
+        self.memory = memory
+        self.last_report: Optional[ProfileReport] = None
+        self._stack: List[_Phase] = []
+        self.reset()
+
+    def reset(self) -> None:
+        self.phases: Dict[str, Dict[str, float]] = {}
+        self.counters: Dict[str, int] = {}
+
+    def run(self, name: str):
+        return _Run(self, name) if self.enabled else _DISABLED
+
+    def phase(self, name: str):
+        return _Phase(self, name) if self.enabled else _DISABLED
+
+    def count(self, name: str, amount: int = 1) -> None:
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+
+def profiled(method: Callable) -> Callable:
+    """Runs a method of an object with a ``profiler`` attribute as a profiled top-level operation."""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not self.profiler.enabled:
+            return method(self, *args, **kwargs)
+        with self.profiler.run(method.__name__):
+            return method(self, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,39 @@
+import os
+
+import pytest
+
+pytest.importorskip("streamlit")
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.chdir(os.path.dirname(APP_PATH))
+    monkeypatch.setenv("KRR_DOMAIN_CACHE", str(tmp_path))
+    app = AppTest.from_file(APP_PATH, default_timeout=60)
+    app.run()
+    return app
+
+
+def test_contradictory_example_is_reported(app):
+    app.selectbox[0].select("Contradictory initially statement").run()
+    app.button(key="parse_selected_example").click().run()
+    assert not app.exception
+    assert "Cannot parse the example" in app.error[0].value
+
+
+def test_contradictory_after_statement_is_reported(app):
+    app.session_state.statements = [
+        ("causes", "Load causes loaded"),
+        ("after", "loaded & ~loaded after Load"),
+    ]
+    app.button(key="parse_statements").click().run()
+    assert not app.exception
+    assert "Cannot parse the statements" in app.error[0].value
+
+    app.session_state.statements = [("causes", "Load causes loaded"), ("after", "loaded after Load")]
+    app.button(key="parse_statements").click().run()
+    assert not app.exception
+    assert not app.error
@@ -0,0 +1,75 @@
+import pytest
+
+from benchmarks.generator import generate_domain
+from source.graph.transition_graph import TransitionGraph
+from source.parsers.domain_file import load_examples
+from source.parsers.query_parser import QueryParser
+from source.parsers.statement_parser import StatementParser
+
+EXAMPLES = {
+    name: [statement for statement in statements if statement]
+    for name, statements in load_examples("tests/examples.txt").items()
+}
+DOMAINS = [
+    pytest.param(statements, id=name)
+    for name, statements in EXAMPLES.items()
+    if name in ("Yale Shooting Problem (YSP)", "Stanford Murder Mystery", "Coin toss", "Two Switches", "Mike's busy day")
+] + [
+    pytest.param(generate_domain(n, 3, causes=2, releases=1, impossible=1, always=2, seed=seed), id=f"random-{n}-{seed}")
+    for n in (3, 4, 5)
+    for seed in range(15)
+] + [
+    pytest.param(["A0 causes ~f1 if ~f4", "always f4 | f4", "always f1 | f0"], id="repeated-always-fluent"),
+]
+
+
+def compile_graph(statements, backend):
+    statement_parser = StatementParser(TransitionGraph(backend=backend))
+    statement_parser.parse(statements)
+    return statement_parser.transition_graph
+
+
+def label(fluents):
+    return frozenset(fluents.items())
+
+
+def explicit_edges(graph):
+    """(source, action, target) of every transition, states given by their fluent values."""
+    return {
+        (label(state.fluents), action, label(target.fluents))
+        for state in QueryParser(graph).states
+        for action in graph.actions
+        for target in graph.targets(state, action)
+    }
+
+
+def symbolic_edges(graph):
+    system = graph.symbolic
+    fluents = graph.fluent_order.fluents
+    states = [
+        {fluent: bool(code >> i & 1) for i, fluent in enumerate(fluents)}
+        for code in range(1 << len(fluents))
+    ]
+    cubes = [system.conditions(" & ".join(("" if value else "~") + fluent for fluent, value in state.items()))
+             for state in states]
+    edges = set()
+    for state, cube in zip(states, cubes):
+        for action in graph.actions:
+            image = system.image(cube, action)
+            edges.update(
+                (label(state), action, label(target))
+                for target, target_cube in zip(states, cubes)
+                if not (image & target_cube).is_zero()
+            )
+    return edges
+
+
+@pytest.mark.parametrize("statements", DOMAINS)
+def test_backends_build_the_same_edges(statements):
+    try:
+        expected = explicit_edges(compile_graph(statements, "python"))
+    except AssertionError:
+        pytest.skip("inconsistent domain")
+    assert explicit_edges(compile_graph(statements, "numpy")) == expected
+    assert explicit_edges(compile_graph(statements, "lazy")) == expected
+    assert symbolic_edges(compile_graph(statements, "symbolic")) == expected
@@ -0,0 +1,37 @@
+import io
+import json
+
+import pytest
+
+from cli import load_domains, run
+from source.parsers.domain_cache import DomainCache
+
+DOMAIN = "Stanford Murder Mystery"
+
+
+def answers(queries, backend, **options):
+    output = io.StringIO()
+    failures = run(load_domains(["tests/examples.txt"]), io.StringIO(queries), output, backend, DOMAIN, **options)
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    return failures, [record for record in records if "query" in record]
+
+
+@pytest.mark.parametrize("backend", ["python", "lazy", "symbolic"])
+def test_witness_option_keeps_the_answer_on_every_backend(backend):
+    failures, records = answers("possibly ~alive after Shoot from loaded\n", backend, witness=True)
+    assert failures == 0
+    assert records[0]["answer"] is True
+    if backend == "symbolic":
+        assert records[0]["witness"] is None
+    else:
+        assert records[0]["witness"]["actions"] == ["Shoot"]
+
+
+def test_cache_dir_reuses_parsed_domains(tmp_path):
+    queries = "necessary ~alive after Shoot from loaded\npossibly executable Shoot,Shoot from alive\n"
+    _, parsed = answers(queries, "python")
+    for _ in range(2):
+        failures, cached = answers(queries, "python", domain_cache=DomainCache(str(tmp_path)))
+        assert failures == 0
+        assert [record["answer"] for record in cached] == [record["answer"] for record in parsed]
+    assert len(list(tmp_path.glob("*.npz"))) == 1
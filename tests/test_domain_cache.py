@@ -0,0 +1,90 @@
+import os
+
+import pytest
+
+from benchmarks.generator import generate_domain
+from source.graph.transition_graph import TransitionGraph
+from source.parsers.domain_cache import DomainCache, fingerprint
+from source.parsers.domain_file import load_examples
+from source.parsers.query_parser import QueryParser
+from source.parsers.statement_parser import StatementParser
+
+DOMAINS = [
+    pytest.param([statement for statement in statements if statement], id=name)
+    for name, statements in load_examples("tests/examples.txt").items()
+    if name in ("Yale Shooting Problem (YSP)", "Stanford Murder Mystery", "Russian Turkey Scenario", "Mike's busy day")
+] + [pytest.param(generate_domain(n, 3, seed=n), id=f"random-{n}") for n in (3, 5, 7)]
+
+
+def label(state):
+    return tuple(sorted(state.fluents.items()))
+
+
+def contents(graph):
+    return (
+        sorted(graph.fluents),
+        sorted(graph.actions),
+        sorted(
+            (label(edge.source), edge.action, label(edge.target), graph.duration(edge.source, edge.action, edge.target))
+            for edge in graph.edges
+        ),
+        sorted(label(state) for state in graph.generate_possible_states()),
+        sorted(label(state) for state in graph.possible_initial_states),
+        sorted(label(state) for state in graph.possible_ending_states),
+    )
+
+
+@pytest.mark.parametrize("backend", ["python", "numpy"])
+@pytest.mark.parametrize("statements", DOMAINS)
+def test_snapshot_round_trip(statements, backend, tmp_path):
+    statement_parser = StatementParser(TransitionGraph(backend=backend))
+    statement_parser.parse(statements)
+    parsed = statement_parser.transition_graph
+
+    cache = DomainCache(str(tmp_path))
+    assert cache.get(statements) is None
+    cache.parse(statements, backend)
+    loaded = cache.get(statements)
+    assert loaded is not None
+    assert contents(loaded) == contents(parsed)
+
+    fluent = sorted(parsed.fluents)[0]
+    actions = sorted(parsed.actions)[:2]
+    query_parser, expected = QueryParser(loaded), QueryParser(parsed)
+    assert query_parser.cost_bounds(actions, fluent) == expected.cost_bounds(actions, fluent)
+    assert query_parser.necessary_executable(actions, fluent) == expected.necessary_executable(actions, fluent)
+
+
+def test_fingerprint_ignores_statement_order_and_spacing():
+    statements = ["initially alive", "Load causes loaded", "Shoot causes ~alive if loaded", "Load lasts 2"]
+    reordered = [statements[2], "Load  causes   loaded", statements[3], statements[0]]
+    assert fingerprint(statements) == fingerprint(reordered)
+    assert fingerprint(statements) != fingerprint(statements + ["Load lasts 3"])
+
+
+def test_least_recently_used_snapshots_are_evicted(tmp_path):
+    cache = DomainCache(str(tmp_path))
+    first, second = generate_domain(5, 3, seed=1), generate_domain(5, 3, seed=2)
+    cache.parse(first)
+    size = os.path.getsize(cache.path(fingerprint(first)))
+    cache.max_bytes = size + size // 2
+    os.utime(cache.path(fingerprint(first)), (0, 0))
+    cache.parse(second)
+    assert cache.get(first) is None
+    assert cache.get(second) is not None
+
+
+@pytest.mark.parametrize("size", [0, 1800, None])
+def test_corrupt_snapshot_is_parsed_again(size, tmp_path):
+    statements = DOMAINS[0].values[0]
+    cache = DomainCache(str(tmp_path))
+    expected = contents(cache.parse(statements))
+    path = cache.path(fingerprint(statements))
+    with open(path, "rb") as file:
+        data = file.read()
+    with open(path, "wb") as file:
+        file.write(data[:size] if size is not None else data[::-1])
+    assert cache.get(statements) is None
+    assert not os.path.exists(path)
+    assert contents(cache.parse(statements)) == expected
+    assert cache.get(statements) is not None
@@ -0,0 +1,87 @@
+import random
+
+import pytest
+
+from benchmarks.generator import generate_domain
+from source.graph.transition_graph import TransitionGraph
+from source.parsers.statement_parser import StatementParser
+
+
+def label(state):
+    return tuple(sorted(state.fluents.items()))
+
+
+def snapshot(statement_parser):
+    graph = statement_parser.transition_graph
+    return (
+        sorted(graph.fluents),
+        sorted(graph.actions),
+        sorted(
+            (label(edge.source), edge.action, label(edge.target), graph.duration(edge.source, edge.action, edge.target))
+            for edge in graph.edges
+        ),
+        sorted(label(state) for state in graph.possible_initial_states),
+        sorted(label(state) for state in graph.possible_ending_states),
+    )
+
+
+def outcome(build, statement_parser):
+    """Snapshot of the domain after ``build``, or the type of the error it raised."""
+    try:
+        build()
+    except (AssertionError, ValueError) as error:
+        return type(error)
+    return snapshot(statement_parser)
+
+
+def rebuilt(statements):
+    statement_parser = StatementParser(TransitionGraph())
+    return outcome(lambda: statement_parser.parse(list(statements)), statement_parser)
+
+
+def statement_pool(seed):
+    rng = random.Random(seed)
+    # one lasts statement per action, since the last of several wins and statement order is not kept
+    more = [statement for statement in generate_domain(5, 3, always=0, seed=seed + 1000) if " lasts " not in statement]
+    pool = generate_domain(4, 3, seed=seed) + more
+    pool += [f"f{rng.randrange(4)} after A{rng.randrange(3)}", "initially f1", "initially ~f2 | f3"]
+    return [statement for statement in pool if not statement.startswith("always") or rng.random() < 0.3]
+
+
+@pytest.mark.parametrize("seed", range(12))
+def test_insert_and_remove_match_a_rebuild(seed):
+    rng = random.Random(seed)
+    pool = statement_pool(seed)
+    statement_parser = StatementParser(TransitionGraph())
+    current = []
+    for _ in range(10):
+        if current and rng.random() < 0.35:
+            statement = rng.choice(current)
+            current.remove(statement)
+            change = statement_parser.remove
+        else:
+            statement = rng.choice([statement for statement in pool if statement not in current])
+            current.append(statement)
+            change = statement_parser.insert
+        expected = rebuilt(current)
+        assert outcome(lambda: change(statement), statement_parser) == expected
+        if not isinstance(expected, tuple):
+            statement_parser, current = StatementParser(TransitionGraph()), []
+
+
+@pytest.mark.parametrize("seed", range(12))
+def test_sync_matches_a_rebuild_and_rebuilds_at_most_once(seed, monkeypatch):
+    rng = random.Random(seed)
+    pool = statement_pool(seed)
+    statement_parser = StatementParser(TransitionGraph())
+    rebuilds = []
+    rebuild = statement_parser.rebuild
+    monkeypatch.setattr(statement_parser, "rebuild", lambda: (rebuilds.append(1), rebuild()))
+    for _ in range(5):
+        statements = rng.sample(pool, rng.randint(1, len(pool)))
+        rebuilds.clear()
+        expected = rebuilt(statements)
+        assert outcome(lambda: statement_parser.sync(statements), statement_parser) == expected
+        assert len(rebuilds) <= 1
+        if not isinstance(expected, tuple):
+            return
@@ -0,0 +1,42 @@
+import pytest
+
+from benchmarks.generator import generate_domain
+from source.graph.transition_graph import TransitionGraph
+from source.parsers.custom_parsers import CausesParser
+from source.parsers.statement_parser import StatementParser
+
+
+def all_pairs_edges(parser, statements):
+    """Edges of one action found by scanning every (source, target) pair for the fewest changed fluents."""
+    edges = set()
+    action, compiled_statements = parser.compile_statements(statements)
+    graph = parser.transition_graph
+    for from_state in graph.states:
+        if graph.is_impossible(from_state, action):
+            continue
+        effects = [
+            effect for effect, precondition in compiled_statements if parser.precondition_met(precondition, from_state)
+        ]
+        updates = [
+            (to_state, (from_state.code ^ to_state.code).bit_count())
+            for to_state in graph.states
+            if all(parser.evaluate_formula(effect, to_state) for effect in effects)
+        ]
+        if updates:
+            fewest = min(changes for _, changes in updates)
+            edges.update((from_state.code, action, to_state.code) for to_state, changes in updates if changes == fewest)
+    return edges
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_causes_edges_change_the_fewest_fluents(seed):
+    statements = generate_domain(3 + seed % 4, 3, causes=2, releases=0, impossible=1, always=2, seed=seed)
+    statement_parser = StatementParser(TransitionGraph())
+    statement_parser.parse(statements)
+    parser = CausesParser(statement_parser.transition_graph)
+    for action in statement_parser.transition_graph.actions:
+        causes = [statement for statement in statements if statement.startswith(f"{action} causes")]
+        if not causes:
+            continue
+        edges = {(edge.source.code, edge.action, edge.target.code) for edge in parser.parse(causes)}
+        assert edges == all_pairs_edges(parser, causes)
@@ -0,0 +1,47 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from benchmarks.generator import generate_domain
+from source.graph.lazy import LazyTransitions
+from source.graph.transition_graph import TransitionGraph
+from source.parsers.statement_parser import StatementParser, _action_edges, _init_worker
+
+
+def edges(statements, **options):
+    statement_parser = StatementParser(TransitionGraph(), **options)
+    statement_parser.parse(statements)
+    graph = statement_parser.transition_graph
+    return (
+        sorted(
+            (edge.source.code, edge.action, edge.target.code, graph.duration(edge.source, edge.action, edge.target))
+            for edge in graph.edges
+        ),
+        sorted(state.code for state in graph.possible_initial_states),
+    )
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_parallel_build_matches_the_serial_one(seed):
+    statements = generate_domain(5 + seed, 4, causes=2, releases=1, impossible=1, always=1, seed=seed)
+    statements.append(f"f0 after A{seed}")
+    assert edges(statements, workers=2, shard_size=8) == edges(statements)
+
+
+def test_workers_receive_picklable_rules_and_only_possible_states():
+    statements = generate_domain(6, 4, causes=2, releases=1, impossible=1, always=1, seed=0)
+    statement_parser = StatementParser(TransitionGraph())
+    statement_parser.parse(statements)
+    graph = statement_parser.transition_graph
+    transitions = LazyTransitions(graph.fluent_order)
+    statement_parser.compile_rules(transitions)
+    codes = np.array(sorted({state.code for state in graph.states}), dtype=np.uint64)
+    assert len(codes) < 1 << len(graph.fluents)
+
+    _init_worker(*pickle.loads(pickle.dumps((transitions, codes))))
+    found = []
+    for action in graph.actions:
+        _, sources, targets = _action_edges(action, 0, len(codes))
+        found += [(source, action, target) for source, target in zip(sources.tolist(), targets.tolist())]
+    assert sorted(found) == sorted((edge.source.code, edge.action, edge.target.code) for edge in graph.edges)
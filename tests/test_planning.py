@@ -0,0 +1,67 @@
+import itertools
+import random
+
+import pytest
+
+from benchmarks.generator import generate_domain
+from source.graph.transition_graph import TransitionGraph
+from source.parsers.query_parser import QueryParser
+from source.parsers.statement_parser import StatementParser
+
+MAX_LENGTH = 4
+
+
+def branches(graph, state, actions, cost=0):
+    """(final state, total duration) of every branch that executes the actions from the state."""
+    if not actions:
+        yield state, cost
+        return
+    for target, duration in graph.successors(state, actions[0]):
+        yield from branches(graph, target, actions[1:], cost + duration)
+
+
+def brute_force_costs(query_parser, alpha, pi):
+    """Cheapest cost of a plan of at most MAX_LENGTH actions in each mode, where one exists."""
+    graph = query_parser.graph
+    best = {}
+    for length in range(MAX_LENGTH + 1):
+        for actions in itertools.product(sorted(graph.actions), repeat=length):
+            actions = list(actions)
+            if query_parser.necessary_alpha_after(alpha, actions, pi):
+                cost = (query_parser.cost_bounds(actions, pi) or (0, 0))[1]
+                best["every"] = min(best.get("every", cost), cost)
+            costs = [
+                cost
+                for state in query_parser.pi_states(pi)
+                for final, cost in branches(graph, state, actions)
+                if query_parser.state_satisfies(final, alpha)
+            ]
+            if costs:
+                best["some"] = min(best.get("some", min(costs)), min(costs))
+    return best
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_cheapest_plans_match_brute_force(seed):
+    statements = generate_domain(4, 3, causes=2, releases=seed % 3, impossible=seed % 2, always=0, seed=seed)
+    statement_parser = StatementParser(TransitionGraph())
+    statement_parser.parse(statements)
+    query_parser = QueryParser(statement_parser.transition_graph)
+    rng = random.Random(seed)
+    fluents = sorted(query_parser.graph.fluents)
+    for _ in range(4):
+        alpha = " & ".join(rng.choice(["", "~"]) + fluent for fluent in rng.sample(fluents, 2))
+        pi = " & ".join(rng.choice(["", "~"]) + fluent for fluent in rng.sample(fluents, rng.randint(1, 3)))
+        expected = brute_force_costs(query_parser, alpha, pi)
+        for mode, heuristic, bidirectional in [
+            ("some", True, False), ("some", False, False), ("some", False, True),
+            ("every", True, False), ("every", False, False),
+        ]:
+            plan = query_parser.cheapest_plan(alpha, pi, mode, heuristic, bidirectional)
+            if plan.found:
+                confirm = query_parser.possibly_alpha_after if mode == "some" else query_parser.necessary_alpha_after
+                assert confirm(alpha, plan.actions, pi)
+                if len(plan.actions) <= MAX_LENGTH:
+                    assert plan.cost == expected[mode]
+            if mode in expected:
+                assert plan.found and plan.cost <= expected[mode]
@@ -0,0 +1,72 @@
+import pytest
+
+from source.graph.transition_graph import TransitionGraph
+from source.parsers.domain_file import load_examples
+from source.parsers.query_parser import QueryParser
+from source.parsers.statement_parser import StatementParser
+from source.profiling import Profiler, ProfileReport
+
+YALE = [statement for statement in load_examples("tests/examples.txt")["Yale Shooting Problem (YSP)"] if statement]
+DOMAIN = YALE + ["always alive | loaded", "impossible Load if loaded", "Load lasts 2", "loaded after Load"]
+
+
+def parse(statements, backend="python", **options):
+    statement_parser = StatementParser(TransitionGraph(backend=backend), profiler=Profiler(**options))
+    return statement_parser, statement_parser.parse(statements)
+
+
+def test_disabled_profiler_records_nothing():
+    profiler = Profiler()
+    with profiler.run("run"):
+        with profiler.phase("phase"):
+            profiler.count("counter")
+    assert profiler.phases == {} and profiler.counters == {} and profiler.last_report is None
+
+    statement_parser, report = parse(DOMAIN)
+    assert report is None
+    assert statement_parser.profiler.phases == {} and statement_parser.profiler.counters == {}
+
+
+def test_parse_reports_every_statement_phase():
+    _, report = parse(DOMAIN, enabled=True)
+    assert isinstance(report, ProfileReport)
+    assert report.name == "parse" and report.seconds > 0
+    assert {"always", "impossible", "causes", "initially", "after", "lasts"} <= set(report.phases)
+    assert all(measured["calls"] == 1 for measured in report.phases.values())
+
+
+@pytest.mark.parametrize("memory", [False, True])
+def test_memory_peaks_only_when_requested(memory):
+    _, report = parse(DOMAIN, enabled=True, memory=memory)
+    assert all(("peak_bytes" in measured) == memory for measured in report.phases.values())
+
+
+@pytest.mark.parametrize("backend", ["python", "numpy"])
+def test_counters_count_the_evaluations_that_ran(backend):
+    # the always formula is evaluated on each of the 4 states and nothing else runs
+    _, report = parse(["always alive | loaded"], backend, enabled=True)
+    assert report.counters["formula_evaluations"] == 4
+    assert report.counters["states_generated"] == 3
+
+    # one more state is tested for each causes precondition and each impossible rule
+    _, more = parse(["always alive | loaded", "Load causes loaded if alive", "impossible Load if ~alive"], backend, enabled=True)
+    assert more.counters["formula_evaluations"] > report.counters["formula_evaluations"]
+    assert more.counters["membership_checks"] > 0
+
+
+def test_symbolic_and_lazy_parses_report_their_work():
+    _, report = parse(DOMAIN, "symbolic", enabled=True)
+    assert report.counters == {"constraints_built": 2, "relations_built": 2}
+    _, report = parse(DOMAIN, "lazy", enabled=True)
+    assert report.counters == {"rules_compiled": 6}
+
+
+def test_profiled_method_leaves_last_report():
+    statement_parser, _ = parse(YALE)
+    profiler = Profiler(enabled=True)
+    query_parser = QueryParser(statement_parser.transition_graph, profiler=profiler)
+    query_parser.necessary_executable(["Load", "Shoot"], "alive")
+    assert profiler.last_report.name == "necessary_executable"
+    assert profiler.last_report.counters["transitions"] > 0
+    query_parser.cost_bounds(["Load"], "alive")
+    assert profiler.last_report.name == "cost_bounds"
@@ -0,0 +1,232 @@
+import random
+
+import pytest
+
+from benchmarks.generator import generate_domain
+from source.graph.transition_graph import TransitionGraph
+from source.parsers.domain_file import load_examples
+from source.parsers.query_parser import QueryParser, SparseQueryParser, SymbolicQueryParser, UnsupportedQueryError
+from source.parsers.statement_parser import StatementParser
+
+EXAMPLES = load_examples("tests/examples.txt")
+ENGINES = {
+    "python": (QueryParser, "python"),
+    "numpy": (QueryParser, "numpy"),
+    "lazy": (QueryParser, "lazy"),
+    "sparse": (SparseQueryParser, "python"),
+    "symbolic": (SymbolicQueryParser, "symbolic"),
+}
+
+
+def engine(name, statements):
+    query_parser_class, backend = ENGINES[name]
+    statement_parser = StatementParser(TransitionGraph(backend=backend))
+    statement_parser.parse([statement for statement in statements if statement])
+    return query_parser_class(statement_parser.transition_graph)
+
+
+def branch_costs(graph, state, actions):
+    """Total duration of every branch that executes the actions from the state, and whether one got stuck."""
+    if not actions:
+        return [0], False
+    successors = graph.successors(state, actions[0])
+    if not successors:
+        return [], True
+    costs, stuck = [], False
+    for target, duration in successors:
+        rest, rest_stuck = branch_costs(graph, target, actions[1:])
+        costs += [cost + duration for cost in rest]
+        stuck |= rest_stuck
+    return costs, stuck
+
+
+def random_queries(graph, seed, count=40, length=4):
+    """(actions, π) pairs over the fluents and actions of the graph."""
+    rng = random.Random(seed)
+    fluents, actions = sorted(graph.fluents), sorted(graph.actions)
+    for _ in range(count):
+        sequence = [rng.choice(actions) for _ in range(rng.randint(0, length))]
+        yield sequence, rng.choice(fluents + ["~" + fluent for fluent in fluents])
+
+
+def check_costs(query_parser, seed):
+    graph = query_parser.graph
+    rng = random.Random(seed)
+    for actions, pi in random_queries(graph, seed):
+        costs, stuck = [], False
+        for state in query_parser.pi_states(pi):
+            branch, branch_stuck = branch_costs(graph, state, actions)
+            costs += branch
+            stuck |= branch_stuck
+        max_cost = rng.randint(-20, 30)
+        assert query_parser.cost_bounds(actions, pi) == ((min(costs), max(costs)) if costs else None)
+        assert query_parser.necessary_executable_with_cost(actions, pi, max_cost) == (
+            not stuck and all(cost <= max_cost for cost in costs))
+        assert query_parser.possibly_executable_with_cost(actions, pi, max_cost) == any(
+            cost <= max_cost for cost in costs)
+
+
+@pytest.mark.parametrize("name", ["python", "numpy", "lazy", "sparse"])
+@pytest.mark.parametrize("seed", range(6))
+def test_costs_follow_every_branch(name, seed):
+    # releases make actions nondeterministic
+    statements = generate_domain(3 + seed % 3, 3, causes=2, releases=2, impossible=1, always=1, seed=seed)
+    check_costs(engine(name, statements), seed)
+
+
+@pytest.mark.parametrize("name", ["python", "sparse"])
+@pytest.mark.parametrize("seed", range(6))
+def test_costs_with_negative_durations(name, seed):
+    statements = generate_domain(4, 3, causes=2, releases=1, impossible=1, always=0, seed=seed)
+    # every other action takes negative time
+    statements = [statement.replace("lasts ", "lasts -") if statement.startswith(("A0 ", "A2 ")) else statement
+                  for statement in statements]
+    check_costs(engine(name, statements), seed)
+
+
+def test_sparse_costs_below_minus_one():
+    statements = ["Flip causes f if ~f", "Flip causes ~f if f", "Flip lasts -2"]
+    assert engine("sparse", statements).cost_bounds(["Flip", "Flip"], "f") == (-4, -4)
+
+
+@pytest.mark.parametrize("name", ENGINES)
+def test_contradictory_conjunctions_hold_in_no_state(name):
+    query_parser = engine(name, EXAMPLES["Russian Turkey Scenario"])
+    contradiction = "loaded & ~loaded"
+    assert query_parser.necessary_executable(["Spin"], contradiction)
+    assert not query_parser.possibly_executable(["Spin"], contradiction)
+    assert query_parser.necessary_alpha_after("loaded", ["Spin"], contradiction)
+    assert not query_parser.possibly_alpha_after("loaded", ["Spin"], contradiction)
+    assert not query_parser.necessary_alpha_after(contradiction, ["Load"], "alive")
+    assert not query_parser.possibly_alpha_after(contradiction, ["Load"], "alive")
+    if query_parser.supports("cost_bounds"):
+        assert query_parser.cost_bounds(["Spin"], contradiction) is None
+        assert not query_parser.cheapest_plan(contradiction, "alive").found
+        assert not query_parser.cheapest_plan("loaded", contradiction).found
+
+
+def test_symbolic_backend_rejects_cost_queries_plans_and_witnesses():
+    query_parser = engine("symbolic", EXAMPLES["Russian Turkey Scenario"])
+    assert query_parser.query("possibly_executable", (["Spin"], "loaded"))
+    for name, args in [
+        ("necessary_executable_with_cost", (["Spin"], "loaded", 3)),
+        ("cost_bounds", (["Spin"], "loaded")),
+        ("cheapest_plan", ("~alive", "alive")),
+        ("witness", ("possibly_executable", (["Spin"], "loaded"))),
+    ]:
+        assert not query_parser.supports(name)
+        with pytest.raises(UnsupportedQueryError):
+            query_parser.query(name, args)
+    with pytest.raises(UnsupportedQueryError):
+        query_parser.evaluate_batch([("cost_bounds", (["Spin"], "loaded"))])
+
+
+def batch_queries(graph, seed):
+    rng = random.Random(seed)
+    fluents = sorted(graph.fluents)
+    queries = []
+    for actions, pi in random_queries(graph, seed, count=30):
+        alpha = rng.choice(fluents + ["~" + fluent for fluent in fluents])
+        max_cost = rng.randint(0, 30)
+        queries += [
+            ("necessary_alpha_after", (alpha, actions, pi)),
+            ("possibly_alpha_after", (alpha, actions, pi)),
+            ("necessary_executable", (actions, pi)),
+            ("possibly_executable", (actions, pi)),
+            ("necessary_executable_with_cost", (actions, pi, max_cost)),
+            ("possibly_executable_with_cost", (actions, pi, max_cost)),
+            ("cost_bounds", (actions, pi)),
+        ]
+    return queries
+
+
+@pytest.mark.parametrize("name", ["python", "sparse", "symbolic"])
+@pytest.mark.parametrize("seed", range(4))
+def test_batch_answers_match_single_queries(name, seed):
+    statements = generate_domain(4, 3, causes=2, releases=1, impossible=1, always=1, seed=seed)
+    query_parser = engine(name, statements)
+    queries = [(query, args) for query, args in batch_queries(query_parser.graph, seed) if query_parser.supports(query)]
+    expected = [getattr(engine(name, statements), query)(*args) for query, args in queries]
+    assert query_parser.evaluate_batch(queries) == expected
+
+
+def test_batched_cost_queries_step_each_prefix_once(monkeypatch):
+    query_parser = engine("python", generate_domain(4, 3, seed=1))
+    steps = []
+    cost_step = query_parser.cost_step
+
+    def counted_step(frontier, action):
+        steps.append(action)
+        return cost_step(frontier, action)
+
+    monkeypatch.setattr(query_parser, "cost_step", counted_step)
+    actions = ["A0", "A1", "A2"]
+    query_parser.evaluate_batch(
+        [("necessary_executable_with_cost", (actions[:length], "f0", max_cost))
+         for length in range(1, 4) for max_cost in (0, 5, 50)]
+        + [("possibly_executable_with_cost", (actions, "f0", 5)), ("cost_bounds", (actions, "f0"))]
+    )
+    assert steps == actions
+
+
+def branch_finals(graph, state, actions):
+    """Final state of every branch that executes the actions from the state, and whether one got stuck."""
+    if not actions:
+        return [state], False
+    targets = graph.targets(state, actions[0])
+    if not targets:
+        return [], True
+    finals, stuck = [], False
+    for target in targets:
+        rest, rest_stuck = branch_finals(graph, target, actions[1:])
+        finals += rest
+        stuck |= rest_stuck
+    return finals, stuck
+
+
+def valid_trajectory(query_parser, trajectory, actions, pi):
+    graph, states = query_parser.graph, trajectory.states
+    if not query_parser.state_satisfies(states[0], pi) or trajectory.actions != actions[:len(trajectory.actions)]:
+        return False
+    if len(states) != len(trajectory.actions) + 1:
+        return False
+    if any(target not in graph.targets(state, action) for state, target, action in zip(states, states[1:], actions)):
+        return False
+    return trajectory.stuck_on is None or not graph.targets(states[-1], trajectory.stuck_on)
+
+
+@pytest.mark.parametrize("name", ENGINES)
+@pytest.mark.parametrize("seed", range(4))
+def test_queries_and_witnesses_follow_every_branch(name, seed):
+    statements = generate_domain(4, 3, causes=2, releases=2, impossible=1, always=1, seed=seed)
+    query_parser = engine(name, statements)
+    reference = engine("python", statements)
+    rng = random.Random(seed)
+    fluents = sorted(query_parser.graph.fluents)
+    for actions, pi in random_queries(query_parser.graph, seed):
+        alpha = rng.choice(fluents + ["~" + fluent for fluent in fluents])
+        finals, stuck = [], False
+        for state in reference.pi_states(pi):
+            branch, branch_stuck = branch_finals(reference.graph, state, actions)
+            finals += branch
+            stuck |= branch_stuck
+        holds = [reference.state_satisfies(state, alpha) for state in finals]
+        expected = {
+            "necessary_alpha_after": ((alpha, actions, pi), not stuck and all(holds)),
+            "possibly_alpha_after": ((alpha, actions, pi), any(holds)),
+            "necessary_executable": ((actions, pi), not stuck),
+            "possibly_executable": ((actions, pi), bool(finals)),
+        }
+        for query, (args, answer) in expected.items():
+            assert query_parser.query(query, args) == answer
+            if not query_parser.supports("witness"):
+                continue
+            trajectory = query_parser.witness(query, args)
+            # a counterexample for a failed necessary query, an example for a possibly query that holds
+            assert (trajectory is not None) == (answer if query.startswith("possibly") else not answer)
+            if trajectory is not None:
+                assert valid_trajectory(query_parser, trajectory, actions, pi)
+                if query == "possibly_alpha_after":
+                    assert query_parser.state_satisfies(trajectory.states[-1], alpha)
+                if query == "necessary_alpha_after" and trajectory.stuck_on is None:
+                    assert not query_parser.state_satisfies(trajectory.states[-1], alpha)
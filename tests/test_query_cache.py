@@ -0,0 +1,73 @@
+from source.graph.transition_graph import TransitionGraph
+from source.parsers.domain_file import load_examples
+from source.parsers.query_cache import QueryCache
+from source.parsers.query_parser import QueryParser
+from source.parsers.statement_parser import StatementParser
+
+YALE = [statement for statement in load_examples("tests/examples.txt")["Yale Shooting Problem (YSP)"] if statement]
+
+
+def cached_parser(max_entries=64):
+    statement_parser = StatementParser(TransitionGraph())
+    statement_parser.parse(YALE)
+    return statement_parser, QueryParser(statement_parser.transition_graph, cache=QueryCache(max_entries))
+
+
+def test_arguments_of_different_parameters_do_not_share_an_entry():
+    _, query_parser = cached_parser()
+    failed = query_parser.cheapest_plan("~alive", "alive & ~loaded", max_expansions=1)
+    assert failed.actions is None and failed.stats["limit_reached"]
+    plan = query_parser.cheapest_plan("~alive", "alive & ~loaded", heuristic=True)
+    assert plan.actions == ["Load", "Shoot"]
+    assert query_parser.cache.stats()["hits"] == 0
+
+
+def test_spelled_out_defaults_share_an_entry():
+    _, query_parser = cached_parser()
+    plan = query_parser.cheapest_plan("~alive", "alive & ~loaded")
+    assert query_parser.cheapest_plan("~alive", "alive & ~loaded", "some", heuristic=True) is plan
+    assert query_parser.cache.stats()["hits"] == 1
+
+
+def test_whitespace_and_literal_order_are_normalized():
+    _, query_parser = cached_parser()
+    answer = query_parser.necessary_alpha_after("~alive", ["Load", "Shoot"], "alive & ~loaded")
+    assert query_parser.necessary_alpha_after(" ~ alive ", [" Load", "Shoot "], "~loaded&alive") is answer
+    assert query_parser.necessary_alpha_after("~alive", ["Load", "Shoot"], "~loaded & alive & alive") is answer
+    assert query_parser.cache.stats() == {"hits": 2, "misses": 1, "entries": 1, "max_entries": 64}
+
+
+def test_least_recently_used_entry_is_evicted():
+    _, query_parser = cached_parser(max_entries=2)
+    query_parser.possibly_executable(["Load"], "alive")
+    query_parser.possibly_executable(["Shoot"], "alive")
+    query_parser.possibly_executable(["Load"], "alive")  # hit, so Shoot is now the oldest entry
+    query_parser.possibly_executable(["Load", "Shoot"], "alive")
+    assert len(query_parser.cache) == 2
+    query_parser.possibly_executable(["Load"], "alive")
+    query_parser.possibly_executable(["Shoot"], "alive")
+    assert query_parser.cache.stats() == {"hits": 2, "misses": 4, "entries": 2, "max_entries": 2}
+
+
+def test_invalidate_drops_every_answer():
+    _, query_parser = cached_parser()
+    query_parser.possibly_executable(["Load"], "alive")
+    query_parser.cache.invalidate(query_parser.graph.version + 1)
+    assert len(query_parser.cache) == 1
+    query_parser.cache.invalidate(query_parser.graph.version)
+    assert len(query_parser.cache) == 0
+    query_parser.possibly_executable(["Load"], "alive")
+    query_parser.cache.invalidate()
+    assert len(query_parser.cache) == 0
+    assert query_parser.cache.stats()["misses"] == 2
+
+
+def test_domain_change_misses_the_cache():
+    statement_parser, query_parser = cached_parser()
+    version = query_parser.graph.version
+    assert query_parser.necessary_alpha_after("alive", ["Load"], "alive") is True
+    statement_parser.insert("Load causes ~alive")
+    assert statement_parser.transition_graph is query_parser.graph and query_parser.graph.version != version
+    # the answer about the old domain is not reused
+    assert query_parser.necessary_alpha_after("alive", ["Load"], "alive") is False
+    assert query_parser.cache.stats()["hits"] == 0
@@ -0,0 +1,159 @@
+import subprocess
+import sys
+import xml.etree.ElementTree as ElementTree
+
+import pytest
+
+from benchmarks.generator import generate_domain
+from source.graph import rendering
+from source.graph.rendering import LABEL_LIMIT, layout, select, to_dot, to_svg
+from source.graph.transition_graph import TransitionGraph
+from source.parsers.statement_parser import StatementParser
+
+# Shoot and Spin share an edge, and the alive states cannot be reached from the initial ones
+DOMAIN = [
+    "initially ~alive",
+    "Load causes loaded",
+    "Shoot causes ~loaded",
+    "Shoot causes ~alive if loaded",
+    "Spin causes ~loaded",
+]
+
+
+def graph(statements=DOMAIN):
+    statement_parser = StatementParser(TransitionGraph())
+    statement_parser.parse(statements)
+    return statement_parser.transition_graph
+
+
+def all_edges(transition_graph):
+    return {(edge.source, edge.target, edge.action) for edge in transition_graph.edges}
+
+
+def selected_edges(render_graph):
+    return {(source, target, action) for source, target, actions, _ in render_graph.edges for action in actions}
+
+
+def test_full_keeps_every_state_and_edge():
+    transition_graph = graph()
+    render_graph = select(transition_graph, "full")
+    assert set(render_graph.nodes) == set(transition_graph.generate_possible_states())
+    assert len(render_graph.nodes) == len(set(render_graph.nodes))
+    assert selected_edges(render_graph) == all_edges(transition_graph)
+    assert len(render_graph.edges) == len(transition_graph.edges)
+    assert all(len(actions) == 1 for _, _, actions, _ in render_graph.edges)
+
+
+def test_collapse_merges_the_edges_between_two_states():
+    transition_graph = graph()
+    render_graph = select(transition_graph, "collapse")
+    assert selected_edges(render_graph) == all_edges(transition_graph)
+    pairs = [(source, target) for source, target, _, _ in render_graph.edges]
+    assert len(pairs) == len(set(pairs)) == len({(source, target) for source, target, _ in all_edges(transition_graph)})
+    assert any(len(actions) > 1 for _, _, actions, _ in render_graph.edges)
+    for _, _, actions, label in render_graph.edges:
+        assert all(action in label for action in actions)
+
+
+def test_reachable_keeps_what_the_initial_states_reach():
+    transition_graph = graph()
+    render_graph = select(transition_graph, "reachable")
+    assert {state.fluents["alive"] for state in render_graph.nodes} == {False}
+    assert len(render_graph.nodes) == 2
+    assert render_graph.initial == set(transition_graph.possible_initial_states)
+    assert selected_edges(render_graph) == {
+        (source, target, action) for source, target, action in all_edges(transition_graph)
+        if source in render_graph.nodes
+    }
+
+
+def test_reachable_without_initial_states_is_empty():
+    render_graph = select(graph(DOMAIN[1:]), "reachable")
+    assert render_graph.nodes == [] and render_graph.edges == []
+
+
+@pytest.mark.parametrize("top_k", [1, 2, 3])
+def test_top_k_keeps_the_states_with_most_edges(top_k):
+    transition_graph = graph()
+    render_graph = select(transition_graph, "top_k", top_k)
+    degree = {state: 0 for state in transition_graph.generate_possible_states()}
+    for source, target, _ in all_edges(transition_graph):
+        degree[source] += 1
+        degree[target] += 1
+    kept = sorted(degree, key=lambda state: (-degree[state], state.code))[:top_k]
+    assert set(render_graph.nodes) == set(kept)
+    assert selected_edges(render_graph) == {
+        (source, target, action) for source, target, action in all_edges(transition_graph)
+        if source in kept and target in kept
+    }
+
+
+def test_unknown_detail_mode_is_rejected():
+    with pytest.raises(ValueError):
+        select(graph(), "everything")
+
+
+def test_exports_contain_every_edge_without_matplotlib():
+    script = """
+import sys
+from source.graph.rendering import select, to_dot, to_svg
+from tests.test_rendering import graph
+render_graph = select(graph(), "full")
+to_dot(render_graph), to_svg(render_graph)
+print("matplotlib" in sys.modules)
+"""
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
+
+    render_graph = select(graph(), "full")
+    dot = to_dot(render_graph)
+    assert dot.startswith("digraph transitions {") and dot.rstrip().endswith("}")
+    assert dot.count("{") == dot.count("}")
+    for source, target, _, _ in render_graph.edges:
+        assert f"  {source.code} -> {target.code} [" in dot
+    assert sum(line.lstrip().split(" ")[1:2] == ["->"] for line in dot.splitlines()) == len(render_graph.edges)
+
+    svg = ElementTree.fromstring(to_svg(render_graph))
+    namespace = "{http://www.w3.org/2000/svg}"
+    assert len(svg.findall(f"{namespace}g/{namespace}path")) == len(render_graph.edges)
+    assert len(svg.findall(f"{namespace}circle")) == len(render_graph.nodes)
+    assert len(svg.findall(f"{namespace}text")) == len(render_graph.edges)
+
+
+def test_layout_is_reused_for_an_identical_fingerprint(monkeypatch):
+    import networkx
+
+    first = select(graph(), "full")
+    positions = layout(first)
+
+    def unexpected(*args, **kwargs):
+        raise AssertionError("layout computed again")
+
+    monkeypatch.setattr(networkx, "spring_layout", unexpected)
+    monkeypatch.setattr(networkx, "circular_layout", unexpected)
+    second = select(graph(), "full")
+    assert second.fingerprint() == first.fingerprint()
+    assert layout(second) == positions
+    assert rendering._layouts[first.fingerprint()] is rendering._layouts[second.fingerprint()]
+
+
+def test_large_graphs_are_drawn_as_line_collections():
+    matplotlib = pytest.importorskip("matplotlib")
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import LineCollection
+    from matplotlib.patches import FancyArrowPatch
+
+    render_graph = select(graph(generate_domain(6, 4, seed=0)), "full")
+    assert len(render_graph.edges) > LABEL_LIMIT
+    figure = rendering.draw(render_graph)
+    try:
+        ax = figure.axes[0]
+        lines = [collection for collection in ax.collections if isinstance(collection, LineCollection)]
+        colors = {render_graph.edge_color(actions) for _, _, actions, _ in render_graph.edges}
+        assert len(lines) == len(colors)
+        assert sum(len(collection.get_segments()) for collection in lines) == len(render_graph.edges)
+        assert not [patch for patch in ax.patches if isinstance(patch, FancyArrowPatch)]
+        assert not ax.texts[len(render_graph.nodes):]  # node labels only, no edge labels
+    finally:
+        plt.close(figure)
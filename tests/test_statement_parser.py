@@ -0,0 +1,45 @@
+import pytest
+
+from source.graph.transition_graph import TransitionGraph
+from source.parsers.statement_parser import StatementParser
+
+STATEMENTS = [
+    "initially alive",
+    "LOAD causes loaded",
+    "SHOOT causes ~loaded",
+    "SHOOT causes ~alive if loaded",
+    "~alive after SHOOT",
+    "LOAD lasts 1",
+    "SHOOT lasts 2",
+]
+
+
+def state(alive, loaded):
+    return (("alive", alive), ("loaded", loaded))
+
+
+def label(node):
+    return tuple(sorted(node.fluents.items()))
+
+
+@pytest.mark.parametrize("backend", ["python", "numpy"])
+def test_yale_shooting_domain(backend):
+    statement_parser = StatementParser(TransitionGraph(backend=backend))
+    statement_parser.parse(STATEMENTS)
+    graph = statement_parser.transition_graph
+
+    edges = {
+        (label(edge.source), edge.action): (label(edge.target), graph.duration(edge.source, edge.action, edge.target))
+        for edge in graph.edges
+    }
+    assert len(edges) == len(graph.edges) == 8
+    assert edges[(state(True, False), "LOAD")] == (state(True, True), 1)
+    assert edges[(state(True, True), "SHOOT")] == (state(False, False), 2)
+    assert edges[(state(False, True), "SHOOT")] == (state(False, False), 2)
+    # an action that changes nothing takes no time
+    assert edges[(state(True, True), "LOAD")] == (state(True, True), 0)
+    assert edges[(state(True, False), "SHOOT")] == (state(True, False), 0)
+
+    # ~alive after SHOOT leaves only the loaded initial state
+    assert [label(node) for node in graph.possible_initial_states] == [state(True, True)]
+    assert [label(node) for node in graph.possible_ending_states] == [state(False, False)]